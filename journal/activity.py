@@ -0,0 +1,152 @@
+"""
+Day-activity bitmaps and the statistics read off them.
+
+Each ActivityYear row holds one bit per day of a year (bit 0 is January 1st)
+as a little-endian 46 byte string. In Python the bitmap is a plain int, so
+counts are popcounts, runs of consecutive days are found by shifting and
+AND-ing, and months or weekdays are masks. Several years are joined into one
+int with each year shifted by the days before it, so streaks and gaps carry
+across New Year.
+"""
+import calendar
+from datetime import date, timedelta
+from functools import lru_cache
+
+BITMAP_BYTES = 46  # 366 bits
+
+
+def to_bytes(bits):
+    return bits.to_bytes(BITMAP_BYTES, "little")
+
+
+def from_bytes(raw):
+    return int.from_bytes(bytes(raw or b""), "little")
+
+
+def popcount(bits):
+    return bin(bits).count("1")
+
+
+def day_index(day):
+    return day.toordinal() - date(day.year, 1, 1).toordinal()
+
+
+def year_bitmaps(dates):
+    """
+    {year: bitmap} for an iterable of dates.
+    """
+    bitmaps = {}
+    for day in dates:
+        bitmaps[day.year] = bitmaps.get(day.year, 0) | 1 << day_index(day)
+    return bitmaps
+
+
+def days_in_year(year):
+    return 366 if calendar.isleap(year) else 365
+
+
+@lru_cache(maxsize=None)
+def month_masks(year):
+    masks = []
+    start = 0
+    for month in range(1, 13):
+        length = calendar.monthrange(year, month)[1]
+        masks.append(((1 << length) - 1) << start)
+        start += length
+    return masks
+
+
+@lru_cache(maxsize=None)
+def weekday_masks(year):
+    # Monday first, like date.weekday()
+    masks = [0] * 7
+    first = date(year, 1, 1).weekday()
+    for index in range(days_in_year(year)):
+        masks[(first + index) % 7] |= 1 << index
+    return masks
+
+
+def longest_run(bits):
+    """
+    (length, first bit) of the longest run of set bits, earliest on ties,
+    or (0, None). Each x & (x >> 1) keeps only bits that start a run one
+    longer than before, so the loop runs once per day of the longest run.
+    """
+    length = 0
+    while bits:
+        previous = bits
+        bits &= bits >> 1
+        length += 1
+    if not length:
+        return 0, None
+    return length, (previous & -previous).bit_length() - 1
+
+
+def longest_gap(bits):
+    # longest run of empty days between the first and last active day
+    if not bits:
+        return 0
+    low = (bits & -bits).bit_length() - 1
+    span = ((1 << bits.bit_length()) - 1) ^ ((1 << low) - 1)
+    return longest_run(~bits & span)[0]
+
+
+def trailing_run(bits, end):
+    # length of the run of set bits ending at bit `end` (inclusive)
+    window = ~bits & ((1 << (end + 1)) - 1)
+    return end + 1 - window.bit_length()
+
+
+def summarize_year(year, bits):
+    """
+    Heatmap data and statistics for one year's bitmap. Streaks and gaps
+    stop at the year's edges, see summarize_years() for ones that don't.
+    """
+    start = date(year, 1, 1)
+    length, first = longest_run(bits)
+    return {
+        "year": year,
+        "start": start.isoformat(),
+        "days": days_in_year(year),
+        # bit i is start + i days, e.g. BigInt("0x" + bitmap) in JavaScript
+        "bitmap": format(bits, "x"),
+        "total": popcount(bits),
+        "months": [popcount(bits & mask) for mask in month_masks(year)],
+        "weekdays": [popcount(bits & mask) for mask in weekday_masks(year)],
+        "longest_streak": length,
+        "longest_streak_start": (start + timedelta(days=first)).isoformat() if length else None,
+        "longest_gap": longest_gap(bits),
+    }
+
+
+def summarize_years(bitmaps, first_year, last_year, today=None):
+    """
+    Overview of the years from `first_year` to `last_year` given {year:
+    bitmap}: per-year totals and streaks plus streaks and gaps across the
+    whole range. The current streak is the run ending today or yesterday.
+    """
+    joined = 0
+    offset = 0
+    years = []
+    for year in range(first_year, last_year + 1):
+        bits = bitmaps.get(year, 0)
+        joined |= bits << offset
+        offset += days_in_year(year)
+        years.append({"year": year, "total": popcount(bits), "longest_streak": longest_run(bits)[0]})
+
+    start = date(first_year, 1, 1)
+    length, first = longest_run(joined)
+    summary = {
+        "years": years,
+        "total": popcount(joined),
+        "longest_streak": length,
+        "longest_streak_start": (start + timedelta(days=first)).isoformat() if length else None,
+        "longest_gap": longest_gap(joined),
+        "current_streak": 0,
+    }
+    today = today or date.today()
+    for end in ((today - start).days, (today - start).days - 1):
+        if 0 <= end < offset and joined >> end & 1:
+            summary["current_streak"] = trailing_run(joined, end)
+            break
+    return summary
@@ -0,0 +1,188 @@
+"""
+Vectorized streak and activity statistics for bulk recomputation.
+
+Instead of walking each user's entries in Python (see utils.summarize_streaks),
+all (user_id, date) pairs are pulled in one values_list pass and processed
+as NumPy arrays: dates become ordinals, consecutive-day runs are found with
+run-length encoding and per-user results are read off the run boundaries.
+"""
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+from django.db import transaction
+
+from . import calendar_cache
+from .activity import day_index, to_bytes
+from .models import ActivityYear, JournalEntry, MonthlyEntryCount, UserProfile
+from .utils import summarize_streaks
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+ORDINAL_BITS = 22
+
+
+def load_activity(users=None):
+    """
+    Return sorted, de-duplicated (user_ids, ordinals) arrays for all entries,
+    or only those of the given users queryset.
+    """
+    entries = JournalEntry.objects.all()
+    if users is not None:
+        entries = entries.filter(user__in=users)
+    pairs = entries.order_by().values_list("user_id", "date").distinct()
+
+    user_ids = []
+    ordinals = []
+    for user_id, entry_date in pairs.iterator(chunk_size=10000):
+        user_ids.append(user_id)
+        ordinals.append(entry_date.toordinal())
+    return sort_activity(np.array(user_ids, dtype=np.int64), np.array(ordinals, dtype=np.int64))
+
+
+def sort_activity(user_ids, ordinals):
+    # pack (user, ordinal) into one int64 key so a single sort orders and
+    # de-duplicates; ordinals stay below 2**22 up to the year 9999
+    keys = np.sort((user_ids << ORDINAL_BITS) | ordinals)
+    if len(keys):
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = keys[1:] != keys[:-1]
+        keys = keys[keep]
+    return keys >> ORDINAL_BITS, keys & ((1 << ORDINAL_BITS) - 1)
+
+
+def compute_stats(user_ids, ordinals):
+    """
+    Per-user statistics from sorted, de-duplicated (user_ids, ordinals).
+
+    Returns {user_id: stats}, where stats has the keys produced by
+    utils.summarize_streaks plus entry_count, longest_gap (days without an
+    entry between two entries), weekday_counts (Mon..Sun), monthly_counts
+    ({(year, month): count}) and year_bitmaps ({year: bitmap}, see activity.py).
+    """
+    n = len(user_ids)
+    if n == 0:
+        return {}
+
+    # segment boundaries: first row of every user
+    new_user = np.ones(n, dtype=bool)
+    new_user[1:] = user_ids[1:] != user_ids[:-1]
+    user_starts = np.flatnonzero(new_user)
+    users = user_ids[user_starts]
+    entry_counts = np.diff(np.append(user_starts, n))
+    user_index = np.cumsum(new_user) - 1
+
+    # run-length encode consecutive days within each user
+    day_steps = np.zeros(n, dtype=np.int64)
+    day_steps[1:] = ordinals[1:] - ordinals[:-1]
+    new_run = new_user | (day_steps != 1)
+    run_starts = np.flatnonzero(new_run)
+    run_lengths = np.diff(np.append(run_starts, n))
+    run_users = user_index[run_starts]
+    run_first = ordinals[run_starts]
+
+    # longest run per user, earliest one on ties
+    order = np.lexsort((run_first, -run_lengths, run_users))
+    sorted_users = run_users[order]
+    first_of_user = np.ones(len(order), dtype=bool)
+    first_of_user[1:] = sorted_users[1:] != sorted_users[:-1]
+    longest = order[first_of_user]
+
+    # latest run per user is the last run of each segment
+    latest = np.append(np.flatnonzero(np.diff(run_users)), len(run_starts) - 1)
+
+    # longest gap between consecutive entries of the same user
+    gaps = np.where(new_user, 0, day_steps - 1)
+    longest_gaps = np.maximum.reduceat(gaps, user_starts)
+
+    # ordinal 1 (0001-01-01) is a Monday
+    weekdays = (ordinals - 1) % 7
+    weekday_counts = np.bincount(user_index * 7 + weekdays, minlength=len(users) * 7).reshape(-1, 7)
+
+    # calendar months via datetime64; rows are sorted, so each (user, month)
+    # is a contiguous block and can be counted like the runs above
+    months = (ordinals - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    new_month = new_user.copy()
+    new_month[1:] |= months[1:] != months[:-1]
+    month_starts = np.flatnonzero(new_month)
+    month_counts = np.diff(np.append(month_starts, n))
+    monthly = defaultdict(dict)
+    for index, month, count in zip(user_index[month_starts].tolist(), months[month_starts].tolist(),
+                                   month_counts.tolist()):
+        monthly[index][(1970 + month // 12, month % 12 + 1)] = count
+
+    # day-activity bitmaps per (user, year)
+    activity = defaultdict(dict)
+    for index, ordinal in zip(user_index.tolist(), ordinals.tolist()):
+        day = date.fromordinal(ordinal)
+        activity[index][day.year] = activity[index].get(day.year, 0) | 1 << day_index(day)
+
+    # gather per-user columns, then build the result with plain Python ints
+    columns = zip(
+        users.tolist(), entry_counts.tolist(),
+        run_lengths[longest].tolist(), run_first[longest].tolist(),
+        run_lengths[latest].tolist(), run_first[latest].tolist(),
+        longest_gaps.tolist(), weekday_counts.tolist(),
+    )
+    stats = {}
+    for index, (user_id, count, best_length, best_start, last_length, last_start, gap, weekdays) \
+            in enumerate(columns):
+        stats[user_id] = {
+            "entry_count": count,
+            "longest_streak": best_length,
+            "longest_streak_start": date.fromordinal(best_start),
+            "longest_streak_end": date.fromordinal(best_start + best_length - 1),
+            "latest_streak": last_length,
+            "latest_streak_start": date.fromordinal(last_start),
+            "last_date": date.fromordinal(last_start + last_length - 1),
+            "longest_gap": gap,
+            "weekday_counts": weekdays,
+            "monthly_counts": monthly[index],
+            "year_bitmaps": activity[index],
+        }
+    return stats
+
+
+def rebuild_all_stats(users=None):
+    """
+    Recompute and store UserProfile aggregates, MonthlyEntryCount and
+    ActivityYear rows for all users (or the given queryset) in bulk. Returns
+    the number of profiles.
+    """
+    stats = compute_stats(*load_activity(users))
+
+    profiles = UserProfile.objects.all()
+    if users is not None:
+        profiles = profiles.filter(user__in=users)
+    profiles = list(profiles)
+
+    empty = {**summarize_streaks([]), "entry_count": 0, "monthly_counts": {}, "year_bitmaps": {}}
+    monthly_rows = []
+    activity_rows = []
+    for profile in profiles:
+        user_stats = stats.get(profile.user_id, empty)
+        profile.apply_stats(user_stats, user_stats["entry_count"])
+        monthly_rows += [
+            MonthlyEntryCount(user_id=profile.user_id, year=year, month=month, count=count)
+            for (year, month), count in user_stats["monthly_counts"].items()
+        ]
+        activity_rows += [
+            ActivityYear(user_id=profile.user_id, year=year, days=to_bytes(bits))
+            for year, bits in user_stats["year_bitmaps"].items()
+        ]
+
+    with transaction.atomic():
+        UserProfile.objects.bulk_update(profiles, [
+            "entry_count", "current_streak", "current_streak_start", "last_journal_date",
+            "longest_streak", "longest_streak_start", "longest_streak_end",
+        ], batch_size=1000)
+        for model, rows in ((MonthlyEntryCount, monthly_rows), (ActivityYear, activity_rows)):
+            stale = model.objects.all()
+            if users is not None:
+                stale = stale.filter(user__in=users)
+            stale.delete()
+            model.objects.bulk_create(rows, batch_size=1000)
+
+    # bulk_update skips post_save, so drop the cached profiles here
+    for profile in profiles:
+        calendar_cache.invalidate_profile(profile.user_id)
+    return len(profiles)
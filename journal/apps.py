@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class JournalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'journal'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .db import configure_sqlite
+        from .instrumentation import install_query_recorder
+
+        connection_created.connect(configure_sqlite, dispatch_uid="journal_configure_sqlite")
+        connection_created.connect(install_query_recorder, dispatch_uid="journal_query_recorder")
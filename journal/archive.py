@@ -0,0 +1,237 @@
+"""
+Bulk import and export of a user's journal.
+
+Exports are generators meant for StreamingHttpResponse (or a file): entries
+are read with iterator() and tags prefetched per chunk, so memory stays flat
+whatever the size of the journal. Supported formats:
+
+- ndjson: one JSON object per line
+- csv: date, title, tags, content, created_at, updated_at
+- markdown: a zip with one Markdown file (front matter + HTML body) per entry
+
+Imports read ndjson or csv records and insert them with bulk_create in
+batches, one transaction per batch; tags are resolved once per batch and
+derived data (streaks, search index, caches) is refreshed once at the end.
+"""
+import csv
+import io
+import json
+import zipfile
+from datetime import date
+
+from django.db import transaction
+
+from .derived import refresh_after_bulk_write
+from .models import JournalEntry
+from .tags import normalize_tag_names, set_tags_bulk
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "markdown": ("application/zip", "zip"),
+}
+IMPORT_FORMATS = ("ndjson", "csv")
+
+CSV_FIELDS = ["date", "title", "tags", "content", "created_at", "updated_at"]
+CHUNK_SIZE = 500
+DEFAULT_BATCH_SIZE = 500
+MAX_TITLE_LENGTH = JournalEntry._meta.get_field("title").max_length
+
+
+# Export
+
+def _entries_for_export(user):
+    return JournalEntry.objects.filter(user=user).order_by("date", "id") \
+        .prefetch_related("tags").iterator(chunk_size=CHUNK_SIZE)
+
+
+def _export_record(entry):
+    return {
+        "date": entry.date.isoformat(),
+        "title": entry.title,
+        "tags": [tag.name for tag in entry.tags.all()],
+        "content": entry.content,
+        "created_at": entry.created_at.isoformat(),
+        "updated_at": entry.updated_at.isoformat(),
+    }
+
+
+def export_ndjson(user):
+    for entry in _entries_for_export(user):
+        yield json.dumps(_export_record(entry)) + "\n"
+
+
+def export_csv(user):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for entry in _entries_for_export(user):
+        record = _export_record(entry)
+        record["tags"] = ", ".join(record["tags"])
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+class _StreamBuffer:
+    """
+    Write-only file object; zipfile writes into it and we drain it per entry.
+    It has no tell()/seek(), so zipfile falls back to streaming mode.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _markdown_document(record):
+    tags = ", ".join(json.dumps(tag) for tag in record["tags"])
+    return (
+        "---\n"
+        f"title: {json.dumps(record['title'])}\n"
+        f"date: {record['date']}\n"
+        f"tags: [{tags}]\n"
+        f"created_at: {record['created_at']}\n"
+        f"updated_at: {record['updated_at']}\n"
+        "---\n\n"
+        # TinyMCE HTML is kept as-is, Markdown allows inline HTML
+        f"{record['content']}\n"
+    )
+
+
+def export_markdown_zip(user):
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for entry in _entries_for_export(user):
+            record = _export_record(entry)
+            archive.writestr(f"{entry.date:%Y}/{record['date']}.md", _markdown_document(record))
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+EXPORTERS = {
+    "ndjson": export_ndjson,
+    "csv": export_csv,
+    "markdown": export_markdown_zip,
+}
+
+
+# Import
+
+def read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            # a generator can't raise and carry on, hand the error to the importer
+            yield ValueError(f"Invalid JSON: {error}")
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+READERS = {
+    "ndjson": read_ndjson,
+    "csv": read_csv,
+}
+
+
+def _parse_record(record):
+    # returns (entry fields, tag names), raises ValueError on bad records
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Record is not an object.")
+    for name in ("date", "title", "content"):
+        if record.get(name) is not None and not isinstance(record[name], str):
+            raise ValueError(f"{name.capitalize()} is not a string.")
+    tags = record.get("tags")
+    if tags is not None and not isinstance(tags, str) and not (
+            isinstance(tags, list) and all(isinstance(name, str) for name in tags)):
+        raise ValueError("Tags are not a string or a list of strings.")
+    try:
+        entry_date = date.fromisoformat((record.get("date") or "")[:10])
+    except ValueError:
+        raise ValueError(f"Invalid date {record.get('date')!r}.")
+    content = record.get("content") or ""
+    if not content.strip():
+        raise ValueError("Content is empty.")
+    title = (record.get("title") or "Untitled").strip()[:MAX_TITLE_LENGTH] or "Untitled"
+    return {"date": entry_date, "title": title, "content": content}, normalize_tag_names(tags)
+
+
+def import_entries(user, records, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import an iterable of records for `user`. Entries on dates that already
+    have one are skipped. Returns {"created", "skipped", "errors"}, where
+    errors is a list of (record number, message).
+    """
+    summary = {"created": 0, "skipped": 0, "errors": []}
+    created_ids = []
+    batch = []
+
+    try:
+        for number, record in enumerate(records, start=1):
+            try:
+                batch.append(_parse_record(record))
+            except ValueError as error:
+                summary["errors"].append((number, str(error)))
+                continue
+            if len(batch) >= batch_size:
+                created_ids += _import_batch(user, batch, summary)
+                batch = []
+        if batch:
+            created_ids += _import_batch(user, batch, summary)
+    finally:
+        # batches already committed stay, so their derived data must follow
+        if created_ids:
+            refresh_after_bulk_write(user.id, created_ids)
+    return summary
+
+
+def _import_batch(user, batch, summary):
+    with transaction.atomic():
+        dates = {fields["date"] for fields, _ in batch}
+        taken = set(JournalEntry.objects.filter(user=user, date__in=dates).values_list("date", flat=True))
+
+        new_entries = []
+        tags_by_date = {}
+        for fields, tag_names in batch:
+            # one entry per day, also within the imported file
+            if fields["date"] in taken:
+                summary["skipped"] += 1
+                continue
+            taken.add(fields["date"])
+            entry = JournalEntry(user=user, **fields)
+            entry.update_text_fields()  # bulk_create skips save()
+            new_entries.append(entry)
+            tags_by_date[fields["date"]] = tag_names
+
+        if not new_entries:
+            return []
+        JournalEntry.objects.bulk_create(new_entries)
+
+        # MySQL doesn't return ids from bulk inserts, look them up by date
+        ids_by_date = dict(JournalEntry.objects.filter(
+            user=user, date__in=list(tags_by_date)).values_list("date", "id"))
+
+        set_tags_bulk({ids_by_date[entry_date]: names for entry_date, names in tags_by_date.items()})
+
+    summary["created"] += len(new_entries)
+    return list(ids_by_date.values())
@@ -0,0 +1,69 @@
+"""
+Cached lookup of the signed-in user.
+
+AuthenticationMiddleware asks the session's backend for the user on every
+request. CachedModelBackend answers from the cache, with the user's
+UserProfile loaded alongside (select_related), so request.user.profile costs
+no query either. Together with the cached_db session engine an authenticated
+page view runs no auth queries once both are cached.
+
+Cached users are namespaced by a per-user version, like calendar_cache.
+Saving or deleting the user (a password change, last_login on sign in), saving
+its profile and signing out call invalidate_user(), which bumps the version
+right away and again once the transaction commits. A request that loaded the
+user before the commit can only write an old version's key, which nothing
+reads any more. The profile is only cached with the user while the
+run_jobs worker, which saves profiles, can invalidate it (see
+utils.cache_profiles()).
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .utils import bump_cache_version, cache_profiles, cache_version, now_and_on_commit
+
+CACHE_TIMEOUT = 60 * 15
+KEY_PREFIX = "journal:auth"
+
+
+def _version_key(user_id):
+    return f"{KEY_PREFIX}:version:{user_id}"
+
+
+def _user_key(user_id):
+    return f"{KEY_PREFIX}:{user_id}:{cache_version(_version_key(user_id))}:user"
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user() reads the user and profile from the cache,
+    or straight from the database with settings.AUTH_USER_CACHE off.
+    """
+    def get_user(self, user_id):
+        user = self.cached_user(user_id) if settings.AUTH_USER_CACHE else self.load_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    def cached_user(self, user_id):
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = self.load_user(user_id)
+            if user is not None:
+                cache.set(key, user, CACHE_TIMEOUT)
+        return user
+
+    def load_user(self, user_id):
+        from .models import User
+
+        users = User._default_manager.filter(pk=user_id)
+        if settings.AUTH_USER_CACHE and not cache_profiles():
+            # read per request, run_jobs can't invalidate it in our cache
+            return users.first()
+        # a user without a profile gets profile cached as missing, and
+        # accessing it raises UserProfile.DoesNotExist without a query
+        return users.select_related("profile").first()
+
+
+def invalidate_user(user_id):
+    # now, for the rest of this transaction, and again once it commits
+    now_and_on_commit(lambda: bump_cache_version(_version_key(user_id)))
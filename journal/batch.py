@@ -0,0 +1,198 @@
+"""
+Batch writes for the JSON API.
+
+A batch is a list of create, update and delete operations, typically an
+offline client's queue. Every operation is validated with EntryForm and
+checked in order against the user's entries, so later operations see
+earlier ones (a delete frees its day for a create, a second update of an
+entry changes what the first one left). The valid ones are
+written in one transaction with a bulk query per kind plus bulk tag writes,
+and streaks, the search index and the calendar cache are refreshed once.
+Invalid operations are reported back and skipped.
+"""
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .derived import deferred_stats, refresh_after_bulk_write
+from .forms import EntryForm
+from .models import JournalEntry
+from .tags import set_tags_bulk
+
+MAX_OPERATIONS = 500
+OPERATIONS = ("create", "update", "delete")
+UPDATE_FIELDS = ("title", "content", "date", "updated_at", *JournalEntry.TEXT_FIELDS)
+
+
+def _result(index, kind, entry_id=None, errors=None):
+    if errors:
+        return {"index": index, "op": kind, "status": "error", "id": entry_id, "errors": errors}
+    return {"index": index, "op": kind, "status": "ok", "id": entry_id}
+
+
+def _type_errors(operation):
+    errors = {}
+    for name in ("title", "content", "date"):
+        if operation.get(name) is not None and not isinstance(operation[name], str):
+            errors[name] = ["Must be a string."]
+    tags = operation.get("tags")
+    if tags is not None and not isinstance(tags, str) and not (
+            isinstance(tags, list) and all(isinstance(name, str) for name in tags)):
+        errors["tags"] = ["Must be a string or a list of strings."]
+    return errors
+
+
+def _validate(operation, entry=None):
+    # EntryForm on the operation, missing fields of an update keep their value
+    errors = _type_errors(operation)
+    if errors:
+        return None, errors
+    tags = operation.get("tags") or []
+    form = EntryForm({
+        "title": operation.get("title", entry.title if entry else ""),
+        "content": operation.get("content", entry.content if entry else ""),
+        "date": operation.get("date", entry.date.isoformat() if entry else ""),
+        "tags": tags if isinstance(tags, str) else ", ".join(tags),
+    })
+    if not form.is_valid():
+        return None, {field: list(errors) for field, errors in form.errors.items()}
+    return form.cleaned_data, None
+
+
+def _is_id(value):
+    # JSON true/false arrive as bools, which are ints too
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _temporary_dates(user, count):
+    # free days for moves that swap or chain: before the user's first entry,
+    # or after the last one when that is too close to date.min
+    span = JournalEntry.objects.filter(user=user).aggregate(first=Min("date"), last=Max("date"))
+    first, last = span["first"], span["last"]
+    if first.toordinal() > count:
+        return [first - timedelta(days=offset) for offset in range(1, count + 1)]
+    if date.max.toordinal() - last.toordinal() >= count:
+        return [last + timedelta(days=offset) for offset in range(1, count + 1)]
+    raise ValueError("No free dates to move the entries through, move them in separate batches.")
+
+
+def apply_batch(user, operations):
+    """
+    Apply `operations` (dicts with "op" and, for update/delete, "id") for
+    `user` and return one result per operation, in order. Raises ValueError
+    when the batch itself is malformed or its moves can't be written, and
+    IntegrityError when a concurrent write took one of its days (nothing is
+    written then).
+    """
+    if not isinstance(operations, list) or not all(isinstance(operation, dict) for operation in operations):
+        raise ValueError("operations must be a list of objects.")
+    if len(operations) > MAX_OPERATIONS:
+        raise ValueError(f"At most {MAX_OPERATIONS} operations per batch.")
+
+    results = [None] * len(operations)
+    created, updated, deleted = [], {}, set()
+    tags_by_entry = {}
+
+    with transaction.atomic(), deferred_stats():
+        ids = {operation.get("id") for operation in operations
+               if operation.get("op") in ("update", "delete") and _is_id(operation.get("id"))}
+        entries = {entry.pk: entry for entry in JournalEntry.objects.select_for_update().filter(user=user, id__in=ids)}
+        stored_dates = {entry_id: entry.date for entry_id, entry in entries.items()}
+
+        # validation doesn't need the database, do it before the day lookup
+        checked = []
+        for index, operation in enumerate(operations):
+            kind, entry_id = operation.get("op"), operation.get("id")
+            if kind not in OPERATIONS:
+                results[index] = _result(index, kind, errors={"op": [f"Must be one of {', '.join(OPERATIONS)}."]})
+            elif kind != "create" and not (_is_id(entry_id) and entry_id in entries):
+                results[index] = _result(index, kind, entry_id, {"id": ["No entry with this id."]})
+            elif kind == "delete":
+                checked.append((index, kind, entry_id, None))
+            else:
+                fields, errors = _validate(operation, entries.get(entry_id))
+                if errors:
+                    results[index] = _result(index, kind, entry_id, errors)
+                else:
+                    checked.append((index, kind, entry_id, fields))
+
+        # who holds each day, as the operations move entries around
+        days = {fields["date"] for _, _, _, fields in checked if fields}
+        taken = dict(JournalEntry.objects.filter(user=user, date__in=days).values_list("date", "id"))
+        taken.update((entry.date, entry.pk) for entry in entries.values())
+
+        for index, kind, entry_id, fields in checked:
+            entry = entries.get(entry_id)
+            if entry_id in deleted:
+                results[index] = _result(index, kind, entry_id, {"id": ["No entry with this id."]})
+                continue
+            if kind == "delete":
+                deleted.add(entry_id)
+                taken.pop(entry.date, None)
+                updated.pop(entry_id, None)
+                tags_by_entry.pop(entry_id, None)
+                results[index] = _result(index, kind, entry_id)
+                continue
+
+            if kind == "update":
+                # only the fields the operation sets, onto what earlier
+                # operations on the entry left
+                fields = {name: value for name, value in fields.items() if name in operations[index]}
+            day = fields.get("date", entry.date if entry else None)
+            holder = taken.get(day)
+            if holder is not None and holder != entry_id:
+                results[index] = _result(index, kind, entry_id, {"date": ["An entry already exists on this date."]})
+                continue
+
+            if kind == "create":
+                entry = JournalEntry(user=user)
+                created.append((index, entry, fields["tags"]))
+            else:
+                taken.pop(entry.date, None)
+                updated[entry_id] = entry
+                if "tags" in operations[index]:
+                    tags_by_entry[entry_id] = fields["tags"]
+            for name in ("title", "content", "date"):
+                if name in fields:
+                    setattr(entry, name, fields[name])
+            entry.update_text_fields()  # bulk writes skip save()
+            taken[entry.date] = entry_id if kind == "update" else (None, index)
+            results[index] = _result(index, kind, entry_id)
+
+        if deleted:
+            # per-entry receivers still write tombstones and unindex
+            JournalEntry.objects.filter(pk__in=deleted).delete()
+        if updated:
+            now = timezone.now()
+            for entry in updated.values():
+                entry.updated_at = now
+            # one UPDATE checks the unique (user, date) row by row, so entries
+            # moving onto days other entries of the batch are leaving go
+            # through free days first
+            moved = [entry for entry in updated.values() if entry.date != stored_dates[entry.pk]]
+            left = {stored_dates[entry.pk] for entry in moved}
+            if any(entry.date in left for entry in moved):
+                final_dates = [entry.date for entry in moved]
+                for entry, day in zip(moved, _temporary_dates(user, len(moved))):
+                    entry.date = day
+                JournalEntry.objects.bulk_update(moved, ["date"])
+                for entry, day in zip(moved, final_dates):
+                    entry.date = day
+            JournalEntry.objects.bulk_update(list(updated.values()), UPDATE_FIELDS)
+        if created:
+            JournalEntry.objects.bulk_create([entry for _, entry, _ in created])
+            # MySQL doesn't return ids from bulk inserts, look them up by date
+            ids_by_date = dict(JournalEntry.objects.filter(
+                user=user, date__in=[entry.date for _, entry, _ in created]).values_list("date", "id"))
+            for index, entry, tags in created:
+                entry.pk = ids_by_date[entry.date]
+                results[index]["id"] = entry.pk
+                tags_by_entry[entry.pk] = tags
+        set_tags_bulk(tags_by_entry)
+
+    written = [*updated, *(entry.pk for _, entry, _ in created)]
+    if written or deleted:
+        refresh_after_bulk_write(user.id, written)
+    return results
@@ -0,0 +1,206 @@
+"""
+Per-user cache of the data behind the calendar (index) page.
+
+Three kinds of values are cached, all namespaced by a per-user version:
+
+- the month grid and entry count for (user, year, month),
+- the entry shown in the "today" panel for (user, date), with its tags,
+- the user's UserProfile, for totals and streaks.
+
+aget_calendar() is the async twin of get_calendar() for async views.
+
+Entry saves/deletes and tag changes delete exactly the keys they affect (see
+the receivers in models.py); bulk writers call invalidate_user(), which bumps
+the version so every key of that user is dropped at once. Invalidation runs
+right away and again once the transaction commits, so a read in between
+can't keep the old rows cached.
+
+Invalidation only reaches the cache of the process that wrote, so with a
+per-process cache (LocMemCache) and several workers settings.CALENDAR_CACHE
+is off (the prod default) and every read builds the values instead. The
+profile is also left out while run_jobs may save it from a process with
+another cache (utils.cache_profiles()).
+"""
+import calendar
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .utils import (
+    acache_version, bump_cache_version, cache_profiles, cache_version, month_bounds, now_and_on_commit,
+)
+
+CACHE_TIMEOUT = 60 * 60 * 24
+KEY_PREFIX = "journal:calendar"
+
+
+def _version_key(user_id):
+    return f"{KEY_PREFIX}:version:{user_id}"
+
+
+def _prefix(user_id):
+    return f"{KEY_PREFIX}:{user_id}:{cache_version(_version_key(user_id))}"
+
+
+def _month_key(prefix, year, month):
+    return f"{prefix}:month:{year}-{month}"
+
+
+def _day_key(prefix, day):
+    return f"{prefix}:day:{day.isoformat()}"
+
+
+def _profile_key(prefix):
+    return f"{prefix}:profile"
+
+
+# Reads
+
+def get_calendar(user_id, year, month, today):
+    """
+    Return (month_data, today_entry, profile) for the index page, reading all
+    three from the cache in one round trip and building whichever are missing.
+    """
+    if not settings.CALENDAR_CACHE:
+        return build_month(user_id, year, month), build_day(user_id, today)["entry"], build_profile(user_id)
+    prefix = _prefix(user_id)
+    keys = {
+        "month": _month_key(prefix, year, month),
+        "day": _day_key(prefix, today),
+        "profile": _profile_key(prefix),
+    }
+    if not cache_profiles():
+        del keys["profile"]
+    cached = cache.get_many(keys.values())
+    missing = {}
+
+    month_data = cached.get(keys["month"])
+    if month_data is None:
+        month_data = missing[keys["month"]] = build_month(user_id, year, month)
+
+    day_data = cached.get(keys["day"])
+    if day_data is None:
+        day_data = missing[keys["day"]] = build_day(user_id, today)
+
+    profile = cached.get(keys.get("profile"))
+    if profile is None:
+        profile = build_profile(user_id)
+        if "profile" in keys:
+            missing[keys["profile"]] = profile
+
+    if missing:
+        cache.set_many(missing, CACHE_TIMEOUT)
+    return month_data, day_data["entry"], profile
+
+
+def build_month(user_id, year, month):
+    """
+    {"weeks": [[{"day": date|None, "entry": id|None}, ...], ...], "entries_this_month": n}
+    """
+    return _month_grid(year, month, dict(_month_days(user_id, year, month)))
+
+
+def _month_days(user_id, year, month):
+    from .models import JournalEntry
+
+    return JournalEntry.objects.filter(
+        user_id=user_id, date__range=month_bounds(year, month)).values_list("date", "id")
+
+
+def _month_grid(year, month, days):
+    weeks = []
+    for week in calendar.monthcalendar(year, month):
+        week_data = []
+        for day in week:
+            # 0 means the day is not part of the current month
+            current_date = date(year, month, day) if day else None
+            week_data.append({"day": current_date, "entry": days.get(current_date)})
+        weeks.append(week_data)
+    return {"weeks": weeks, "entries_this_month": len(days)}
+
+
+def build_day(user_id, day):
+    # wrapped in a dict so that "no entry" is cached as well
+    return {"entry": _day_entry(user_id, day).first()}
+
+
+def _day_entry(user_id, day):
+    from .models import JournalEntry
+
+    # light: the panel shows the excerpt, never the body
+    return JournalEntry.objects.filter(user_id=user_id, date=day).light()
+
+
+def build_profile(user_id):
+    from .models import UserProfile
+
+    return UserProfile.objects.get_or_create(user_id=user_id)[0]
+
+
+# Async reads, same keys and values as above
+
+async def _aprefix(user_id):
+    return f"{KEY_PREFIX}:{user_id}:{await acache_version(_version_key(user_id))}"
+
+
+async def aget_calendar(user_id, year, month, today):
+    """
+    get_calendar() for async views, built with the async ORM.
+    """
+    from .models import UserProfile
+
+    if not settings.CALENDAR_CACHE:
+        days = {day: entry_id async for day, entry_id in _month_days(user_id, year, month)}
+        return (_month_grid(year, month, days), await _day_entry(user_id, today).afirst(),
+                (await UserProfile.objects.aget_or_create(user_id=user_id))[0])
+    prefix = await _aprefix(user_id)
+    keys = {
+        "month": _month_key(prefix, year, month),
+        "day": _day_key(prefix, today),
+        "profile": _profile_key(prefix),
+    }
+    if not cache_profiles():
+        del keys["profile"]
+    cached = await cache.aget_many(keys.values())
+    missing = {}
+
+    month_data = cached.get(keys["month"])
+    if month_data is None:
+        days = {day: entry_id async for day, entry_id in _month_days(user_id, year, month)}
+        month_data = missing[keys["month"]] = _month_grid(year, month, days)
+
+    day_data = cached.get(keys["day"])
+    if day_data is None:
+        day_data = missing[keys["day"]] = {"entry": await _day_entry(user_id, today).afirst()}
+
+    profile = cached.get(keys.get("profile"))
+    if profile is None:
+        profile = (await UserProfile.objects.aget_or_create(user_id=user_id))[0]
+        if "profile" in keys:
+            missing[keys["profile"]] = profile
+
+    if missing:
+        await cache.aset_many(missing, CACHE_TIMEOUT)
+    return month_data, day_data["entry"], profile
+
+
+# Invalidation
+
+def invalidate_dates(user_id, *dates):
+    def delete():
+        prefix = _prefix(user_id)
+        keys = set()
+        for day in filter(None, dates):
+            keys.add(_month_key(prefix, day.year, day.month))
+            keys.add(_day_key(prefix, day))
+        cache.delete_many(keys)
+    now_and_on_commit(delete)
+
+
+def invalidate_profile(user_id):
+    now_and_on_commit(lambda: cache.delete(_profile_key(_prefix(user_id))))
+
+
+def invalidate_user(user_id):
+    now_and_on_commit(lambda: bump_cache_version(_version_key(user_id)))
@@ -0,0 +1,153 @@
+"""
+Compressed storage for JournalEntry.content.
+
+TinyMCE HTML is verbose and compresses well. With
+settings.ENTRY_CONTENT_COMPRESSION set to "zlib" (or "zstd", which needs the
+zstandard package and falls back to zlib without it) content of at least
+ENTRY_CONTENT_COMPRESS_MIN_BYTES is written as a marker, the method and the
+base64 of the compressed UTF-8:
+
+    "\\x02zlib:eJyzKbCzS8svyk0s..."
+
+The column stays a text column, so rows written before compression was turned
+on, or below the threshold, are plain HTML and are read as they are. Content
+that happens to start with the marker is always compressed, so anything read
+with the marker is a payload.
+
+Loading an entry keeps the payload as it is and it is only decompressed when
+.content is first read. values()/values_list() return the stored form, pass
+it through decompress_text(). The recompress() helper (and the
+compress_entries command) rewrites stored content under the current settings.
+"""
+import base64
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 1000
+MARKER = "\x02"
+METHODS = ("zlib", "zstd")
+
+
+def _method(method):
+    # the method payloads are written with: zstd needs the zstandard package
+    if method not in METHODS:
+        raise ImproperlyConfigured(f"Unknown ENTRY_CONTENT_COMPRESSION {method!r}, use 'zlib' or 'zstd'.")
+    return "zlib" if method == "zstd" and zstandard is None else method
+
+
+def _compress(method, data):
+    if method == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return zlib.compress(data)
+
+
+def _decompress(method, data):
+    if method == "zlib":
+        return zlib.decompress(data)
+    if method == "zstd":
+        if zstandard is None:
+            raise ImproperlyConfigured("zstd compressed entries need the zstandard package.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown compression method {method!r}.")
+
+
+def compress_text(value, method=None, min_bytes=None):
+    """
+    The stored form of `value`: a payload when it is compressed, otherwise
+    `value` itself. Defaults to the ENTRY_CONTENT_* settings.
+    """
+    method = settings.ENTRY_CONTENT_COMPRESSION if method is None else method
+    min_bytes = settings.ENTRY_CONTENT_COMPRESS_MIN_BYTES if min_bytes is None else min_bytes
+    escape = value.startswith(MARKER)
+    data = value.encode()
+    if not escape and (not method or len(data) < min_bytes):
+        return value
+    method = _method(method or "zlib")
+    payload = f"{MARKER}{method}:{base64.b64encode(_compress(method, data)).decode('ascii')}"
+    # not worth it, unless the marker has to be escaped
+    return payload if escape or len(payload) < len(data) else value
+
+
+def decompress_text(value):
+    """
+    Inverse of compress_text().
+    """
+    if not value.startswith(MARKER):
+        return value
+    method, _, encoded = value[1:].partition(":")
+    return _decompress(method, base64.b64decode(encoded)).decode()
+
+
+class CompressedText(str):
+    """
+    A payload read from the database, decompressed when the field is read.
+    """
+    def decompress(self):
+        return decompress_text(self)
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = instance.__dict__[self.field.attname] = value.decompress()
+        return value
+
+    # a data descriptor, or the instance __dict__ would shadow __get__
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField whose values are compressed on save, see the module docstring.
+    Lookups compare with the stored form and are not compressed.
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def from_db_value(self, value, expression, connection):
+        if value is not None and value.startswith(MARKER):
+            return CompressedText(value)
+        return value
+
+    def get_db_prep_save(self, value, connection):
+        value = super().get_db_prep_save(value, connection)
+        if isinstance(value, CompressedText):
+            # never decompressed, write it back as it is
+            return str(value)
+        # None, or an expression: bulk_update's Case() prepares its values itself
+        return compress_text(value) if isinstance(value, str) else value
+
+
+def recompress(entries, field="content", batch_size=CHUNK_SIZE):
+    """
+    Rewrite `field` of a queryset under the current settings, compressing,
+    decompressing or switching method where the stored form differs. Walks
+    primary keys like derived.backfill_text_fields, returns how many changed.
+    """
+    model = entries.model
+    entries = entries.only("id", field).order_by("pk")
+    count = 0
+    last_pk = 0
+    while True:
+        batch = list(entries.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return count
+        changed = []
+        for entry in batch:
+            stored = entry.__dict__[field]
+            if compress_text(getattr(entry, field)) != stored:
+                changed.append(entry)
+        # bulk_update compresses again, nothing else of the rows changes
+        model.objects.bulk_update(changed, [field])
+        count += len(changed)
+        last_pk = batch[-1].pk
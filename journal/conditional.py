@@ -0,0 +1,83 @@
+"""
+HTTP validators for the entry pages and APIs.
+
+They come from one aggregate or one-column query over indexed columns, so a
+re-visit of something unchanged costs that query and a 304, not the entry
+content, tags and template render. Tag changes bump updated_at and every
+create or delete changes the count, so the pair covers all edits. HTML pages
+also embed the CSRF token of their forms, see page_etag().
+"""
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import JournalEntry
+
+# browsers keep the body but must ask before reusing it
+CACHE_CONTROL = "private, no-cache"
+
+
+def _etag(*parts):
+    return quote_etag("-".join(str(part) for part in parts))
+
+
+async def ajournal_etag(user_id):
+    """
+    ETag for anything built from the user's whole journal (lists, and the
+    entry page whose prev/next links depend on the neighbouring days).
+    There is no Last-Modified: max(updated_at) doesn't move on a delete.
+    """
+    stats = await JournalEntry.objects.filter(user_id=user_id).aaggregate(
+        count=Count("id"), latest=Max("updated_at"))
+    latest = stats["latest"].isoformat() if stats["latest"] else "empty"
+    return _etag(user_id, stats["count"], latest)
+
+
+def page_etag(request, etag):
+    """
+    `etag` for an HTML page with forms. The page embeds a CSRF token, which
+    is only valid with the current CSRF secret and session; signing in again
+    replaces both, and a reused page would then fail its POSTs. So the ETag
+    follows a hash of the two.
+    """
+    session_key = getattr(request, "session", None) and request.session.session_key
+    secret = f"{session_key or ''}:{request.META.get('CSRF_COOKIE') or ''}"
+    return _etag(etag.strip('"'), hashlib.sha256(secret.encode()).hexdigest()[:16])
+
+
+async def aentry_validators(user_id, entry_id):
+    """
+    (etag, last_modified) of one entry, or None when the user has no such entry.
+    """
+    updated_at = await JournalEntry.objects.filter(id=entry_id, user_id=user_id).values_list(
+        "updated_at", flat=True).afirst()
+    if updated_at is None:
+        return None
+    return _etag(user_id, entry_id, updated_at.isoformat()), timegm(updated_at.utctimetuple())
+
+
+def check_preconditions(request, etag, last_modified=None):
+    """
+    The 304 (or 412 for failed If-Match on writes) to return right away,
+    or None when the view should go on and build the response.
+    """
+    if_match = request.META.get("HTTP_IF_MATCH")
+    if if_match:
+        # compressed responses carry the ETag weakened (W/"..."), and If-Match
+        # compares strongly; the representation is the same before encoding
+        request.META["HTTP_IF_MATCH"] = if_match.replace('W/"', '"')
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = CACHE_CONTROL
+    return response
@@ -0,0 +1,21 @@
+"""
+Per-connection database setup.
+
+SQLite keeps most of its tuning per connection, so the PRAGMAs in
+settings.SQLITE_PRAGMAS are applied whenever Django opens one. The defaults
+in the dev settings switch to write-ahead logging, where readers don't block
+the writer, fsync only at checkpoints (synchronous=NORMAL, still safe with
+WAL) and wait for a lock instead of failing with "database is locked".
+"""
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+    # on the sqlite3 connection itself, so the query budget doesn't count them
+    for name, value in pragmas.items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,47 @@
+"""
+Async counterparts of Django's view decorators.
+
+Django 4.2's login_required and require_http_methods wrap views in plain
+functions, which turns an ``async def`` view back into a sync one that runs
+in a thread. These keep the view a coroutine.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseNotAllowed
+from django.shortcuts import resolve_url
+from django.utils.log import log_response
+
+
+def async_login_required(login_url=None):
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            # request.user is lazy and loads the session and user from the
+            # database, resolve it once outside the event loop
+            is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+            if not is_authenticated:
+                return redirect_to_login(request.get_full_path(), resolve_url(login_url or settings.LOGIN_URL))
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def async_require_http_methods(request_method_list):
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in request_method_list:
+                response = HttpResponseNotAllowed(request_method_list)
+                log_response(
+                    "Method Not Allowed (%s): %s", request.method, request.path,
+                    response=response, request=request)
+                return response
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async_require_GET = async_require_http_methods(["GET"])
@@ -0,0 +1,67 @@
+"""
+Derived data upkeep for writes that bypass model signals.
+
+Single-entry saves keep streaks, tag usage and the search index in sync
+by queuing jobs from the receivers in models.py (see jobs.py), and drop
+their calendar cache keys. Bulk paths (bulk_create/bulk_update) skip those
+signals and call refresh_after_bulk_write() once at the end.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from . import calendar_cache
+from .jobs import CHUNK_SIZE, enqueue
+from .models import DerivedJob
+from .utils import text_fields
+
+_stats_deferred = ContextVar("stats_deferred", default=False)
+
+
+def refresh_after_bulk_write(user_id, entry_ids=()):
+    """
+    Queue one rebuild of a user's aggregates and tag usage, and a reindex
+    of the written entries.
+    """
+    enqueue(user_id, [DerivedJob.STATS, DerivedJob.TAGS], entry_ids)
+    calendar_cache.invalidate_user(user_id)
+
+
+@contextmanager
+def deferred_stats():
+    """
+    Skip the per-entry streak/count rebuilds of the save and delete
+    receivers inside the block; the caller runs refresh_after_bulk_write()
+    once afterwards.
+    """
+    token = _stats_deferred.set(True)
+    try:
+        yield
+    finally:
+        _stats_deferred.reset(token)
+
+
+def stats_deferred():
+    return _stats_deferred.get()
+
+
+def backfill_text_fields(entries, batch_size=CHUNK_SIZE):
+    """
+    Recompute JournalEntry.TEXT_FIELDS for a queryset in batches of
+    bulk_update, walking primary keys so the table can be written while it
+    is read. Works with historical models, returns the number updated.
+    """
+    model = entries.model
+    fields = list(text_fields("").keys())
+    entries = entries.only("id", "content").order_by("pk")
+    count = 0
+    last_pk = 0
+    while True:
+        batch = list(entries.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return count
+        for entry in batch:
+            for name, value in text_fields(entry.content).items():
+                setattr(entry, name, value)
+        model.objects.bulk_update(batch, fields)
+        count += len(batch)
+        last_pk = batch[-1].pk
@@ -1,5 +1,6 @@
 from django import forms
 from .models import JournalEntry, Tag
+from .tags import normalize_tag_names
 from django.contrib.auth.forms import PasswordChangeForm
 from tinymce.widgets import TinyMCE
 from django.utils.translation import gettext_lazy as _
@@ -71,12 +72,7 @@ class EntryForm(forms.ModelForm):
 
     # this will automatically run when form.is_valid() called
     def clean_tags(self):
-        tags = self.cleaned_data.get("tags")
-        if tags:
-            cleaned_tags = [tag.strip() for tag in tags.split(",")]
-            return cleaned_tags
-        else:
-            return []
+        return normalize_tag_names(self.cleaned_data.get("tags"))
 
 class ChangePasswordCustomForm(PasswordChangeForm):
     # remove colon ":" suffix from labels
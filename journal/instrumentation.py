@@ -0,0 +1,266 @@
+"""
+Per-request SQL, template and response size instrumentation.
+
+InstrumentationMiddleware measures every request: number of queries, time
+spent in the database, time spent rendering templates, total time and
+response size. The numbers are aggregated per view for the Prometheus-style
+metrics endpoint, and sent back in a Server-Timing header with
+settings.SERVER_TIMING on (off in prod) or to staff users, since they show
+how the server works.
+
+Views can declare how many queries they may run with @query_budget(n). A
+request over budget logs a warning, or raises QueryBudgetExceeded when
+settings.QUERY_BUDGET_STRICT is on (see journal.testing).
+
+Queries are counted by a database execute wrapper and templates by the
+DjangoTemplates backend below. Both report to the current request through a
+context variable, so they work the same for sync and async views.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends import django as django_backend
+from django.utils.functional import empty
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+_current = ContextVar("journal_request_metrics", default=None)
+
+
+def current_metrics():
+    """
+    Metrics of the request being handled, None outside of a request.
+    """
+    return _current.get()
+
+
+def query_budget(max_queries, methods=None):
+    """
+    Declare the most queries a view may run per request (session and user
+    lookups included), for requests with one of `methods` when given.
+    Stacks with the other view decorators in any order.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        view_func.query_budget_methods = methods
+        return view_func
+    return decorator
+
+
+# Collectors
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connected to connection_created in JournalConfig.ready()
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    The stock backend, with rendering time reported to the current request.
+    {% include %} and {% extends %} render inside the outer template, so only
+    top-level renders are timed.
+    """
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+# Aggregation
+
+class MetricsRegistry:
+    """
+    Process-wide totals per view. Every worker process keeps its own, so the
+    scraper sees one series per process.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(int)
+        self.views = defaultdict(lambda: {
+            "duration": 0.0, "queries": 0, "db_time": 0.0, "template_time": 0.0,
+            "response_bytes": 0, "over_budget": 0, "buckets": [0] * len(DURATION_BUCKETS), "count": 0,
+        })
+
+    def observe(self, view, method, status, metrics, elapsed, size, over_budget):
+        with self.lock:
+            self.requests[view, method, status] += 1
+            totals = self.views[view]
+            totals["count"] += 1
+            totals["duration"] += elapsed
+            totals["queries"] += metrics.queries
+            totals["db_time"] += metrics.db_time
+            totals["template_time"] += metrics.template_time
+            totals["response_bytes"] += size or 0
+            totals["over_budget"] += over_budget
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if elapsed <= bound:
+                    totals["buckets"][index] += 1
+
+    def render(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        with self.lock:
+            requests = dict(self.requests)
+            views = {view: {**totals, "buckets": list(totals["buckets"])} for view, totals in self.views.items()}
+
+        lines = [
+            "# HELP journal_requests_total Requests handled, by view, method and status.",
+            "# TYPE journal_requests_total counter",
+        ]
+        for (view, method, status), count in sorted(requests.items()):
+            lines.append(f'journal_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP journal_request_duration_seconds Time spent handling requests.",
+            "# TYPE journal_request_duration_seconds histogram",
+        ]
+        for view, totals in sorted(views.items()):
+            for bound, count in zip(DURATION_BUCKETS, totals["buckets"]):
+                lines.append(f'journal_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {count}')
+            lines.append(f'journal_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {totals["count"]}')
+            lines.append(f'journal_request_duration_seconds_sum{{view="{view}"}} {totals["duration"]:.6f}')
+            lines.append(f'journal_request_duration_seconds_count{{view="{view}"}} {totals["count"]}')
+
+        for name, key, kind, help_text, fmt in [
+            ("journal_db_queries_total", "queries", "counter", "SQL queries run.", "d"),
+            ("journal_db_duration_seconds_total", "db_time", "counter", "Time spent in SQL queries.", ".6f"),
+            ("journal_template_duration_seconds_total", "template_time", "counter",
+             "Time spent rendering templates.", ".6f"),
+            ("journal_response_bytes_total", "response_bytes", "counter",
+             "Response body bytes, streamed responses excluded.", "d"),
+            ("journal_query_budget_exceeded_total", "over_budget", "counter",
+             "Requests that ran more queries than the view's budget.", "d"),
+        ]:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for view, totals in sorted(views.items()):
+                lines.append(f'{name}{{view="{view}"}} {totals[key]:{fmt}}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# Middleware
+
+class InstrumentationMiddleware:
+    """
+    Keep it first in MIDDLEWARE so the session and auth queries are counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def send_timing(self, request):
+        if settings.SERVER_TIMING:
+            return True
+        # only a user the request already loaded, the check mustn't query
+        user = getattr(request, "user", None)
+        return user is not None and getattr(user, "_wrapped", None) is not empty and user.is_staff
+
+    def finish(self, request, response, metrics):
+        elapsed = metrics.elapsed
+        # streamed bodies are produced after we return, their queries and
+        # size can't be attributed here
+        size = None if response.streaming else len(response.content)
+
+        if self.send_timing(request):
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+                f"tpl;dur={metrics.template_time * 1000:.1f}",
+                f"total;dur={elapsed * 1000:.1f}",
+            ])
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+        budget = getattr(match.func, "query_budget", None) if match else None
+        methods = getattr(match.func, "query_budget_methods", None) if match else None
+        if methods is not None and request.method not in methods:
+            budget = None
+        over_budget = budget is not None and metrics.queries > budget
+
+        registry.observe(view, request.method, response.status_code, metrics, elapsed, size, over_budget)
+
+        if over_budget:
+            message = f"{view} ran {metrics.queries} queries, its budget is {budget}."
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,132 @@
+"""
+Post-commit queue for data derived from a user's entries.
+
+An entry write changes streaks and counts (UserProfile.rebuild_stats), tag
+usage (TagUsage.refresh) and the search index. enqueue() records that work.
+With settings.JOB_QUEUE_EAGER (the default outside production) it is done
+right away, inside the write's transaction. Otherwise DerivedJob rows are
+inserted once the transaction commits, and the run_jobs command works
+through them.
+
+Rows are unique per (user, kind, entry, tag), so work queued again before a
+worker gets to it is coalesced into the pending row. A worker claims a
+user's jobs by deleting their rows in the transaction that does the work.
+If it crashes, the claim rolls back. Work queued while a job runs gets a new
+row. Every job recomputes from the entries, so running one twice is
+harmless.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from . import search
+from .models import DerivedJob, JournalEntry, TagUsage, UserProfile
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(seconds=30)  # doubled after every failed attempt
+
+
+def enqueue(user_id, kinds=(), entry_ids=(), tag_ids=()):
+    """
+    Queue `kinds` (DerivedJob.STATS, TAGS for all tags) for the user,
+    reindexing of `entry_ids` and recounting of `tag_ids`, for when the
+    current transaction commits.
+    """
+    if settings.JOB_QUEUE_EAGER:
+        run(user_id, kinds, entry_ids, tag_ids)
+        return
+    jobs = [DerivedJob(user_id=user_id, kind=kind) for kind in kinds]
+    jobs += [DerivedJob(user_id=user_id, kind=DerivedJob.SEARCH, entry_id=pk) for pk in entry_ids]
+    jobs += [DerivedJob(user_id=user_id, kind=DerivedJob.TAGS, tag_id=pk) for pk in tag_ids]
+    if jobs:
+        transaction.on_commit(lambda: DerivedJob.objects.bulk_create(
+            jobs, batch_size=CHUNK_SIZE, ignore_conflicts=True))
+
+
+def run(user_id, kinds=(), entry_ids=(), tag_ids=()):
+    """
+    Do the work of the given jobs for one user.
+    """
+    if DerivedJob.STATS in kinds:
+        UserProfile.objects.get_or_create(user_id=user_id)[0].rebuild_stats()
+    if DerivedJob.TAGS in kinds:
+        TagUsage.refresh(user_id)
+    elif tag_ids:
+        TagUsage.refresh(user_id, list(tag_ids))
+    entry_ids = list(entry_ids)
+    for start in range(0, len(entry_ids), CHUNK_SIZE):
+        chunk = entry_ids[start:start + CHUNK_SIZE]
+        indexed = set()
+        for entry in JournalEntry.objects.filter(user_id=user_id, id__in=chunk):
+            search.index_entry(entry)
+            indexed.add(entry.pk)
+        # the ones that are gone were deleted
+        for pk in set(chunk) - indexed:
+            search.remove_entry(pk)
+
+
+def due_batches(limit):
+    """
+    Ids of up to `limit` jobs that are due, oldest first, grouped by user.
+    """
+    batches = defaultdict(list)
+    due = DerivedJob.objects.filter(run_after__lte=timezone.now()).order_by("id")
+    for job_id, user_id in due.values_list("id", "user_id")[:limit]:
+        batches[user_id].append(job_id)
+    return list(batches.values())
+
+
+def run_batch(job_ids):
+    """
+    Claim and run the jobs with these ids, all of one user, in a single
+    transaction. Returns how many ran. If they fail the claim is rolled
+    back, and they are retried later or dropped after MAX_ATTEMPTS.
+    """
+    # a worker thread is like a request thread: respect CONN_MAX_AGE
+    close_old_connections()
+    jobs = []
+    try:
+        with transaction.atomic():
+            claimed = DerivedJob.objects.filter(id__in=job_ids)
+            if connection.features.has_select_for_update_skip_locked:
+                claimed = claimed.select_for_update(skip_locked=True)
+            jobs = list(claimed)
+            if not jobs:
+                return 0
+            DerivedJob.objects.filter(id__in=[job.id for job in jobs]).delete()
+            # tag jobs for single tags are folded into a job for all of them
+            run(jobs[0].user_id, {job.kind for job in jobs if job.kind != DerivedJob.TAGS or not job.tag_id},
+                [job.entry_id for job in jobs if job.kind == DerivedJob.SEARCH],
+                [job.tag_id for job in jobs if job.kind == DerivedJob.TAGS and job.tag_id])
+    except Exception as error:
+        logger.exception("Derived data jobs %s failed.", job_ids)
+        _retry(jobs, error)
+        return 0
+    finally:
+        close_old_connections()
+    return len(jobs)
+
+
+def _retry(jobs, error):
+    retry, dropped = [], []
+    for job in jobs:
+        job.attempts += 1
+        if job.attempts >= MAX_ATTEMPTS:
+            dropped.append(job.id)
+            continue
+        job.run_after = timezone.now() + RETRY_DELAY * 2 ** (job.attempts - 1)
+        job.last_error = repr(error)
+        retry.append(job)
+    if dropped:
+        logger.error("Dropping jobs %s after %d attempts, run rebuild_stats and "
+                     "rebuild_search_index to catch up.", dropped, MAX_ATTEMPTS)
+        DerivedJob.objects.filter(id__in=dropped).delete()
+    if retry:
+        DerivedJob.objects.bulk_update(retry, ["attempts", "run_after", "last_error"])
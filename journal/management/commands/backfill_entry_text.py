@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.derived import CHUNK_SIZE, backfill_text_fields
+from journal.models import JournalEntry
+
+
+class Command(BaseCommand):
+    help = ("Recompute the plain_text, excerpt and word_count fields of entries, e.g. "
+            "after rows were written without save() or the excerpt length changed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only this username's entries.")
+        parser.add_argument("--missing", action="store_true",
+                            help="Only entries with content but no plain_text yet.")
+        parser.add_argument("--batch-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        entries = JournalEntry.objects.all()
+        if options["user"]:
+            try:
+                entries = entries.filter(user=User.objects.get(username=options["user"]))
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+        if options["missing"]:
+            entries = entries.filter(plain_text="").exclude(content="")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        count = backfill_text_fields(entries, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Updated {count} entries."))
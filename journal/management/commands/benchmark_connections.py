@@ -0,0 +1,96 @@
+import gc
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import override_settings
+
+from journal.management.commands.benchmark_views import percentile
+from journal.management.commands.loadtest import Command as LoadTest, paths, session_cookie, wsgi_driver
+from journal.models import JournalEntry
+
+# SQLite's own defaults, what every connection ran with before journal/db.py
+SQLITE_DEFAULTS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+
+class Command(BaseCommand):
+    help = ("Compare database connection settings under concurrent load: a new connection "
+            "per request against persistent ones, and on SQLite the default journal against "
+            "the tuned PRAGMAs. Mixes GETs with entry updates and reports throughput.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="bench", help="Benchmark users created by seed_journal.")
+        parser.add_argument("--users", type=int, default=5, help="How many of them to rotate through.")
+        parser.add_argument("--requests", type=int, default=1000, help="Requests per run.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Worker threads.")
+        parser.add_argument("--write-ratio", type=float, default=0.1,
+                            help="Fraction of requests that PUT an entry update.")
+        parser.add_argument("--conn-max-age", type=int, default=600,
+                            help="CONN_MAX_AGE of the persistent runs.")
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__startswith=f"{options['prefix']}_")
+                     .order_by("id")[:options["users"]])
+        if not users:
+            raise CommandError(f"No {options['prefix']}_* users, run seed_journal first.")
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+        if not 0 <= options["write_ratio"] <= 1:
+            raise CommandError("--write-ratio must be between 0 and 1.")
+
+        reads, writes = [], []
+        for user in users:
+            cookie = session_cookie(user)
+            reads += [(path, cookie) for path in paths(user)]
+            latest = JournalEntry.objects.filter(user=user).latest("date")
+            writes.append((f"/api/entry/{latest.id}/", cookie))
+
+        # spread the writes evenly through the run
+        requests, due = [], 0.0
+        for index in range(options["requests"]):
+            due += options["write_ratio"]
+            if due >= 1:
+                due -= 1
+                path, cookie = writes[index % len(writes)]
+                body = json.dumps({"title": f"Benchmark {index}"}).encode()
+                requests.append((path, cookie, "PUT", body))
+            else:
+                requests.append(reads[index % len(reads)])
+
+        tuned = getattr(settings, "SQLITE_PRAGMAS", {})
+        runs = [("per request", 0, None), ("persistent", options["conn_max_age"], None)]
+        if connection.vendor == "sqlite":
+            runs = [
+                ("per request", 0, SQLITE_DEFAULTS),
+                ("persistent", options["conn_max_age"], SQLITE_DEFAULTS),
+                ("pragmas", 0, tuned),
+                ("both", options["conn_max_age"], tuned),
+            ]
+
+        self.stdout.write(f"{connection.vendor}, {options['requests']} requests, "
+                          f"{options['concurrency']} threads, {options['write_ratio']:.0%} writes\n")
+        self.stdout.write(f"{'run':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        database = connections.settings[DEFAULT_DB_ALIAS]
+        max_age = database["CONN_MAX_AGE"]
+        try:
+            for name, age, pragmas in runs:
+                results, wall = self.run(requests, options["concurrency"], age, pragmas)
+                durations = [seconds * 1000 for _, seconds in results]
+                errors = sum(1 for status, _ in results if status != 200)
+                self.stdout.write(f"{name:<14}{len(results) / wall:>10.1f}{percentile(durations, 0.5):>10.2f}"
+                                  f"{percentile(durations, 0.95):>10.2f}{errors:>8}")
+        finally:
+            database["CONN_MAX_AGE"] = max_age
+            connection.close()
+
+    def run(self, requests, concurrency, max_age, pragmas):
+        # the worker threads of the last run are gone, drop their connections
+        # so journal_mode can change and every run starts from a cold pool
+        gc.collect()
+        connection.close()
+        connections.settings[DEFAULT_DB_ALIAS]["CONN_MAX_AGE"] = max_age
+        with override_settings(**({"SQLITE_PRAGMAS": pragmas} if pragmas is not None else {})):
+            connection.ensure_connection()
+            return LoadTest().run_threads(wsgi_driver(), requests, concurrency)
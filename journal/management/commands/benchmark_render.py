@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Context, Template
+
+from journal.models import JournalEntry
+
+# what the list/profile/index templates rendered per entry before and after
+# the derived text fields
+SNIPPETS = {
+    "all_entries row": (
+        "{{ entry.content|striptags|truncatewords:30 }}",
+        "{{ entry.excerpt|truncatewords:30 }}",
+    ),
+    "profile row": (
+        "{{ entry.content|striptags|truncatewords:15 }}",
+        "{{ entry.excerpt|truncatewords:15 }}",
+    ),
+    "index today panel": (
+        "{{ entry.content|safe|truncatewords_html:50 }}{% if entry.content|wordcount > 50 %}more{% endif %}",
+        "{{ entry.excerpt }}{% if entry.word_count > 50 %}more{% endif %}",
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = ("Time rendering entry previews from the HTML content (filters) versus "
+            "the stored plain_text/excerpt/word_count fields.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=500, help="Entries to render per pass.")
+        parser.add_argument("--repeat", type=int, default=5, help="Passes, the best one is reported.")
+
+    def handle(self, *args, **options):
+        entries = list(JournalEntry.objects.order_by("-id")[:options["entries"]])
+        if not entries:
+            raise CommandError("No entries to render, run seed_journal first.")
+        words = sum(entry.word_count for entry in entries) / len(entries)
+        self.stdout.write(f"{len(entries)} entries, {words:.0f} words on average, best of {options['repeat']}")
+        self.stdout.write(f"{'snippet':<20}{'content ms':>12}{'fields ms':>12}{'speedup':>10}")
+
+        for name, (before, after) in SNIPPETS.items():
+            timings = [self.time_render(source, entries, options["repeat"]) for source in (before, after)]
+            self.stdout.write(f"{name:<20}{timings[0]:>12.1f}{timings[1]:>12.1f}{timings[0] / timings[1]:>9.1f}x")
+
+    def time_render(self, source, entries, repeat):
+        template = Template("{% for entry in entries %}" + source + "{% endfor %}")
+        context = Context({"entries": entries})
+        best = float("inf")
+        for _ in range(repeat):
+            began = time.perf_counter()
+            template.render(context)
+            best = min(best, time.perf_counter() - began)
+        return best * 1000
@@ -0,0 +1,74 @@
+import gzip
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.http import JsonResponse
+
+from journal import serializers
+from journal.management.commands.benchmark_views import percentile
+from journal.middleware import BROTLI_QUALITY, brotli
+from journal.models import JournalEntry
+
+
+class Command(BaseCommand):
+    help = ("Serialize the entries of the benchmark users the old way (instances, a tag "
+            "prefetch, serialize() and JsonResponse) and from values() rows with orjson "
+            "and with the json module, and report the time and the response size, raw "
+            "and compressed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="bench", help="Benchmark users created by seed_journal.")
+        parser.add_argument("--limit", type=int, default=10000, help="Entries serialized per run.")
+        parser.add_argument("--runs", type=int, default=10, help="Timed runs of each path.")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username__startswith=f"{options['prefix']}_")
+        if not users.exists():
+            raise CommandError(f"No {options['prefix']}_* users, run seed_journal first.")
+        if options["runs"] < 1 or options["limit"] < 1:
+            raise CommandError("--runs and --limit must be positive.")
+        entries = JournalEntry.objects.filter(user__in=users).order_by("-date", "-id")[:options["limit"]]
+
+        paths = [
+            ("instances+JsonResponse", lambda: JsonResponse(
+                [entry.serialize() for entry in entries.prefetch_related("tags")], safe=False).content),
+            ("rows+json", lambda: serializers.json_dumps(serializers.payloads(serializers.rows(entries)))),
+        ]
+        if serializers.orjson is not None:
+            paths.append(("rows+orjson", lambda: serializers.dumps(serializers.payloads(serializers.rows(entries)))))
+        else:
+            self.stderr.write("orjson is not installed, skipping rows+orjson.")
+
+        self.stdout.write(f"{entries.count()} entries, median of {options['runs']} runs\n")
+        self.stdout.write(f"{'path':<24}{'total ms':>10}{'encode ms':>11}{'raw KB':>10}"
+                          f"{'gzip KB':>10}{'br KB':>8}")
+        for name, build in paths:
+            total, body = self.timed(build, options["runs"])
+            encode = self.encode_time(name, entries, options["runs"])
+            compressed = brotli.compress(body, quality=BROTLI_QUALITY) if brotli else None
+            self.stdout.write(f"{name:<24}{total:>10.1f}{encode:>11.1f}{len(body) / 1024:>10.1f}"
+                              f"{len(gzip.compress(body)) / 1024:>10.1f}"
+                              f"{'-' if compressed is None else f'{len(compressed) / 1024:.1f}':>8}")
+
+    def timed(self, build, runs):
+        """
+        Median ms of `build` and what it returned on the last run.
+        """
+        durations = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = build()
+            durations.append((time.perf_counter() - started) * 1000)
+        return percentile(durations, 0.5), result
+
+    def encode_time(self, name, entries, runs):
+        """
+        Median ms of encoding alone, with the data already loaded.
+        """
+        if name.startswith("instances"):
+            data = [entry.serialize() for entry in entries.prefetch_related("tags")]
+            return self.timed(lambda: JsonResponse(data, safe=False).content, runs)[0]
+        data = serializers.payloads(serializers.rows(entries))
+        encode = serializers.dumps if name.endswith("orjson") else serializers.json_dumps
+        return self.timed(lambda: encode(data), runs)[0]
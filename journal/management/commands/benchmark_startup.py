@@ -0,0 +1,91 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.management.commands.loadtest import session_cookie
+
+# Run in a fresh interpreter: import the WSGI module, then send each path
+# twice, the first response pays for URLconf, view and template loading.
+PROBE = """
+import io, json, sys, time
+began = time.perf_counter()
+import main.wsgi
+imported = time.perf_counter()
+
+def get(path, cookie):
+    path, _, query = path.partition("?")
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query,
+        "SERVER_NAME": "testserver", "SERVER_PORT": "80", "HTTP_HOST": "testserver",
+        "HTTP_COOKIE": cookie, "wsgi.input": io.BytesIO(), "wsgi.errors": io.StringIO(),
+        "wsgi.url_scheme": "http", "wsgi.version": (1, 0), "wsgi.multithread": False,
+        "wsgi.multiprocess": True, "wsgi.run_once": False,
+    }
+    status = []
+    started = time.perf_counter()
+    body = main.wsgi.application(environ, lambda line, headers, exc_info=None: status.append(int(line[:3])))
+    for _ in body:
+        pass
+    body.close()
+    return status[0], (time.perf_counter() - started) * 1000
+
+result = {"import": (imported - began) * 1000, "paths": {}}
+for path, cookie in json.loads(sys.argv[1]):
+    first, second = get(path, cookie), get(path, cookie)
+    result["paths"][path] = {"status": first[0], "first": first[1], "warm": second[1]}
+result["total"] = (time.perf_counter() - began) * 1000
+print(json.dumps(result))
+"""
+
+
+class Command(BaseCommand):
+    help = ("Measure cold start with the current settings: import time of main.wsgi, "
+            "time to the first response of a few pages and the same pages warm, "
+            "each in a fresh interpreter.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start.")
+        parser.add_argument("--prefix", default="bench",
+                            help="Benchmark user to load the logged-in pages as, see seed_journal.")
+
+    def handle(self, *args, **options):
+        if options["runs"] < 1:
+            raise CommandError("--runs must be positive.")
+        user = User.objects.filter(username__startswith=f"{options['prefix']}_").order_by("id").first()
+        if user is None:
+            raise CommandError(f"No {options['prefix']}_* users, run seed_journal first.")
+
+        cookie = session_cookie(user)
+        requests = [("/login/", ""), ("/", cookie), ("/entries/", cookie)]
+        environment = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get(
+            "DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE)}
+
+        runs = []
+        for _ in range(options["runs"]):
+            began = time.perf_counter()
+            process = subprocess.run([sys.executable, "-c", PROBE, json.dumps(requests)], env=environment,
+                                     cwd=settings.BASE_DIR, capture_output=True, text=True)
+            if process.returncode:
+                raise CommandError(f"Startup probe failed:\n{process.stderr}")
+            run = json.loads(process.stdout.splitlines()[-1])
+            run["process"] = (time.perf_counter() - began) * 1000
+            runs.append(run)
+
+        def median(values):
+            return statistics.median(values)
+
+        self.stdout.write(f"{settings.SETTINGS_MODULE}, DEBUG={settings.DEBUG}, median of {len(runs)} runs\n")
+        self.stdout.write(f"{'interpreter + import + requests':<36}{median([run['process'] for run in runs]):>10.1f} ms")
+        self.stdout.write(f"{'import main.wsgi':<36}{median([run['import'] for run in runs]):>10.1f} ms")
+        self.stdout.write(f"\n{'path':<20}{'status':>8}{'first ms':>10}{'warm ms':>10}")
+        for path, _ in requests:
+            timings = [run["paths"][path] for run in runs]
+            self.stdout.write(f"{path:<20}{timings[0]['status']:>8}{median([t['first'] for t in timings]):>10.1f}"
+                              f"{median([t['warm'] for t in timings]):>10.1f}")
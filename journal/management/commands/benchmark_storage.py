@@ -0,0 +1,101 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.test import override_settings
+
+from journal import calendar_cache
+from journal.compression import recompress, zstandard
+from journal.management.commands.benchmark_views import percentile
+from journal.models import JournalEntry
+from journal.utils import month_bounds
+
+
+class Command(BaseCommand):
+    help = ("Store entry content plain and then compressed, and report the size of "
+            "the content and the entry table with the time to load a month of a user's "
+            "entries. Only the --prefix users' entries are rewritten, and they are left "
+            "stored as the settings say.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="bench", help="Benchmark users created by seed_journal.")
+        parser.add_argument("--method", choices=["zlib", "zstd"], default="zlib")
+        parser.add_argument("--min-bytes", type=int, default=settings.ENTRY_CONTENT_COMPRESS_MIN_BYTES)
+        parser.add_argument("--runs", type=int, default=50, help="Timed loads of each query.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username__startswith=f"{options['prefix']}_").order_by("id").first()
+        if user is None:
+            raise CommandError(f"No {options['prefix']}_* users, run seed_journal first.")
+        if options["runs"] < 1:
+            raise CommandError("--runs must be positive.")
+        entries = JournalEntry.objects.filter(user__username__startswith=f"{options['prefix']}_")
+        latest = entries.filter(user=user).latest("date").date
+        month = (latest.year, latest.month)
+        if options["method"] == "zstd" and zstandard is None:
+            self.stderr.write("zstandard is not installed, zstd falls back to zlib.")
+
+        self.stdout.write(f"{connection.vendor}, {entries.count()} entries, "
+                          f"{user.username} {month[0]}-{month[1]:02}, median of {options['runs']} runs\n")
+        self.stdout.write(f"{'storage':<10}{'content MB':>12}{'table MB':>10}"
+                          f"{'grid ms':>10}{'rows ms':>10}{'+content ms':>13}")
+        try:
+            for name, method in [("plain", ""), (options["method"], options["method"])]:
+                with override_settings(ENTRY_CONTENT_COMPRESSION=method,
+                                       ENTRY_CONTENT_COMPRESS_MIN_BYTES=options["min_bytes"]):
+                    recompress(entries)
+                grid, rows, content = self.time_month(user.id, *month, options["runs"])
+                table = self.table_size()
+                self.stdout.write(f"{name:<10}{self.content_size(entries) / 2 ** 20:>12.2f}"
+                                  f"{'-' if table is None else f'{table / 2 ** 20:.2f}':>10}"
+                                  f"{grid:>10.2f}{rows:>10.2f}{content:>13.2f}")
+        finally:
+            recompress(entries)
+
+    def time_month(self, user_id, year, month, runs):
+        """
+        Median ms of the calendar grid query, of loading the month's entries,
+        and of loading them and reading their content.
+        """
+        def timed(load):
+            durations = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                load()
+                durations.append((time.perf_counter() - started) * 1000)
+            return percentile(durations, 0.5)
+
+        def entries():
+            return list(JournalEntry.objects.filter(user_id=user_id, date__range=month_bounds(year, month)))
+
+        return (
+            timed(lambda: calendar_cache.build_month(user_id, year, month)),
+            timed(entries),
+            timed(lambda: [entry.content for entry in entries()]),
+        )
+
+    def content_size(self, entries):
+        return sum(len(stored.encode()) for stored in entries.values_list("content", flat=True).iterator())
+
+    def table_size(self):
+        """
+        Bytes used by the entry table, None where the database can't tell.
+        """
+        table = JournalEntry._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                # needs SQLite built with the dbstat table
+                try:
+                    cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s", [table])
+                except DatabaseError:
+                    return None
+            elif connection.vendor == "mysql":
+                cursor.execute(f"ANALYZE TABLE {connection.ops.quote_name(table)}")
+                cursor.fetchall()
+                cursor.execute("SELECT data_length FROM information_schema.tables "
+                               "WHERE table_schema = DATABASE() AND table_name = %s", [table])
+            else:
+                return None
+            return cursor.fetchone()[0]
@@ -0,0 +1,84 @@
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from journal.analytics import compute_stats, sort_activity
+from journal.utils import calculate_longest_streak
+
+
+def baseline_longest_streak(entries):
+    """
+    calculate_longest_streak as it was before the streak aggregates, the
+    reference this benchmark measures against. Expects entries oldest first.
+    """
+    if not entries:
+        return 0
+
+    longest_streak = 1
+    current_streak = 1
+    prev_entry_date = datetime.strptime(f"{entries[0].date}", "%Y-%m-%d").date()
+
+    for entry in entries[1:]:
+        curr_entry_date = datetime.strptime(f"{entry.date}", "%Y-%m-%d").date()
+        if curr_entry_date - prev_entry_date == timedelta(days=1):
+            current_streak += 1
+        else:
+            current_streak = 1
+
+        if current_streak > longest_streak:
+            longest_streak = current_streak
+
+        prev_entry_date = curr_entry_date
+
+    return longest_streak
+
+
+class Command(BaseCommand):
+    help = ("Compare the vectorized analytics pass with the original per-user "
+            "calculate_longest_streak, and with the current one, on synthetic (user, "
+            "date) rows. No database access.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--days", type=int, default=3650, help="Span of dates to draw from.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        start = date(2015, 1, 1).toordinal()
+        user_ids = rng.integers(1, options["users"] + 1, size=options["rows"], dtype=np.int64)
+        ordinals = start + rng.integers(0, options["days"], size=options["rows"], dtype=np.int64)
+        self.stdout.write(f"{options['rows']:,} rows, {options['users']:,} users, {options['days']:,} day span")
+
+        began = time.perf_counter()
+        stats = compute_stats(*sort_activity(user_ids, ordinals))
+        vectorized = time.perf_counter() - began
+
+        # the per-user helpers work on entry-like objects, one user at a time,
+        # ordered by date as the one-entry-per-day table returned them
+        per_user = {}
+        for user_id, ordinal in zip(user_ids.tolist(), ordinals.tolist()):
+            per_user.setdefault(user_id, set()).add(ordinal)
+        per_user = {user_id: [SimpleNamespace(date=date.fromordinal(ordinal)) for ordinal in sorted(days)]
+                    for user_id, days in per_user.items()}
+
+        longest, original = self.per_user_time(baseline_longest_streak, per_user)
+        _, current = self.per_user_time(calculate_longest_streak, per_user)
+
+        mismatches = sum(stats[user_id]["longest_streak"] != value for user_id, value in longest.items())
+        self.stdout.write(f"vectorized (all stats):            {vectorized * 1000:10.1f} ms")
+        self.stdout.write(f"original calculate_longest_streak: {original * 1000:10.1f} ms")
+        self.stdout.write(f"current calculate_longest_streak:  {current * 1000:10.1f} ms")
+        self.stdout.write(f"speedup over the original: {original / vectorized:.1f}x, mismatched users: {mismatches}")
+
+    def per_user_time(self, helper, per_user):
+        """
+        {user_id: longest streak} from `helper` and the seconds it took.
+        """
+        began = time.perf_counter()
+        longest = {user_id: helper(entries) for user_id, entries in per_user.items()}
+        return longest, time.perf_counter() - began
@@ -0,0 +1,177 @@
+import json
+import math
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from journal.models import JournalEntry, Tag
+from journal.testing import server_timing
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenarios(user):
+    """
+    (name, url) pairs for `user`, using one of their entries, tags and months.
+    """
+    entries = JournalEntry.objects.filter(user=user)
+    latest = entries.order_by("-date").first()
+    if latest is None:
+        raise CommandError(f"{user.username} has no entries, run seed_journal first.")
+    middle = entries.order_by("-date")[entries.count() // 2]
+    tag = Tag.objects.filter(tag_entries__user=user).order_by("id").first()
+
+    urls = [
+        ("index", "/"),
+        ("all_entries", "/entries/"),
+        ("all_entries:page 5", "/entries/?page=5"),
+        ("all_entries:month", f"/entries/?month={latest.date.month}&year={latest.date.year}"),
+        ("profile", "/profile/"),
+        ("entry_on", f"/entry/date/{middle.date.isoformat()}/"),
+        ("api/entries", "/api/entries/"),
+        ("api/entries:page", "/api/entries/?limit=50"),
+        ("api/entry", f"/api/entry/{middle.id}/"),
+    ]
+    if tag:
+        urls.insert(4, ("all_entries:tag", f"/entries/?tag={tag.id}"))
+    return urls
+
+
+class Command(BaseCommand):
+    help = ("Drive the journal views and APIs through the test client and report "
+            "p50/p95 latency, query counts and peak memory. Results can be saved "
+            "as JSON and compared with an earlier run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="bench", help="Benchmark users created by seed_journal.")
+        parser.add_argument("--users", type=int, default=5, help="How many of them to rotate through.")
+        parser.add_argument("--iterations", type=int, default=50, help="Requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=3, help="Untimed requests per scenario.")
+        parser.add_argument("--cold-cache", action="store_true", help="Clear the cache before every request.")
+        parser.add_argument("--only", help="Comma separated scenario names to run.")
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+        parser.add_argument("--compare", help="Earlier JSON results to compare against.")
+
+    # the query counts and DB time are read from the Server-Timing header
+    @override_settings(SERVER_TIMING=True)
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__startswith=f"{options['prefix']}_")
+                     .order_by("id")[:options["users"]])
+        if not users:
+            raise CommandError(f"No {options['prefix']}_* users, run seed_journal first.")
+
+        # one logged-in client and scenario list per user
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append((client, scenarios(user)))
+
+        names = [name for name, _ in clients[0][1]]
+        if options["only"]:
+            wanted = set(options["only"].split(","))
+            names = [name for name in names if name in wanted]
+
+        results = {}
+        for position, name in enumerate(names):
+            durations, queries, db_times = [], [], []
+            size = None
+            for iteration in range(options["warmup"] + options["iterations"]):
+                client, urls = clients[iteration % len(clients)]
+                url = dict(urls).get(name)
+                if url is None:
+                    continue
+                if options["cold_cache"]:
+                    cache.clear()
+                began = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - began
+                if response.status_code != 200:
+                    raise CommandError(f"{name}: {url} returned {response.status_code}.")
+                if iteration < options["warmup"]:
+                    continue
+                timing = server_timing(response)
+                durations.append(elapsed * 1000)
+                queries.append(timing.get("queries", 0))
+                db_times.append(timing.get("db", 0.0))
+                size = len(response.content)
+
+            # separate request for memory, tracemalloc slows everything down
+            client, urls = clients[0]
+            if options["cold_cache"]:
+                cache.clear()
+            tracemalloc.start()
+            client.get(dict(urls)[name])
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results[name] = {
+                "p50_ms": round(percentile(durations, 0.5), 3),
+                "p95_ms": round(percentile(durations, 0.95), 3),
+                "mean_ms": round(sum(durations) / len(durations), 3),
+                "queries": max(queries),
+                "db_ms": round(sum(db_times) / len(db_times), 3),
+                "peak_kb": round(peak / 1024, 1),
+                "response_bytes": size,
+            }
+
+        self.report(results)
+        run = {
+            "meta": {
+                "revision": git_revision(),
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "users": len(users),
+                "iterations": options["iterations"],
+                "cold_cache": options["cold_cache"],
+            },
+            "results": results,
+        }
+        if options["compare"]:
+            with open(options["compare"]) as stream:
+                self.compare(json.load(stream), run)
+        if options["output"]:
+            with open(options["output"], "w") as stream:
+                json.dump(run, stream, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved results to {options['output']}."))
+
+    def report(self, results):
+        self.stdout.write(f"{'scenario':<22}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'db ms':>8}"
+                          f"{'peak KB':>10}{'bytes':>9}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<22}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['queries']:>9}"
+                f"{result['db_ms']:>8.2f}{result['peak_kb']:>10.1f}{result['response_bytes']:>9}")
+
+    def compare(self, before, after):
+        self.stdout.write(f"\nCompared with {before['meta'].get('revision')} ({before['meta'].get('timestamp')}):")
+        for name, result in after["results"].items():
+            old = before["results"].get(name)
+            if old is None:
+                continue
+            change = (result["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+            self.stdout.write(
+                f"{name:<22}p50 {old['p50_ms']:.2f} -> {result['p50_ms']:.2f} ms ({change:+.0f}%), "
+                f"queries {old['queries']} -> {result['queries']}")
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from journal.compression import CHUNK_SIZE, recompress
+from journal.models import JournalEntry
+
+
+class Command(BaseCommand):
+    help = ("Rewrite stored entry content under ENTRY_CONTENT_COMPRESSION and "
+            "ENTRY_CONTENT_COMPRESS_MIN_BYTES, e.g. after turning compression on, off "
+            "or switching method. Entries already stored that way are left alone.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only this username's entries.")
+        parser.add_argument("--method", choices=["zlib", "zstd", "none"],
+                            help="Use this instead of ENTRY_CONTENT_COMPRESSION, 'none' decompresses.")
+        parser.add_argument("--min-bytes", type=int,
+                            help="Use this instead of ENTRY_CONTENT_COMPRESS_MIN_BYTES.")
+        parser.add_argument("--batch-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        entries = JournalEntry.objects.all()
+        if options["user"]:
+            try:
+                entries = entries.filter(user=User.objects.get(username=options["user"]))
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        overrides = {}
+        if options["method"]:
+            overrides["ENTRY_CONTENT_COMPRESSION"] = "" if options["method"] == "none" else options["method"]
+        if options["min_bytes"] is not None:
+            overrides["ENTRY_CONTENT_COMPRESS_MIN_BYTES"] = options["min_bytes"]
+        if overrides and options["verbosity"] > 0:
+            self.stderr.write("Later saves still follow the settings, update them to match.")
+
+        with override_settings(**overrides):
+            method = settings.ENTRY_CONTENT_COMPRESSION or "none"
+            count = recompress(entries, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rewrote {count} entries ({method})."))
@@ -0,0 +1,102 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from journal.models import JournalEntry
+from journal.utils import month_bounds
+
+INDEX_COLUMNS = ["user_id", "date"]
+
+
+def index_names():
+    """
+    Names of the indexes on (user_id, date) as they appear in query plans.
+    """
+    table = JournalEntry._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            # unique constraints are built inline and show up in plans as
+            # sqlite_autoindex_*, which introspection reports by constraint name
+            cursor.execute(f"PRAGMA index_list({connection.ops.quote_name(table)})")
+            names = []
+            for index in [row[1] for row in cursor.fetchall()]:
+                cursor.execute(f"PRAGMA index_info({connection.ops.quote_name(index)})")
+                if [row[2] for row in cursor.fetchall()] == INDEX_COLUMNS:
+                    names.append(index)
+            return names
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [name for name, info in constraints.items()
+            if info["columns"] == INDEX_COLUMNS and (info["index"] or info["unique"])]
+
+
+def plan_problems(plan, names):
+    """
+    What is wrong with a query plan: not using one of the (user_id, date)
+    indexes `names`, scanning the table, or sorting in a temporary structure.
+    """
+    problems = []
+    if not any(index in plan for index in names):
+        problems.append("no (user, date) index")
+    if connection.vendor == "sqlite":
+        table = JournalEntry._meta.db_table
+        if any(line.split(" SCAN ")[-1].strip() == table for line in plan.splitlines() if " SCAN " in line):
+            problems.append("full table scan")
+        if "TEMP B-TREE" in plan:
+            problems.append("temp B-tree")
+    elif connection.vendor == "mysql":
+        # tabular EXPLAIN rows, joined by spaces; type ALL is a table scan
+        if any(" ALL " in f" {line} " for line in plan.splitlines()):
+            problems.append("full table scan")
+        if "Using filesort" in plan or "Using temporary" in plan:
+            problems.append("filesort")
+    return problems
+
+
+def hot_queries(user_id, day):
+    """
+    The per-user date lookups the views run on every request.
+    """
+    entries = JournalEntry.objects.filter(user_id=user_id)
+    return {
+        "entry on a date": entries.filter(date=day),
+        "previous entry": entries.filter(date__lt=day).order_by("-date")[:1],
+        "next entry": entries.filter(date__gt=day).order_by("date")[:1],
+        "month range": entries.filter(date__range=month_bounds(day.year, day.month)),
+        "newest first": entries.order_by("-date", "-id")[:50],
+        "keyset page": entries.filter(Q(date__lt=day) | Q(date=day, id__lt=1)).order_by("-date", "-id")[:50],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot JournalEntry queries and check that they use the "
+        "(user, date) index without a table scan or a temporary sort. Exits "
+        "non-zero if one doesn't."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, default=1,
+                            help="User id to plug into the queries (plans rarely depend on it).")
+        parser.add_argument("--date", type=date.fromisoformat, default=date.today())
+
+    def handle(self, *args, **options):
+        names = index_names()
+        if not names:
+            raise CommandError("No index on (user, date), are the migrations applied?")
+        self.stdout.write(f"Database: {connection.vendor}, index: {', '.join(names)}")
+
+        failed = []
+        for name, queryset in hot_queries(options["user_id"], options["date"]).items():
+            plan = queryset.explain()
+            problems = plan_problems(plan, names)
+            style = self.style.ERROR if problems else self.style.SUCCESS
+            self.stdout.write(style(f"{', '.join(problems).upper() if problems else 'ok'}  {name}"))
+            if options["verbosity"] > 1 or problems:
+                self.stdout.write(f"    {plan}".replace("\n", "\n    "))
+            if problems:
+                failed.append(name)
+
+        if failed:
+            raise CommandError(f"Not using the (user, date) index well: {', '.join(failed)}")
@@ -0,0 +1,40 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.archive import EXPORT_FORMATS, EXPORTERS
+
+
+class Command(BaseCommand):
+    help = "Export a user's journal entries and tags as ndjson, csv or a zip of Markdown files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+        parser.add_argument("--output", help="File to write to, defaults to stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+
+        binary = options["format"] == "markdown"
+        if options["output"]:
+            output = open(options["output"], "wb" if binary else "w", encoding=None if binary else "utf-8",
+                          newline=None if binary else "")
+        elif binary:
+            output = sys.stdout.buffer
+        else:
+            output = self.stdout
+
+        try:
+            for chunk in EXPORTERS[options["format"]](user):
+                output.write(chunk)
+        finally:
+            if options["output"]:
+                output.close()
+
+        if options["output"]:
+            self.stderr.write(self.style.SUCCESS(f"Exported {user.username}'s journal to {options['output']}."))
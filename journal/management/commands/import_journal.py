@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.archive import DEFAULT_BATCH_SIZE, IMPORT_FORMATS, READERS, import_entries
+
+
+class Command(BaseCommand):
+    help = "Import journal entries for a user from an ndjson or csv file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=IMPORT_FORMATS,
+                            help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Entries inserted per transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+
+        fmt = options["format"] or options["path"].rsplit(".", 1)[-1].lower()
+        if fmt not in IMPORT_FORMATS:
+            raise CommandError(f"Unsupported format '{fmt}', use --format.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        try:
+            with open(options["path"], encoding="utf-8-sig", newline="") as stream:
+                summary = import_entries(user, READERS[fmt](stream), batch_size=options["batch_size"])
+        except OSError as error:
+            raise CommandError(str(error))
+
+        for number, message in summary["errors"]:
+            self.stderr.write(f"Record {number}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['created']} entries, skipped {summary['skipped']} existing dates, "
+            f"{len(summary['errors'])} errors."))
@@ -0,0 +1,178 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+
+from journal.management.commands.benchmark_views import percentile
+from journal.models import JournalEntry
+
+
+def session_cookie(user):
+    client = Client()
+    client.force_login(user)
+    return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+
+def paths(user):
+    latest = JournalEntry.objects.filter(user=user).order_by("-date").first()
+    if latest is None:
+        raise CommandError(f"{user.username} has no entries, run seed_journal first.")
+    return [
+        "/api/entries/?limit=50",
+        f"/api/entry/{latest.id}/",
+        f"/entry/date/{latest.date.isoformat()}/",
+        f"/api/calendar/{latest.date.year}/{latest.date.month}/",
+    ]
+
+
+# Drivers, each returns (status, seconds) for one GET
+
+def wsgi_driver():
+    application = get_wsgi_application()
+
+    def get(path, cookie, method="GET", body=b""):
+        path, _, query = path.partition("?")
+        environ = {
+            "REQUEST_METHOD": method, "PATH_INFO": path, "QUERY_STRING": query,
+            "SERVER_NAME": "testserver", "SERVER_PORT": "80", "HTTP_HOST": "testserver",
+            "CONTENT_LENGTH": str(len(body)), "CONTENT_TYPE": "application/json",
+            "HTTP_COOKIE": cookie, "wsgi.input": io.BytesIO(body), "wsgi.errors": io.StringIO(),
+            "wsgi.url_scheme": "http", "wsgi.version": (1, 0), "wsgi.multithread": True,
+            "wsgi.multiprocess": False, "wsgi.run_once": False,
+        }
+        status = []
+        began = time.perf_counter()
+        body = application(environ, lambda line, headers, exc_info=None: status.append(int(line[:3])))
+        for _ in body:
+            pass
+        body.close()
+        return status[0], time.perf_counter() - began
+    return get
+
+
+def asgi_driver():
+    application = get_asgi_application()
+
+    async def get(path, cookie):
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+            "root_path": "", "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+            "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+        }
+        status = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        began = time.perf_counter()
+        await application(scope, receive, send)
+        return status[0], time.perf_counter() - began
+    return get
+
+
+def http_driver(base_url):
+    """
+    Minimal HTTP/1.1 client on asyncio streams, one connection per request,
+    for servers started separately (uvicorn, gunicorn, ...).
+    """
+    parts = urlsplit(base_url)
+    port = parts.port or 80
+
+    async def get(path, cookie):
+        began = time.perf_counter()
+        reader, writer = await asyncio.open_connection(parts.hostname, port)
+        writer.write((f"GET {parts.path.rstrip('/')}{path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                      f"Cookie: {cookie}\r\nConnection: close\r\n\r\n").encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        writer.close()
+        await writer.wait_closed()
+        return int(status_line.split()[1]), time.perf_counter() - began
+    return get
+
+
+class Command(BaseCommand):
+    help = ("Load test the async views: concurrent GETs against the ASGI and the WSGI "
+            "application in this process, or against running servers with --target. "
+            "Reports throughput and p50/p95 latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="bench", help="Benchmark users created by seed_journal.")
+        parser.add_argument("--users", type=int, default=5, help="How many of them to rotate through.")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per run.")
+        parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight.")
+        parser.add_argument("--target", action="append", default=[], metavar="NAME=URL",
+                            help="Running server to test instead of the in-process applications, "
+                                 "e.g. asgi=http://127.0.0.1:8000. Repeatable.")
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__startswith=f"{options['prefix']}_")
+                     .order_by("id")[:options["users"]])
+        if not users:
+            raise CommandError(f"No {options['prefix']}_* users, run seed_journal first.")
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+
+        # (path, cookie) pairs, rotated through by every run
+        work = [(path, session_cookie(user)) for user in users for path in paths(user)]
+        requests = [work[index % len(work)] for index in range(options["requests"])]
+
+        runs = []
+        for target in options["target"]:
+            name, _, url = target.partition("=")
+            if not url:
+                raise CommandError(f"--target {target!r} is not NAME=URL.")
+            runs.append((name, lambda url=url: asyncio.run(
+                self.run_async(http_driver(url), requests, options["concurrency"]))))
+        if not runs:
+            runs = [
+                ("wsgi", lambda: self.run_threads(wsgi_driver(), requests, options["concurrency"])),
+                ("asgi", lambda: asyncio.run(self.run_async(asgi_driver(), requests, options["concurrency"]))),
+            ]
+
+        self.stdout.write(f"{options['requests']} requests, {options['concurrency']} concurrent, "
+                          f"{len(work)} distinct URLs\n")
+        self.stdout.write(f"{'run':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        for name, run in runs:
+            results, wall = run()
+            durations = [seconds * 1000 for _, seconds in results]
+            errors = sum(1 for status, _ in results if status != 200)
+            self.stdout.write(f"{name:<12}{len(results) / wall:>10.1f}{percentile(durations, 0.5):>10.2f}"
+                              f"{percentile(durations, 0.95):>10.2f}{errors:>8}")
+
+    def run_threads(self, get, requests, concurrency):
+        get(*requests[0])  # warm up
+        began = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(lambda request: get(*request), requests))
+        return results, time.perf_counter() - began
+
+    async def run_async(self, get, requests, concurrency):
+        await get(*requests[0])  # warm up
+        queue = asyncio.Queue()
+        for request in requests:
+            queue.put_nowait(request)
+        results = []
+
+        async def worker():
+            while not queue.empty():
+                results.append(await get(*queue.get_nowait()))
+
+        began = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return results, time.perf_counter() - began
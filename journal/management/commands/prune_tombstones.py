@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from journal.models import EntryTombstone
+
+
+class Command(BaseCommand):
+    help = ("Delete the tombstones of entries deleted more than SYNC_TOMBSTONE_RETENTION_DAYS "
+            "ago. Delta sync turns away tokens older than that, so their clients sync from "
+            "scratch instead of missing the deletes. Run it daily.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int,
+                            help="Keep this many days instead, at least SYNC_TOMBSTONE_RETENTION_DAYS.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count them.")
+
+    def handle(self, *args, **options):
+        days = settings.SYNC_TOMBSTONE_RETENTION_DAYS if options["days"] is None else options["days"]
+        if days < settings.SYNC_TOMBSTONE_RETENTION_DAYS:
+            raise CommandError(f"--days must be at least SYNC_TOMBSTONE_RETENTION_DAYS ({settings.SYNC_TOMBSTONE_RETENTION_DAYS}), "
+                               "sync still accepts tokens that old.")
+
+        tombstones = EntryTombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days))
+        if options["dry_run"]:
+            self.stdout.write(f"{tombstones.count()} tombstones are older than {days} days.")
+            return
+        count, _ = tombstones.delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} tombstones older than {days} days."))
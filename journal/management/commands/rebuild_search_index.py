@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.models import JournalEntry
+from journal.search import FTS_TABLE, rebuild_index, uses_fts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for all users or a single user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only reindex this username's entries.")
+
+    def handle(self, *args, **options):
+        entries = JournalEntry.objects.all()
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+            entries = entries.filter(user=user)
+
+        backend = f"FTS5 table {FTS_TABLE}" if uses_fts() else "portable index"
+        count = rebuild_index(entries)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} entries into the {backend}."))
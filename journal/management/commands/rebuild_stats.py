@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.models import TagUsage, UserProfile
+
+
+class Command(BaseCommand):
+    help = "Rebuild streaks, entry counts, monthly counts and tag usage for all users or a single user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only rebuild this username's statistics.")
+        parser.add_argument(
+            "--per-user", action="store_true",
+            help="Rebuild users one by one instead of the bulk NumPy pass.")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options["user"]:
+            users = users.filter(username=options["user"])
+            if not users.exists():
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        # make sure every user has a profile to write into
+        missing = users.filter(profile__isnull=True)
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in missing])
+
+        for user_id in users.filter(entries__isnull=False).distinct().values_list("id", flat=True).iterator():
+            TagUsage.refresh(user_id)
+
+        if not options["per_user"] and not options["user"]:
+            try:
+                from journal.analytics import rebuild_all_stats
+            except ImportError:
+                self.stderr.write("NumPy is not installed, rebuilding users one by one.")
+            else:
+                count = rebuild_all_stats()
+                self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {count} users."))
+                return
+
+        count = 0
+        for profile in UserProfile.objects.filter(user__in=users).iterator():
+            profile.rebuild_stats()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {count} users."))
@@ -0,0 +1,69 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# journal.jobs imports models, so it is imported inside the functions: a
+# spawned worker process loads this module before django.setup() has run
+
+
+def setup_process():
+    django.setup()
+
+
+def run_batch(job_ids):
+    from journal.jobs import run_batch
+    return run_batch(job_ids)
+
+
+class Command(BaseCommand):
+    help = ("Work through the queued derived-data jobs (streaks, tag usage, search index) "
+            "in a pool of threads or processes, one user's jobs at a time per worker. "
+            "Polls for new jobs until interrupted, or stops once the queue is empty with --once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Jobs run in parallel.")
+        parser.add_argument("--processes", action="store_true",
+                            help="Use worker processes instead of threads.")
+        parser.add_argument("--batch", type=int, default=500, help="Jobs fetched per round.")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Exit when no job is due.")
+
+    def handle(self, *args, **options):
+        from journal.jobs import due_batches
+
+        if options["workers"] < 1 or options["batch"] < 1:
+            raise CommandError("--workers and --batch must be positive.")
+        if settings.JOB_QUEUE_EAGER:
+            self.stderr.write("JOB_QUEUE_EAGER is on, writes do their derived data themselves "
+                              "and only jobs already queued will run.")
+
+        if options["processes"]:
+            pool = ProcessPoolExecutor(options["workers"], mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=setup_process)
+        else:
+            pool = ThreadPoolExecutor(options["workers"])
+
+        count = 0
+        try:
+            with pool:
+                while True:
+                    batches = due_batches(options["batch"])
+                    ran = sum(pool.map(run_batch, batches))
+                    count += ran
+                    if ran and options["verbosity"] > 1:
+                        self.stdout.write(f"Ran {ran} jobs for {len(batches)} users.")
+                    # nothing due, or everything due failed and was logged
+                    if not ran:
+                        if options["once"]:
+                            break
+                        time.sleep(options["poll"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connections.close_all()
+        self.stdout.write(self.style.SUCCESS(f"Ran {count} jobs."))
@@ -0,0 +1,112 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from journal.archive import import_entries
+
+WORDS = (
+    "morning coffee walk park meeting project deadline friend dinner call family "
+    "book chapter read wrote idea plan week weekend rain sun garden train city "
+    "office team review code bug release lunch gym run tired happy calm busy "
+    "quiet evening movie music song guitar travel trip flight hotel beach "
+    "mountain hike river dog cat kitchen bread recipe market grateful worried "
+    "excited learned noticed remembered finally again tomorrow yesterday today "
+    "slowly really almost always never sometimes together alone the a and but "
+    "with for about after before during because while then so it was felt"
+).split()
+
+TAG_NAMES = (
+    "work family health travel reading gratitude fitness ideas food music "
+    "friends goals mood learning nature projects weekend sleep money home"
+).split()
+
+
+def sentence(rng, low=6, high=18):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+    return " ".join(words).capitalize() + rng.choice(".!?.")
+
+
+def html_content(rng, words):
+    """
+    TinyMCE-like HTML of roughly `words` words: paragraphs with inline
+    formatting, the odd heading and list.
+    """
+    blocks = []
+    written = 0
+    while written < words:
+        kind = rng.random()
+        if kind < 0.1:
+            blocks.append(f"<h3>{sentence(rng, 2, 5)[:-1]}</h3>")
+        elif kind < 0.25:
+            items = [f"<li>{sentence(rng, 3, 8)}</li>" for _ in range(rng.randint(2, 5))]
+            blocks.append("<ul>" + "".join(items) + "</ul>")
+        else:
+            sentences = [sentence(rng) for _ in range(rng.randint(2, 6))]
+            if rng.random() < 0.3:
+                sentences[0] = f"<strong>{sentences[0]}</strong>"
+            if rng.random() < 0.2:
+                sentences[-1] = f"<em>{sentences[-1]}</em>"
+            blocks.append("<p>" + " ".join(sentences) + "</p>")
+        written = sum(len(block.split()) for block in blocks)
+    return "\n".join(blocks)
+
+
+class Command(BaseCommand):
+    help = ("Create users with synthetic journal entries and tags for benchmarking "
+            "(see benchmark_views). Entries go through the bulk import path.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--entries", type=int, default=365, help="Entries per user.")
+        parser.add_argument("--tags", type=int, default=10, help="Size of the tag pool, at most 3 per entry.")
+        parser.add_argument("--words", type=int, default=250, help="Average words per entry.")
+        parser.add_argument("--skip-rate", type=float, default=0.15,
+                            help="Share of days without an entry, so streaks have gaps.")
+        parser.add_argument("--prefix", default="bench", help="Username prefix, passwords equal the prefix.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--clear", action="store_true", help="Delete existing users with the prefix first.")
+
+    def handle(self, *args, **options):
+        if not 0 <= options["skip_rate"] < 1:
+            raise CommandError("--skip-rate must be in [0, 1).")
+        tag_pool = TAG_NAMES[:options["tags"]] + [
+            f"tag-{index}" for index in range(len(TAG_NAMES), options["tags"])]
+        prefix = options["prefix"]
+
+        if options["clear"]:
+            deleted, _ = User.objects.filter(username__startswith=f"{prefix}_").delete()
+            self.stdout.write(f"Deleted {deleted} rows of existing {prefix}_* users.")
+
+        rng = random.Random(options["seed"])
+        password = make_password(prefix)  # hashed once, PBKDF2 is slow by design
+        today = timezone.now().date()
+        total = 0
+        for index in range(options["users"]):
+            user, created = User.objects.get_or_create(
+                username=f"{prefix}_{index}", defaults={"email": f"{prefix}_{index}@example.com", "password": password})
+            if not created:
+                raise CommandError(f"User {user.username} already exists, use --clear or another --prefix.")
+
+            records = []
+            day = today
+            while len(records) < options["entries"]:
+                if rng.random() >= options["skip_rate"]:
+                    words = max(20, int(rng.gauss(options["words"], options["words"] / 3)))
+                    records.append({
+                        "date": day.isoformat(),
+                        "title": sentence(rng, 2, 6)[:-1],
+                        "content": html_content(rng, words),
+                        "tags": rng.sample(tag_pool, rng.randint(0, min(3, len(tag_pool)))),
+                    })
+                day -= timedelta(days=1)
+
+            summary = import_entries(user, records)
+            total += summary["created"]
+            self.stdout.write(f"{user.username}: {summary['created']} entries")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['users']} users with {total} entries, password '{prefix}'."))
@@ -0,0 +1,121 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise with an async code path. The stock middleware is sync only,
+    which under ASGI makes Django run everything below it, async views
+    included, through a thread per request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # stats and opens the file
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+# only the API payloads: pages carry a CSRF token next to reflected input
+# (BREACH), and static files come precompressed from WhiteNoise
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv")
+BROTLI_QUALITY = 5  # 11, the default, is meant for static files
+
+
+def accepted_encodings(request):
+    """
+    The content codings in Accept-Encoding that aren't refused with q=0.
+    """
+    accepted = set()
+    for item in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, weight = item.partition(";")
+        weight = weight.strip()
+        if weight.startswith("q="):
+            try:
+                if float(weight[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware for the JSON, ndjson and CSV responses, sending brotli
+    instead when the client accepts "br" and the brotli package is installed.
+    """
+    def process_response(self, request, response):
+        if not response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPES):
+            return response
+        accepted = accepted_encodings(request)
+        if brotli is None or "br" not in accepted:
+            if "gzip" not in accepted:
+                # GZipMiddleware would still compress for "gzip;q=0"
+                patch_vary_headers(response, ("Accept-Encoding",))
+                return response
+            return super().process_response(request, response)
+
+        # the same checks as GZipMiddleware
+        if not response.streaming and len(response.content) < 200:
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _abrotli_stream(response.streaming_content)
+            else:
+                response.streaming_content = _brotli_stream(response.streaming_content)
+            del response.headers["Content-Length"]
+        else:
+            compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+
+def _brotli_stream(chunks):
+    # flushed per chunk, so each ndjson page reaches the client as it is sent
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in chunks:
+        yield compressor.process(chunk) + compressor.flush()
+    yield compressor.finish()
+
+
+async def _abrotli_stream(chunks):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    async for chunk in chunks:
+        yield compressor.process(chunk) + compressor.flush()
+    yield compressor.finish()
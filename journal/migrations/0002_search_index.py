@@ -0,0 +1,83 @@
+# Generated by Django 4.2.6 on 2026-10-18 03:08
+
+from html import unescape
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.utils import OperationalError
+from django.utils.html import strip_tags
+import django.db.models.deletion
+
+# as in journal/search.py when this migration was written
+FTS_TABLE = "journal_entry_fts"
+
+
+def html_to_text(html):
+    # strip TinyMCE markup and entities, collapse whitespace
+    return " ".join(unescape(strip_tags(html or "")).split())
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 is only used on SQLite, other backends use the SearchPosting index
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title, body, user_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')")
+    except OperationalError:
+        # SQLite built without FTS5, fall back to the portable index
+        return
+
+    JournalEntry = apps.get_model("journal", "JournalEntry")
+    with connection.cursor() as cursor:
+        for entry in JournalEntry.objects.all().iterator():
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body, user_id) VALUES (%s, %s, %s, %s)",
+                [entry.pk, entry.title, html_to_text(entry.content), entry.user_id])
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('length', models.PositiveIntegerField(default=0)),
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='journal.journalentry')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.PositiveIntegerField(default=1)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='journal.searchdocument')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'term'], name='search_posting_user_term')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchposting',
+            constraint=models.UniqueConstraint(fields=('document', 'term'), name='unique_search_posting'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 4.2.6 on 2026-10-18 03:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import Counter
+from datetime import timedelta
+
+
+def summarize_streaks(dates):
+    # journal.utils.summarize_streaks when this migration was written
+    summary = {
+        "longest_streak": 0,
+        "longest_streak_start": None,
+        "longest_streak_end": None,
+        "latest_streak": 0,
+        "latest_streak_start": None,
+        "last_date": None,
+    }
+    if not dates:
+        return summary
+
+    run_start = prev_date = dates[0]
+    run_length = 1
+    longest = (1, run_start, run_start)
+
+    for curr_date in dates[1:]:
+        if curr_date - prev_date == timedelta(days=1):
+            run_length += 1
+        else:
+            run_start = curr_date
+            run_length = 1
+
+        if run_length > longest[0]:
+            longest = (run_length, run_start, curr_date)
+
+        prev_date = curr_date
+
+    summary.update({
+        "longest_streak": longest[0],
+        "longest_streak_start": longest[1],
+        "longest_streak_end": longest[2],
+        "latest_streak": run_length,
+        "latest_streak_start": run_start,
+        "last_date": prev_date,
+    })
+    return summary
+
+
+def backfill_stats(apps, schema_editor):
+    UserProfile = apps.get_model("journal", "UserProfile")
+    JournalEntry = apps.get_model("journal", "JournalEntry")
+    MonthlyEntryCount = apps.get_model("journal", "MonthlyEntryCount")
+
+    for profile in UserProfile.objects.all().iterator():
+        dates = list(JournalEntry.objects.filter(user_id=profile.user_id)
+                     .order_by("date").values_list("date", flat=True).distinct())
+        summary = summarize_streaks(dates)
+        profile.entry_count = len(dates)
+        profile.current_streak = summary["latest_streak"]
+        profile.current_streak_start = summary["latest_streak_start"]
+        profile.last_journal_date = summary["last_date"]
+        profile.longest_streak = summary["longest_streak"]
+        profile.longest_streak_start = summary["longest_streak_start"]
+        profile.longest_streak_end = summary["longest_streak_end"]
+        profile.save()
+        MonthlyEntryCount.objects.bulk_create([
+            MonthlyEntryCount(user_id=profile.user_id, year=year, month=month, count=count)
+            for (year, month), count in Counter((d.year, d.month) for d in dates).items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0002_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='current_streak_start',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='entry_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='longest_streak_end',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='longest_streak_start',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='MonthlyEntryCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyentrycount',
+            constraint=models.UniqueConstraint(fields=('user', 'year', 'month'), name='unique_monthly_entry_count'),
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.6 on 2026-10-18 03:19
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# as in journal/search.py when this migration was written
+FTS_TABLE = "journal_entry_fts"
+
+
+def merge_duplicate_entries(apps, schema_editor):
+    # create_entry only checked for an existing entry before inserting, so
+    # racing requests could leave two entries on one day. Fold them into the
+    # oldest one instead of dropping anything.
+    JournalEntry = apps.get_model("journal", "JournalEntry")
+    connection = schema_editor.connection
+    has_fts = connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names()
+
+    duplicates = (JournalEntry.objects.order_by().values("user_id", "date")
+                  .annotate(n=Count("id")).filter(n__gt=1))
+    for row in duplicates.iterator():
+        entries = list(JournalEntry.objects.filter(user_id=row["user_id"], date=row["date"])
+                       .order_by("id").prefetch_related("tags"))
+        kept, extra = entries[0], entries[1:]
+        kept.content = "<hr>".join(entry.content for entry in entries)
+        kept.save(update_fields=["content"])
+        kept.tags.add(*{tag for entry in extra for tag in entry.tags.all()})
+
+        extra_ids = [entry.id for entry in extra]
+        JournalEntry.objects.filter(id__in=extra_ids).delete()
+        if has_fts:
+            with connection.cursor() as cursor:
+                cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[pk] for pk in extra_ids])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0003_profile_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_entries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='journalentry',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_entry_per_day'),
+        ),
+    ]
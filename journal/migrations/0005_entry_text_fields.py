@@ -0,0 +1,61 @@
+# Generated by Django 4.2.6 on 2026-10-18 03:26
+
+import re
+from html import unescape
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+# as in journal/utils.py and journal/derived.py when this migration was written
+EXCERPT_WORDS = 50
+BLOCK_TAG_RE = re.compile(r"</?(?:p|div|br|hr|li|ul|ol|h[1-6]|blockquote|pre|tr|td|th|table)\b[^>]*>", re.I)
+CHUNK_SIZE = 1000
+
+
+def text_fields(html):
+    plain_text = " ".join(unescape(strip_tags(BLOCK_TAG_RE.sub(" ", html or ""))).split())
+    parts = plain_text.split(maxsplit=EXCERPT_WORDS)
+    excerpt = " ".join(parts[:EXCERPT_WORDS]) + " …" if len(parts) > EXCERPT_WORDS else " ".join(parts)
+    return {"plain_text": plain_text, "excerpt": excerpt, "word_count": len(plain_text.split())}
+
+
+def backfill_text_fields(apps, schema_editor):
+    # same as the backfill_entry_text command, on the historical model
+    JournalEntry = apps.get_model("journal", "JournalEntry")
+    entries = JournalEntry.objects.only("id", "content").order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(entries.filter(pk__gt=last_pk)[:CHUNK_SIZE])
+        if not batch:
+            return
+        for entry in batch:
+            for name, value in text_fields(entry.content).items():
+                setattr(entry, name, value)
+        JournalEntry.objects.bulk_update(batch, ["plain_text", "excerpt", "word_count"])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0004_entry_per_day'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalentry',
+            name='excerpt',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='plain_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_text_fields, migrations.RunPython.noop),
+    ]
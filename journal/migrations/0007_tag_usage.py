@@ -0,0 +1,49 @@
+# Generated by Django 4.2.6 on 2026-10-18 03:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max
+
+
+def build_tag_usage(apps, schema_editor):
+    # TagUsage.refresh() for every user at once, grouped in the database
+    JournalEntry = apps.get_model("journal", "JournalEntry")
+    TagUsage = apps.get_model("journal", "TagUsage")
+    rows = JournalEntry.tags.through.objects.values_list(
+        "journalentry__user_id", "tag_id", "tag__name").annotate(
+        count=Count("id"), last_used=Max("journalentry__date")).order_by()
+    TagUsage.objects.bulk_create([
+        TagUsage(user_id=user_id, tag_id=tag_id, key=name.lower(), entry_count=count, last_used=last_used)
+        for user_id, tag_id, name, count, last_used in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0006_entry_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('last_used', models.DateField()),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='journal.tag')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'key'], name='tag_usage_user_key')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tagusage',
+            constraint=models.UniqueConstraint(fields=('user', 'tag'), name='unique_tag_usage'),
+        ),
+        migrations.RunPython(build_tag_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.6 on 2026-10-18 03:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from datetime import date
+
+# as in journal/activity.py when this migration was written
+BITMAP_BYTES = 46  # 366 bits
+
+
+def day_index(day):
+    return day.toordinal() - date(day.year, 1, 1).toordinal()
+
+
+def to_bytes(bits):
+    return bits.to_bytes(BITMAP_BYTES, "little")
+
+
+def build_activity(apps, schema_editor):
+    # ActivityYear.sync() for every user, from one pass over the entry dates
+    JournalEntry = apps.get_model("journal", "JournalEntry")
+    ActivityYear = apps.get_model("journal", "ActivityYear")
+    bitmaps = {}
+    for user_id, day in JournalEntry.objects.order_by().values_list("user_id", "date").iterator():
+        key = (user_id, day.year)
+        bitmaps[key] = bitmaps.get(key, 0) | 1 << day_index(day)
+    ActivityYear.objects.bulk_create([
+        ActivityYear(user_id=user_id, year=year, days=to_bytes(bits))
+        for (user_id, year), bits in bitmaps.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0007_tag_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('days', models.BinaryField(max_length=46)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_years', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='activityyear',
+            constraint=models.UniqueConstraint(fields=('user', 'year'), name='unique_activity_year'),
+        ),
+        migrations.RunPython(build_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.6 on 2026-10-18 03:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0008_activity_year'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DerivedJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('stats', 'Streaks and counts'), ('tags', 'Tag usage'), ('search', 'Search index')], max_length=10)),
+                ('entry_id', models.PositiveBigIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['run_after'], name='derived_job_run_after')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='derivedjob',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'entry_id'), name='unique_derived_job'),
+        ),
+    ]
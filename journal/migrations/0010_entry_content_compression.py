@@ -0,0 +1,50 @@
+# Generated by Django 4.2.6 on 2026-10-18 04:13
+
+import base64
+import zlib
+
+from django.db import migrations
+import journal.compression
+
+# as in journal/compression.py when this migration was written
+MARKER = "\x02"
+CHUNK_SIZE = 1000
+
+
+def escape_marked_content(apps, schema_editor):
+    # With compression off, as it shipped, the only stored form that changes
+    # is plain content starting with the marker: it would be read as a
+    # payload, so it is stored zlib compressed. Turning compression on is
+    # left to the compress_entries command. Written with SQL, the field
+    # would compress under whatever the settings are now.
+    JournalEntry = apps.get_model("journal", "JournalEntry")
+    connection = schema_editor.connection
+    table = connection.ops.quote_name(JournalEntry._meta.db_table)
+    marked = JournalEntry.objects.filter(content__startswith=MARKER).order_by("pk").values_list("pk", "content")
+    last_pk = 0
+    while True:
+        batch = list(marked.filter(pk__gt=last_pk)[:CHUNK_SIZE])
+        if not batch:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"UPDATE {table} SET content = %s WHERE id = %s", [
+                [f"{MARKER}zlib:{base64.b64encode(zlib.compress(str(content).encode())).decode('ascii')}", pk]
+                for pk, content in batch
+            ])
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0009_derived_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='journalentry',
+            name='content',
+            field=journal.compression.CompressedTextField(),
+        ),
+        migrations.RunPython(escape_marked_content, migrations.RunPython.noop),
+    ]
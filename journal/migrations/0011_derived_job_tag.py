@@ -0,0 +1,26 @@
+# Generated by Django 4.2.6 on 2026-10-18 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0010_entry_content_compression'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='derivedjob',
+            name='unique_derived_job',
+        ),
+        migrations.AddField(
+            model_name='derivedjob',
+            name='tag_id',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='derivedjob',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'entry_id', 'tag_id'), name='unique_derived_job'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import migrations
+
+# as in journal/search.py when this migration was written
+FTS_TABLE = "journal_entry_fts"
+TOKEN_RE = re.compile(r"\w+")
+MAX_TERM_LENGTH = 64
+TITLE_WEIGHT = 2
+CHUNK_SIZE = 500
+
+
+def normalize(token):
+    decomposed = unicodedata.normalize("NFKD", token.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return [
+        token for token in (normalize(match) for match in TOKEN_RE.findall(text))
+        if token and len(token) <= MAX_TERM_LENGTH
+    ]
+
+
+def _has_fts(connection):
+    return connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names()
+
+
+def _recreate_fts(apps, schema_editor, owner_column, owner_value):
+    JournalEntry = apps.get_model("journal", "JournalEntry")
+    schema_editor.execute(f"DROP TABLE {FTS_TABLE}")
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"title, body, {owner_column}, tokenize = 'unicode61 remove_diacritics 2')")
+    rows = JournalEntry.objects.values_list("id", "title", "plain_text", "user_id").order_by("id")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, body, {owner_column.split()[0]}) VALUES (%s, %s, %s, %s)",
+            [[pk, title or "", body, owner_value(user_id)] for pk, title, body, user_id in rows.iterator()])
+
+
+def _reindex_postings(apps):
+    # terms of the portable index are normalized now, "café" and "cafe" used
+    # to be two rows that an accent-insensitive collation sees as one
+    SearchDocument = apps.get_model("journal", "SearchDocument")
+    SearchPosting = apps.get_model("journal", "SearchPosting")
+    documents = SearchDocument.objects.select_related("entry").order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(documents.filter(pk__gt=last_pk)[:CHUNK_SIZE])
+        if not batch:
+            return
+        postings = []
+        for document in batch:
+            frequencies = Counter(tokenize(document.entry.plain_text))
+            for token in tokenize(document.entry.title or ""):
+                frequencies[token] += TITLE_WEIGHT
+            postings += [SearchPosting(document=document, user_id=document.user_id, term=term, frequency=frequency)
+                         for term, frequency in frequencies.items()]
+        SearchPosting.objects.filter(document__in=batch).delete()
+        SearchPosting.objects.bulk_create(postings, batch_size=1000)
+        last_pk = batch[-1].pk
+
+
+def partition_search_index(apps, schema_editor):
+    if _has_fts(schema_editor.connection):
+        _recreate_fts(apps, schema_editor, "owner", lambda user_id: f"u{user_id}")
+    _reindex_postings(apps)
+
+
+def unpartition_search_index(apps, schema_editor):
+    if _has_fts(schema_editor.connection):
+        _recreate_fts(apps, schema_editor, "user_id UNINDEXED", lambda user_id: user_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0011_derived_job_tag'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_search_index, unpartition_search_index),
+    ]
@@ -1,10 +1,15 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.contrib.auth.signals import user_logged_out
 from django.dispatch import receiver
-from django.db.models import Q
+from django.db.models import Count, Max, Q
+from collections import Counter
 from datetime import timedelta, datetime
+from .activity import from_bytes, to_bytes, year_bitmaps
+from .compression import CompressedTextField
+from .utils import api_timestamp, summarize_streaks, text_fields
 
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -22,68 +27,495 @@ class UserProfile(models.Model):
     last_journal_date = models.DateField(null=True, blank=True)
     current_streak = models.PositiveIntegerField(default=0)
     longest_streak = models.PositiveIntegerField(default=0)
+    # maintained aggregates, see rebuild_stats()
+    current_streak_start = models.DateField(null=True, blank=True)
+    longest_streak_start = models.DateField(null=True, blank=True)
+    longest_streak_end = models.DateField(null=True, blank=True)
+    entry_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"{self.user.username}'s profile"
 
-    def update_streak(self):
-        today = timezone.now().date()
-        
-        if not self.last_journal_date:
-            self.current_streak = 1
-        elif self.last_journal_date == today - timedelta(days=1):
-            self.current_streak += 1
-        elif self.last_journal_date != today:
-            self.current_streak = 1
-        
-        if self.current_streak > self.longest_streak:
-            self.longest_streak = self.current_streak
-            
-        self.last_journal_date = today
+    def get_current_streak(self, today=None):
+        """
+        The streak ending at the latest entry, if it hasn't lapsed yet.
+        """
+        today = today or timezone.now().date()
+        if self.last_journal_date and self.last_journal_date >= today - timedelta(days=1):
+            return self.current_streak
+        return 0
+
+    def rebuild_stats(self):
+        """
+        Recompute streaks, entry count, monthly counts and the activity
+        bitmaps from the user's entry dates (a single query) and save them.
+        """
+        dates = list(JournalEntry.objects.filter(user_id=self.user_id)
+                     .order_by("date").values_list("date", flat=True).distinct())
+        self.apply_stats(summarize_streaks(dates), len(dates))
         self.save()
-        return self.current_streak
+        MonthlyEntryCount.sync(self.user_id, Counter((d.year, d.month) for d in dates))
+        ActivityYear.sync(self.user_id, dates)
+
+    def apply_stats(self, summary, entry_count):
+        self.entry_count = entry_count
+        self.current_streak = summary["latest_streak"]
+        self.current_streak_start = summary["latest_streak_start"]
+        self.last_journal_date = summary["last_date"]
+        self.longest_streak = summary["longest_streak"]
+        self.longest_streak_start = summary["longest_streak_start"]
+        self.longest_streak_end = summary["longest_streak_end"]
+
+    def update_streak(self):
+        self.rebuild_stats()
+        return self.get_current_streak()
+
+
+class MonthlyEntryCount(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="monthly_counts")
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} {self.year}-{self.month:02d}: {self.count}"
+
+    @classmethod
+    def sync(cls, user_id, counts):
+        """
+        Make the user's rows match `counts`, a mapping of (year, month) -> count,
+        touching only the months that changed.
+        """
+        existing = {(row.year, row.month): row for row in cls.objects.filter(user_id=user_id)}
+
+        stale = [row.pk for key, row in existing.items() if key not in counts]
+        changed = []
+        for key, count in counts.items():
+            row = existing.get(key)
+            if row is not None and row.count != count:
+                row.count = count
+                changed.append(row)
+        new = [cls(user_id=user_id, year=year, month=month, count=count)
+               for (year, month), count in counts.items() if (year, month) not in existing]
+
+        if stale:
+            cls.objects.filter(pk__in=stale).delete()
+        if changed:
+            cls.objects.bulk_update(changed, ["count"])
+        if new:
+            cls.objects.bulk_create(new)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "year", "month"], name="unique_monthly_entry_count"),
+        ]
+
+class ActivityYear(models.Model):
+    """
+    One bit per day of a year, set on days with an entry (see activity.py),
+    so heatmaps and year statistics are read from a single small row.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="activity_years")
+    year = models.PositiveSmallIntegerField()
+    days = models.BinaryField(max_length=46)
+
+    def __str__(self):
+        return f"{self.user_id} {self.year}"
+
+    @property
+    def bits(self):
+        return from_bytes(self.days)
+
+    @classmethod
+    def sync(cls, user_id, dates):
+        """
+        Make the user's rows match `dates`, touching only the years that changed.
+        """
+        bitmaps = {year: to_bytes(bits) for year, bits in year_bitmaps(dates).items()}
+        existing = {row.year: row for row in cls.objects.filter(user_id=user_id)}
+
+        stale = [row.pk for year, row in existing.items() if year not in bitmaps]
+        changed = []
+        for year, days in bitmaps.items():
+            row = existing.get(year)
+            if row is not None and bytes(row.days) != days:
+                row.days = days
+                changed.append(row)
+        new = [cls(user_id=user_id, year=year, days=days) for year, days in bitmaps.items() if year not in existing]
+
+        if stale:
+            cls.objects.filter(pk__in=stale).delete()
+        if changed:
+            cls.objects.bulk_update(changed, ["days"])
+        if new:
+            cls.objects.bulk_create(new)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "year"], name="unique_activity_year"),
+        ]
+
+
+class TagUsage(models.Model):
+    """
+    How many of a user's entries carry a tag and the latest day it was used,
+    kept current by the receivers below so tag facets never join the whole
+    entry/tag table.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tag_usage")
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="usage")
+    # lowercased tag name, prefix lookups are a range scan of (user, key)
+    key = models.CharField(max_length=50)
+    entry_count = models.PositiveIntegerField(default=0)
+    last_used = models.DateField()
+
+    def __str__(self):
+        return f"{self.user_id} {self.key}: {self.entry_count}"
+
+    @classmethod
+    def refresh(cls, user_id, tag_ids=None):
+        """
+        Recompute the user's rows for `tag_ids` (every tag when None) from
+        the entry/tag through table, touching only the rows that changed.
+        """
+        usage = JournalEntry.tags.through.objects.filter(journalentry__user_id=user_id)
+        existing = cls.objects.filter(user_id=user_id)
+        if tag_ids is not None:
+            usage = usage.filter(tag_id__in=tag_ids)
+            existing = existing.filter(tag_id__in=tag_ids)
+        counts = {
+            tag_id: (name.lower(), count, last_used)
+            for tag_id, name, count, last_used in usage.values_list("tag_id", "tag__name").annotate(
+                count=Count("id"), last_used=Max("journalentry__date")).order_by()
+        }
+        existing = {row.tag_id: row for row in existing}
+
+        stale = [row.pk for tag_id, row in existing.items() if tag_id not in counts]
+        changed = []
+        for tag_id, (key, count, last_used) in counts.items():
+            row = existing.get(tag_id)
+            if row is not None and (row.key, row.entry_count, row.last_used) != (key, count, last_used):
+                row.key, row.entry_count, row.last_used = key, count, last_used
+                changed.append(row)
+        new = [cls(user_id=user_id, tag_id=tag_id, key=key, entry_count=count, last_used=last_used)
+               for tag_id, (key, count, last_used) in counts.items() if tag_id not in existing]
+
+        if stale:
+            cls.objects.filter(pk__in=stale).delete()
+        if changed:
+            cls.objects.bulk_update(changed, ["key", "entry_count", "last_used"])
+        if new:
+            # a concurrent refresh may have created some of them
+            cls.objects.bulk_create(new, ignore_conflicts=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "tag"], name="unique_tag_usage"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "key"], name="tag_usage_user_key"),
+        ]
+
+def _api_tags(entry):
+    # the names prefetched by light()/tag_list_prefetch(), or the tags relation
+    tags = entry.tag_list if hasattr(entry, "tag_list") else entry.tags.all()
+    return [tag.name for tag in tags]
+
+class JournalEntryQuerySet(models.QuerySet):
+    def light(self):
+        """
+        Entries without their bodies (content and plain_text) and with their
+        tag names in entry.tag_list, for calendars, navigation and lists.
+        """
+        from .tags import tag_list_prefetch
+        return self.defer(*JournalEntry.BODY_FIELDS).prefetch_related(tag_list_prefetch())
 
 class JournalEntry(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="entries")
     title = models.CharField(max_length=200, default="Untitled")
-    content = models.TextField()
+    # compressed above a size threshold, see journal/compression.py
+    content = CompressedTextField()
     tags = models.ManyToManyField(Tag, blank=True, related_name="tag_entries")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     date = models.DateField(default=timezone.now)
+    # derived from content on save, so templates/search don't parse HTML
+    plain_text = models.TextField(blank=True, default="", editable=False)
+    excerpt = models.TextField(blank=True, default="", editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+
+    TEXT_FIELDS = ("plain_text", "excerpt", "word_count")
+    # the large columns that light() leaves out
+    BODY_FIELDS = ("content", "plain_text")
+    # what serialize() can return, in order, for the API's ?fields=
+    API_FIELDS = {
+        "id": lambda entry: entry.id,
+        "title": lambda entry: entry.title,
+        "content": lambda entry: entry.content,
+        "tags": _api_tags,
+        "created_at": lambda entry: api_timestamp(entry.created_at),
+        "updated_at": lambda entry: api_timestamp(entry.updated_at),
+        "date": lambda entry: entry.date.isoformat(),
+        "excerpt": lambda entry: entry.excerpt,
+        "word_count": lambda entry: entry.word_count,
+    }
+    LIGHT_API_FIELDS = tuple(name for name in API_FIELDS if name != "content")
+
+    objects = JournalEntryQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.title} - {self.date}"
 
+    def update_text_fields(self):
+        """
+        Recompute plain_text, excerpt and word_count from content. save()
+        calls this, bulk_create/bulk_update callers must do it themselves.
+        """
+        for name, value in text_fields(self.content).items():
+            setattr(self, name, value)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored date so saves can tell whether it moved
+        instance._loaded_date = instance.__dict__.get("date")
+        return instance
+
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content" in update_fields:
+            self.update_text_fields()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *self.TEXT_FIELDS}
         super().save(*args, **kwargs)
-        
-        # Update user's streak when a new entry is created
-        if is_new and hasattr(self.user, 'profile'):
-            self.user.profile.update_streak()
-
-    def serialize(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "content": self.content,
-            "tags": [tag.name for tag in self.tags.all()],
-            "created_at": self.created_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-            "updated_at": self.updated_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-            "date": self.date.strftime("%Y-%m-%d")
-        }
+        # post_save receivers have seen the old date by now
+        self._loaded_date = self.date
+
+    def serialize(self, fields=None):
+        """
+        The entry as the JSON API returns it, only `fields` (names from
+        API_FIELDS, see parse_api_fields) when given. The APIs build the
+        same dicts from values() rows, see journal/serializers.py.
+        """
+        return {name: self.API_FIELDS[name](self) for name in fields or self.API_FIELDS}
+
+    @classmethod
+    def parse_api_fields(cls, value):
+        """
+        The names in a comma separated ?fields= value, in API_FIELDS order,
+        or None for all of them. Raises ValueError on an unknown name.
+        """
+        if not value:
+            return None
+        names = {name.strip() for name in value.split(",")} - {""}
+        unknown = names - cls.API_FIELDS.keys()
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+        return tuple(name for name in cls.API_FIELDS if name in names) or None
 
     class Meta:
         ordering = ["-date"]
         verbose_name_plural = "Journal Entries"
+        constraints = [
+            # one entry per day; its (user, date) index also serves every
+            # per-user date lookup (exact, ranges and prev/next navigation)
+            models.UniqueConstraint(fields=["user", "date"], name="unique_entry_per_day"),
+        ]
+        indexes = [
+            # delta sync walks a user's entries in (updated_at, id) order
+            models.Index(fields=["user", "updated_at"], name="entry_user_updated"),
+        ]
+
+
+class EntryTombstone(models.Model):
+    """
+    Left behind by a deleted entry so delta sync can tell clients to drop it.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    entry_id = models.PositiveBigIntegerField()
+    date = models.DateField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Deleted entry {self.entry_id} ({self.date})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "deleted_at"], name="tombstone_user_deleted"),
+        ]
+
+class DerivedJob(models.Model):
+    """
+    Derived data of a user waiting for the run_jobs worker, see jobs.py.
+    One row per (user, kind, entry, tag), so queuing the same work again
+    before it runs is a no-op.
+    """
+    STATS = "stats"
+    TAGS = "tags"
+    SEARCH = "search"
+    KINDS = [(STATS, "Streaks and counts"), (TAGS, "Tag usage"), (SEARCH, "Search index")]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(max_length=10, choices=KINDS)
+    # the entry to (un)index for search jobs, 0 for the per-user kinds
+    entry_id = models.PositiveBigIntegerField(default=0)
+    # the tag to recount for tag jobs, 0 for all of the user's tags
+    tag_id = models.PositiveBigIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return f"{self.kind} job for user {self.user_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "kind", "entry_id", "tag_id"], name="unique_derived_job"),
+        ]
+        indexes = [
+            models.Index(fields=["run_after"], name="derived_job_run_after"),
+        ]
+
+
+class SearchDocument(models.Model):
+    """
+    Per-entry row of the portable search index (used when FTS5 is unavailable).
+    """
+    entry = models.OneToOneField(JournalEntry, on_delete=models.CASCADE, related_name="search_document")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="search_documents")
+    length = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Search document for entry {self.entry_id}"
+
+
+class SearchPosting(models.Model):
+    """
+    One term of a SearchDocument with its (title-weighted) frequency.
+    """
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name="postings")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    term = models.CharField(max_length=64)
+    frequency = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.term} ({self.frequency})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["document", "term"], name="unique_search_posting"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "term"], name="search_posting_user_term"),
+        ]
+
+
+def _deleting_account(origin):
+    # origin is the User for user.delete() and the queryset for
+    # User.objects.filter(...).delete()
+    return isinstance(origin, User) or (isinstance(origin, models.QuerySet) and origin.model is User)
+
+@receiver(post_save, sender=JournalEntry)
+def queue_saved_entry_jobs(sender, instance, created, raw=False, **kwargs):
+    from .derived import stats_deferred
+    from .jobs import enqueue
+    if raw:
+        return
+    kinds = []
+    moved = instance.date != getattr(instance, "_loaded_date", instance.date)
+    if not stats_deferred():
+        # only new entries or moved dates change streaks and counts
+        if created or moved:
+            kinds.append(DerivedJob.STATS)
+        # last_used follows the entry's day; new entries get their tags afterwards
+        if moved and not created:
+            kinds.append(DerivedJob.TAGS)
+    enqueue(instance.user_id, kinds, [instance.pk])
+
+@receiver(post_delete, sender=JournalEntry)
+def queue_deleted_entry_jobs(sender, instance, origin=None, **kwargs):
+    from .derived import stats_deferred
+    from .jobs import enqueue
+    if _deleting_account(origin):
+        # nothing to maintain when the whole account is being deleted, its
+        # jobs go with it; only the FTS table has no foreign key
+        from .search import remove_entry
+        remove_entry(instance.pk)
+        return
+    # the entry's through rows are already gone, so tags are recounted too
+    kinds = [] if stats_deferred() else [DerivedJob.STATS, DerivedJob.TAGS]
+    enqueue(instance.user_id, kinds, [instance.pk])
+
+@receiver(post_delete, sender=JournalEntry)
+def record_entry_tombstone(sender, instance, origin=None, **kwargs):
+    # the account's tombstones go with it
+    if _deleting_account(origin):
+        return
+    EntryTombstone.objects.create(user_id=instance.user_id, entry_id=instance.pk, date=instance.date)
+
+@receiver(m2m_changed, sender=JournalEntry.tags.through)
+def touch_entry_on_tag_change(sender, instance, action, reverse, **kwargs):
+    # tags are part of the synced entry, so a tag change is an update
+    if action.startswith("post_") and not reverse:
+        instance.updated_at = timezone.now()
+        JournalEntry.objects.filter(pk=instance.pk).update(updated_at=instance.updated_at)
+
+@receiver(m2m_changed, sender=JournalEntry.tags.through)
+def queue_tag_usage_job(sender, instance, action, reverse, pk_set, **kwargs):
+    from .jobs import enqueue
+    # reverse (tag side) changes are admin-only, like the calendar receiver
+    if reverse or action not in ("post_add", "post_remove", "post_clear"):
+        return
+    # only the added or removed tags are recounted; a clear doesn't say which
+    if action == "post_clear":
+        enqueue(instance.user_id, [DerivedJob.TAGS])
+    elif pk_set:
+        enqueue(instance.user_id, tag_ids=pk_set)
+
+@receiver(post_save, sender=JournalEntry)
+def invalidate_saved_entry_calendar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from . import calendar_cache
+    calendar_cache.invalidate_dates(
+        instance.user_id, instance.date, getattr(instance, "_loaded_date", None))
+
+@receiver(post_delete, sender=JournalEntry)
+def invalidate_deleted_entry_calendar(sender, instance, **kwargs):
+    from . import calendar_cache
+    calendar_cache.invalidate_dates(instance.user_id, instance.date)
+
+@receiver(m2m_changed, sender=JournalEntry.tags.through)
+def invalidate_entry_tags_calendar(sender, instance, action, reverse, **kwargs):
+    # only the day panel shows tags; reverse (tag side) changes are admin-only
+    if action.startswith("post_") and not reverse:
+        from . import calendar_cache
+        calendar_cache.invalidate_dates(instance.user_id, instance.date)
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_cached_profile(sender, instance, raw=False, **kwargs):
+    from . import calendar_cache
+    calendar_cache.invalidate_profile(instance.user_id)
+
+# The signed-in user is cached with its profile, see journal/auth.py
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, raw=False, **kwargs):
+    from . import auth
+    auth.invalidate_user(instance.pk)
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_cached_user_profile(sender, instance, raw=False, **kwargs):
+    from . import auth
+    auth.invalidate_user(instance.user_id)
+
+@receiver(user_logged_out)
+def invalidate_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        from . import auth
+        auth.invalidate_user(user.pk)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
@@ -0,0 +1,223 @@
+"""
+Full-text search over journal entries.
+
+On SQLite (the dev database) entries are indexed in an FTS5 virtual table and
+ranked with its built-in bm25(). Every row carries its user as a "u<id>"
+token in the owner column, and queries MATCH that token along with the terms,
+so FTS5 only walks the user's own documents. Other backends, e.g. MySQL in
+production, use the portable SearchDocument/SearchPosting inverted index and
+are ranked with BM25 over the user's documents only, summed and limited in
+the database. Either index is updated on entry save/delete.
+
+Terms are casefolded and stripped of accents like the FTS5 tokenizer does
+(remove_diacritics), so "Café" and "cafe" are one term, and one posting row,
+under any collation.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Avg, Case, Count, ExpressionWrapper, F, FloatField, Sum, Value, When
+from django.utils.html import escape
+
+from .models import JournalEntry, SearchDocument, SearchPosting
+
+FTS_TABLE = "journal_entry_fts"
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_TERM_LENGTH = 64
+TITLE_WEIGHT = 2
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SNIPPET_WORDS = 30
+DEFAULT_LIMIT = 20
+
+# database NAME -> whether the FTS5 table exists
+_fts_available = {}
+
+
+def normalize(token):
+    decomposed = unicodedata.normalize("NFKD", token.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return [
+        token for token in (normalize(match) for match in TOKEN_RE.findall(text))
+        if token and len(token) <= MAX_TERM_LENGTH
+    ]
+
+
+def owner_token(user_id):
+    return f"u{user_id}"
+
+
+def uses_fts():
+    """
+    True when the default database is SQLite and has the FTS5 index table.
+    """
+    if connection.vendor != "sqlite":
+        return False
+    name = str(connection.settings_dict["NAME"])
+    if name not in _fts_available:
+        with connection.cursor() as cursor:
+            _fts_available[name] = FTS_TABLE in connection.introspection.table_names(cursor)
+    return _fts_available[name]
+
+
+# Indexing
+
+def index_entry(entry):
+    """
+    (Re)index a single entry.
+    """
+    title = entry.title or ""
+    body = entry.plain_text
+
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [entry.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body, owner) VALUES (%s, %s, %s, %s)",
+                [entry.pk, title, body, owner_token(entry.user_id)])
+        return
+
+    title_tokens = tokenize(title)
+    body_tokens = tokenize(body)
+    frequencies = Counter(body_tokens)
+    for token in title_tokens:
+        frequencies[token] += TITLE_WEIGHT
+
+    with transaction.atomic():
+        document, _ = SearchDocument.objects.update_or_create(
+            entry_id=entry.pk,
+            defaults={"user_id": entry.user_id, "length": len(title_tokens) + len(body_tokens)})
+        document.postings.all().delete()
+        SearchPosting.objects.bulk_create([
+            SearchPosting(document=document, user_id=entry.user_id, term=term, frequency=frequency)
+            for term, frequency in frequencies.items()
+        ])
+
+
+def remove_entry(entry_id):
+    """
+    Drop an entry from the index. Portable index rows also cascade with the entry.
+    """
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [entry_id])
+    else:
+        SearchDocument.objects.filter(entry_id=entry_id).delete()
+
+
+def rebuild_index(entries):
+    """
+    Reindex every entry in the given queryset, returns the number indexed.
+    """
+    count = 0
+    for entry in entries.iterator(chunk_size=500):
+        index_entry(entry)
+        count += 1
+    return count
+
+
+# Querying
+
+def search(user, query, limit=DEFAULT_LIMIT):
+    """
+    Return up to `limit` of the user's entries matching `query`, best first.
+
+    Each result is a dict with id, title, date, score and an HTML-safe
+    snippet in which matched words are wrapped in <mark>.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    if uses_fts():
+        ranked = _search_fts(user, terms, limit)
+    else:
+        ranked = _search_postings(user, terms, limit)
+
+    entries = JournalEntry.objects.filter(id__in=[entry_id for entry_id, _ in ranked]) \
+        .only("id", "title", "plain_text", "date").in_bulk()
+    results = []
+    for entry_id, score in ranked:
+        entry = entries.get(entry_id)
+        if entry is None:
+            continue
+        results.append({
+            "id": entry.id,
+            "title": entry.title,
+            "date": entry.date.isoformat(),
+            "score": round(score, 4),
+            "snippet": make_snippet(entry.plain_text, terms),
+        })
+    return results
+
+
+def _search_fts(user, terms, limit):
+    # quote every term so user input can't inject FTS5 query syntax; the
+    # owner token limits the match to the user's rows, its weight is 0
+    any_term = " OR ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+    match = f'owner : "{owner_token(user.pk)}" AND ({any_term})'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, bm25({FTS_TABLE}, %s, 1.0, 0.0) AS rank FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            [float(TITLE_WEIGHT), match, limit])
+        # bm25() is lower-is-better, flip the sign for the API
+        return [(row[0], -row[1]) for row in cursor.fetchall()]
+
+
+def _search_postings(user, terms, limit):
+    postings = SearchPosting.objects.filter(user=user, term__in=terms)
+    document_frequency = dict(postings.order_by().values_list("term").annotate(Count("id")))
+    if not document_frequency:
+        return []
+
+    stats = SearchDocument.objects.filter(user=user).aggregate(avg_length=Avg("length"), documents=Count("id"))
+    avg_length = stats["avg_length"] or 1
+    idf = {
+        term: math.log(1 + (stats["documents"] - df + 0.5) / (df + 0.5))
+        for term, df in document_frequency.items()
+    }
+
+    # sum of idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg)) per
+    # entry, so only the `limit` best rows come back
+    term_idf = Case(*[When(term=term, then=Value(weight)) for term, weight in idf.items()],
+                    output_field=FloatField())
+    norm = (Value(BM25_K1 * (1 - BM25_B))
+            + Value(BM25_K1 * BM25_B / avg_length) * F("document__length"))
+    score = term_idf * F("frequency") * Value(BM25_K1 + 1) / (F("frequency") + norm)
+    ranked = (postings.values("document__entry_id")
+              .annotate(score=Sum(ExpressionWrapper(score, output_field=FloatField())))
+              .order_by("-score", "document__entry_id")[:limit])
+    return [(row["document__entry_id"], row["score"]) for row in ranked]
+
+
+def make_snippet(text, terms, size=SNIPPET_WORDS):
+    """
+    Window of `size` words around the first match, matches wrapped in <mark>.
+    """
+    words = text.split()
+    wanted = set(terms)
+
+    def matches(word):
+        return any(normalize(token) in wanted for token in TOKEN_RE.findall(word))
+
+    first = next((i for i, word in enumerate(words) if matches(word)), 0)
+    start = max(0, first - size // 3)
+    window = words[start:start + size]
+
+    parts = [f"<mark>{escape(word)}</mark>" if matches(word) else escape(word) for word in window]
+    snippet = " ".join(parts)
+    if start > 0:
+        snippet = "… " + snippet
+    if start + size < len(words):
+        snippet += " …"
+    return snippet
@@ -0,0 +1,118 @@
+"""
+Entry payloads for the JSON APIs, built from values() rows.
+
+rows()/arows() read a queryset's entries as dicts with one query, and the
+tag names of all of them with one more over the through table, instead of
+model instances and a prefetch. payload() turns a row into the dict
+JournalEntry.serialize() returns for an instance, with only `fields` when
+given (see JournalEntry.parse_api_fields).
+
+dumps() encodes with orjson when it is installed and with the json module
+otherwise (json_dumps()), both to compact bytes; PayloadResponse sends the result.
+Responses are compressed by journal.middleware.CompressionMiddleware.
+"""
+import json
+from collections import defaultdict
+
+from django.http import HttpResponse
+
+from .compression import decompress_text
+from .models import JournalEntry
+from .utils import api_timestamp
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# read for every row: the keys of pagination cursors and sync tokens
+KEY_COLUMNS = ("id", "date", "updated_at")
+
+# how each API field is formatted from its column, None when as it is
+FORMATS = {
+    "id": None,
+    "title": None,
+    # values() returns the stored form of compressed content
+    "content": decompress_text,
+    "tags": None,
+    "created_at": api_timestamp,
+    "updated_at": api_timestamp,
+    "date": lambda value: value.isoformat(),
+    "excerpt": None,
+    "word_count": None,
+}
+
+
+def columns(fields=None):
+    names = JournalEntry.API_FIELDS if fields is None else fields
+    return [*KEY_COLUMNS, *(name for name in names if name not in KEY_COLUMNS and name != "tags")]
+
+
+def _wants_tags(fields):
+    return fields is None or "tags" in fields
+
+
+def _tag_names(entry_ids):
+    return (JournalEntry.tags.through.objects.filter(journalentry_id__in=entry_ids)
+            .order_by("tag__name").values_list("journalentry_id", "tag__name"))
+
+
+def _attach_tags(rows, pairs):
+    names = defaultdict(list)
+    for entry_id, name in pairs:
+        names[entry_id].append(name)
+    for row in rows:
+        row["tags"] = names.get(row["id"], [])
+    return rows
+
+
+def rows(entries, fields=None):
+    """
+    The entries of a queryset (without prefetches) as dicts holding the
+    columns of `fields`, the keys and, when wanted, a "tags" list.
+    """
+    found = list(entries.values(*columns(fields)))
+    if _wants_tags(fields) and found:
+        _attach_tags(found, _tag_names([row["id"] for row in found]))
+    return found
+
+
+async def arows(entries, fields=None):
+    """
+    rows() for async views.
+    """
+    found = [row async for row in entries.values(*columns(fields))]
+    if _wants_tags(fields) and found:
+        _attach_tags(found, [pair async for pair in _tag_names([row["id"] for row in found])])
+    return found
+
+
+def payload(row, fields=None):
+    data = {}
+    for name in fields or JournalEntry.API_FIELDS:
+        value, format_value = row[name], FORMATS[name]
+        data[name] = value if format_value is None else format_value(value)
+    return data
+
+
+def payloads(rows, fields=None):
+    return [payload(row, fields) for row in rows]
+
+
+def json_dumps(data):
+    # escaping non-ASCII keeps the json module on its faster path
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def dumps(data):
+    return orjson.dumps(data) if orjson is not None else json_dumps(data)
+
+
+class PayloadResponse(HttpResponse):
+    """
+    JsonResponse encoded with dumps(). Takes any JSON value, not only dicts,
+    and plain JSON types only (no DjangoJSONEncoder).
+    """
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(dumps(data), **kwargs)
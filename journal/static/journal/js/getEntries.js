@@ -42,18 +42,30 @@ const displayAlert = (type, data) => {
     }
 }
 
-// * returns all entries
+// * returns all entries, kept up to date through the delta-sync API
+const entriesById = new Map()
+let syncToken = null
+
 async function getEntries() {
-    // once run, do not fetch data again
-    if (data) return data
     try {
-        const res = await fetch(`${originURL}/entries`)
-        if (!res.ok) { throw new Error("Could not fetch data!") }
-        data = await res.json()
-        // console.log("getEntries: ", data);
+        // first call copies the whole journal, later ones only fetch changes
+        let hasMore = true
+        while (hasMore) {
+            const query = syncToken ? `?since=${encodeURIComponent(syncToken)}` : ""
+            const res = await fetch(`${originURL}/api/sync/${query}`)
+            if (!res.ok) { throw new Error("Could not fetch data!") }
+            const changes = await res.json()
+            for (const entry of changes.entries) entriesById.set(entry.id, entry)
+            for (const deleted of changes.deleted) entriesById.delete(deleted.id)
+            syncToken = changes.next
+            hasMore = changes.has_more
+        }
+        data = [...entriesById.values()].sort((a, b) => b.date.localeCompare(a.date))
         return data
     } catch (error) {
         displayAlert("error", error)
+        // fall back to the last synced copy
+        return data
     }
 }
 
@@ -0,0 +1,99 @@
+"""
+Delta sync: what changed in a user's journal after a sync token.
+
+Entries are walked in (updated_at, id) order, so a token is a keyset
+position and the pages of one sync never skip or repeat an entry. Deletes
+come from the EntryTombstone rows written when an entry is deleted, and tag
+changes bump the entry's updated_at, so a client that upserts ``entries``
+by id and drops the ``deleted`` ids stays an exact copy.
+
+updated_at and deleted_at are set before the write commits, so a slow
+transaction can commit a change older than a token already handed out. The
+first page after a caught-up token re-scans SYNC_OVERLAP_SECONDS before it
+to pick those up; the re-sent changes are harmless to apply again.
+
+Tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS are pruned
+(prune_tombstones), so a token older than that could miss deletes and
+raises TokenExpired: the client has to sync from scratch. The pages of a
+sync in progress never expire, the deletes they could miss are of entries
+the client doesn't have.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import serializers
+from .models import EntryTombstone, JournalEntry
+from .utils import decode_sync_token, encode_sync_token
+
+SYNC_PAGE_SIZE = 200
+
+
+class TokenExpired(ValueError):
+    pass
+
+
+def tombstone_horizon():
+    """
+    Tombstones deleted before this may have been pruned.
+    """
+    return timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+
+
+def changes_since(user, token=None, limit=SYNC_PAGE_SIZE, fields=None):
+    """
+    One page of changes after `token` (everything when it is None), with
+    only `fields` of each entry when given. Keep calling with the returned
+    ``next`` token while ``has_more`` is true. Raises ValueError on a
+    malformed token and TokenExpired on one older than the tombstones.
+    """
+    entries = JournalEntry.objects.filter(user=user).order_by("updated_at", "id")
+    tombstones = EntryTombstone.objects.filter(user=user)
+    position = (datetime.min, 0)
+    if token:
+        since, since_id, next_page = decode_sync_token(token)
+        position = (since, since_id)
+        if next_page:
+            entries = entries.filter(Q(updated_at__gt=since) | Q(updated_at=since, id__gt=since_id))
+        else:
+            since -= timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+            if since < tombstone_horizon():
+                raise TokenExpired("Sync token expired.")
+            entries = entries.filter(updated_at__gt=since)
+        tombstones = tombstones.filter(deleted_at__gt=since)
+
+    # fetch one extra row to know whether another page exists
+    page = serializers.rows(entries[:limit + 1], fields)
+    has_more = len(page) > limit
+    page = page[:limit]
+    if has_more:
+        # later deletes are reported with the page that reaches them
+        tombstones = tombstones.filter(deleted_at__lte=page[-1]["updated_at"])
+
+    if token:
+        deleted = list(tombstones.order_by("deleted_at").values_list("entry_id", "date", "deleted_at"))
+        latest_delete = deleted[-1][2] if deleted else None
+    else:
+        # a fresh copy has nothing to drop, but its token must start after
+        # the deletes that already happened
+        deleted = []
+        latest_delete = tombstones.order_by("-deleted_at").values_list("deleted_at", flat=True).first()
+
+    if has_more:
+        # a re-scan page can end before `position`, the next page goes on
+        # from the row it stopped at
+        position = (page[-1]["updated_at"], page[-1]["id"])
+    else:
+        if page:
+            position = max(position, (page[-1]["updated_at"], page[-1]["id"]))
+        if latest_delete is not None:
+            position = max(position, (latest_delete, 0))
+
+    return {
+        "entries": serializers.payloads(page, fields),
+        "deleted": [{"id": entry_id, "date": day.isoformat()} for entry_id, day, _ in deleted],
+        "next": encode_sync_token(*position, page=has_more),
+        "has_more": has_more,
+    }
@@ -0,0 +1,144 @@
+"""
+Tag resolution shared by every path that writes an entry's tags.
+
+Names are normalized once, existing tags are fetched with a single
+``name__in`` query, missing ones are created with one bulk INSERT that
+ignores rows a concurrent writer created first, and the entry's tag set is
+diffed so only changed through-rows are inserted or deleted.
+
+Which existing tag a name means is left to the database: its collation may
+equate more than Python's lower() does (MySQL's default also matches "cafe"
+to "café"), so only identical names are matched in Python and the rest are
+looked up one by one with ``iexact``.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Prefetch, Q
+
+from .models import JournalEntry, Tag
+
+MAX_TAG_LENGTH = Tag._meta.get_field("name").max_length
+# names per OR'ed lookup, SQLite limits how deep an expression may nest
+LOOKUP_CHUNK_SIZE = 100
+
+
+def normalize_tag_names(names):
+    """
+    Accept a comma separated string or an iterable of names. Whitespace is
+    collapsed, empty names dropped and case-insensitive duplicates removed
+    (the first spelling wins).
+    """
+    if isinstance(names, str):
+        names = names.split(",")
+
+    normalized = {}
+    for name in names or []:
+        name = " ".join(str(name).split())[:MAX_TAG_LENGTH]
+        if name and name.lower() not in normalized:
+            normalized[name.lower()] = name
+    return list(normalized.values())
+
+
+def _identical_tags(names):
+    tags = {tag.name: tag for tag in Tag.objects.filter(name__in=names).order_by()}
+    return {name: tags[name] for name in names if name in tags}
+
+
+def _matching_tags(names):
+    # one query to see whether any of them has a match, then one per name
+    chunks = [names[i:i + LOOKUP_CHUNK_SIZE] for i in range(0, len(names), LOOKUP_CHUNK_SIZE)]
+    if not any(Tag.objects.filter(reduce(or_, (Q(name__iexact=name) for name in chunk))).exists()
+               for chunk in chunks):
+        return {}
+    matches = {name: Tag.objects.filter(name__iexact=name).order_by("pk").first() for name in names}
+    return {name: tag for name, tag in matches.items() if tag is not None}
+
+
+def _resolve(names):
+    """
+    {name: Tag} for distinct normalized `names`, creating the missing tags.
+    """
+    tags = _identical_tags(names)
+    unmatched = [name for name in names if name not in tags]
+    if unmatched:
+        tags.update(_matching_tags(unmatched))
+        unmatched = [name for name in unmatched if name not in tags]
+    if unmatched:
+        # conflicting rows from concurrent writers are skipped, then picked up
+        # by the lookups below since bulk_create can't return their ids
+        Tag.objects.bulk_create([Tag(name=name) for name in normalize_tag_names(unmatched)],
+                                ignore_conflicts=True)
+        tags.update(_identical_tags(unmatched))
+        tags.update(_matching_tags([name for name in unmatched if name not in tags]))
+        for name in unmatched:
+            if name not in tags:
+                # a case variant lower() folds but the database doesn't
+                tags[name] = Tag.objects.get_or_create(name=name)[0]
+    return tags
+
+
+def resolve_tags(names):
+    """
+    Return Tag objects for `names` (in order), creating the missing ones.
+    """
+    names = normalize_tag_names(names)
+    if not names:
+        return []
+    tags = _resolve(names)
+    # names the database sees as one tag resolve to it once
+    return list({tags[name].pk: tags[name] for name in names}.values())
+
+
+def set_entry_tags(entry, names):
+    """
+    Make `entry`'s tags exactly `names`, returns the resolved tags.
+    """
+    with transaction.atomic():
+        tags = resolve_tags(names)
+        wanted = {tag.pk for tag in tags}
+        current = set(entry.tags.through.objects.filter(
+            journalentry_id=entry.pk).values_list("tag_id", flat=True))
+
+        if current - wanted:
+            entry.tags.remove(*(current - wanted))
+        if wanted - current:
+            entry.tags.add(*(wanted - current))
+    return tags
+
+
+def set_tags_bulk(names_by_entry):
+    """
+    set_entry_tags() for many entries at once, `names_by_entry` maps entry
+    ids to tag names. All names are resolved together and the through rows
+    are diffed with one SELECT, one DELETE and one INSERT. No m2m_changed
+    signals are sent, callers refresh derived data themselves.
+    """
+    if not names_by_entry:
+        return
+    Through = JournalEntry.tags.through
+    with transaction.atomic():
+        names_by_entry = {entry_id: normalize_tag_names(names) for entry_id, names in names_by_entry.items()}
+        tags = _resolve(list(dict.fromkeys(name for names in names_by_entry.values() for name in names)))
+        wanted = {(entry_id, tags[name].pk) for entry_id, names in names_by_entry.items() for name in names}
+        current = {(entry_id, tag_id): pk for pk, entry_id, tag_id in Through.objects.filter(
+            journalentry_id__in=list(names_by_entry)).values_list("pk", "journalentry_id", "tag_id")}
+
+        stale = [pk for pair, pk in current.items() if pair not in wanted]
+        if stale:
+            Through.objects.filter(pk__in=stale).delete()
+        missing = wanted - current.keys()
+        if missing:
+            Through.objects.bulk_create([
+                Through(journalentry_id=entry_id, tag_id=tag_id) for entry_id, tag_id in missing
+            ], ignore_conflicts=True)
+
+
+def tag_list_prefetch():
+    """
+    Prefetch each entry's tags into a plain list, ``entry.tag_list``, that
+    templates can loop over, slice and measure (``|length``) without further
+    queries; ``entry.tags.count`` would query again even when prefetched.
+    """
+    return Prefetch("tags", queryset=Tag.objects.only("name"), to_attr="tag_list")
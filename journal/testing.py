@@ -0,0 +1,59 @@
+"""
+Test helpers for the instrumentation in journal.instrumentation.
+
+QueryBudgetMixin turns QUERY_BUDGET_STRICT on, so any request to a view over
+its @query_budget raises QueryBudgetExceeded and fails the test:
+
+    class ViewTests(QueryBudgetMixin, TestCase):
+        def test_index(self):
+            self.client.force_login(self.user)
+            self.client.get("/")  # fails if index runs more than its budget
+"""
+import re
+
+from django.test import override_settings
+from django.urls import URLResolver, get_resolver
+
+SERVER_TIMING_PATTERN = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="(\d+) queries")?')
+
+
+def server_timing(response):
+    """
+    Parse a response's Server-Timing header into
+    {"queries": n, "db": ms, "tpl": ms, "total": ms}.
+    """
+    timings = {}
+    for name, duration, queries in SERVER_TIMING_PATTERN.findall(response.get("Server-Timing", "")):
+        timings[name] = float(duration)
+        if queries:
+            timings["queries"] = int(queries)
+    return timings
+
+
+def query_budgets(patterns=None):
+    """
+    {url name: budget} for every URL pattern whose view declares one, so a
+    test can check that each budgeted view is exercised.
+    """
+    budgets = {}
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            budgets.update(query_budgets(pattern.url_patterns))
+        elif getattr(pattern.callback, "query_budget", None) is not None:
+            budgets[pattern.name or pattern.lookup_str] = pattern.callback.query_budget
+    return budgets
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin: views over their query budget fail the test, and
+    assertRequestQueries(response, n) checks the count reported by the middleware.
+    """
+    def setUp(self):
+        super().setUp()
+        strict = override_settings(QUERY_BUDGET_STRICT=True, SERVER_TIMING=True)
+        strict.enable()
+        self.addCleanup(strict.disable)
+
+    def assertRequestQueries(self, response, expected):
+        self.assertEqual(server_timing(response).get("queries"), expected)
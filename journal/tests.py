@@ -1,3 +1,866 @@
-from django.test import TestCase
+import gzip
+import json
+import math
+from base64 import urlsafe_b64encode
+from collections import Counter
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from journal import activity, analytics, archive, auth, calendar_cache, compression, jobs, search, sync
+from journal.middleware import CompressionMiddleware, accepted_encodings, brotli
+from journal.models import (
+    ActivityYear, DerivedJob, EntryTombstone, JournalEntry, SearchDocument, SearchPosting, Tag, TagUsage, UserProfile,
+)
+from journal.tags import resolve_tags, set_entry_tags, set_tags_bulk
+from journal.testing import QueryBudgetMixin, query_budgets, server_timing
+from journal.utils import decode_sync_token, encode_cursor, summarize_streaks
+
+# the manifest storage needs collectstatic, which tests don't run
+TEST_SETTINGS = override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+
+
+@TEST_SETTINGS
+class BatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("writer", "writer@example.com", "password")
+        self.client.force_login(self.user)
+
+    def entry(self, day, **fields):
+        fields.setdefault("content", f"<p>{day}</p>")
+        return JournalEntry.objects.create(user=self.user, date=day, **fields)
+
+    def post(self, operations):
+        response = self.client.post("/api/entries/batch/", json.dumps({"operations": operations}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return [result["status"] for result in response.json()["results"]]
+
+    def test_updates_of_one_entry_build_on_each_other(self):
+        entry = self.entry(date(2024, 1, 1), title="orig")
+        statuses = self.post([
+            {"op": "update", "id": entry.id, "title": "new"},
+            {"op": "update", "id": entry.id, "content": "<p>changed</p>"},
+            {"op": "update", "id": entry.id, "date": "2024-01-02"},
+        ])
+        self.assertEqual(statuses, ["ok", "ok", "ok"])
+        entry.refresh_from_db()
+        self.assertEqual((entry.title, entry.content, entry.date), ("new", "<p>changed</p>", date(2024, 1, 2)))
+
+    def test_field_types_are_checked_per_operation(self):
+        entry = self.entry(date(2024, 1, 1))
+        statuses = self.post([
+            {"op": "update", "id": entry.id, "tags": 5},
+            {"op": "update", "id": entry.id, "title": ["list"]},
+            {"op": "create", "date": 20240102, "content": "<p>x</p>"},
+            {"op": "create", "date": "2024-01-03", "content": {"html": "x"}},
+            {"op": "create", "date": "2024-01-04", "content": "<p>ok</p>", "tags": ["a", "b"]},
+        ])
+        self.assertEqual(statuses, ["error", "error", "error", "error", "ok"])
+
+    def test_chained_date_moves(self):
+        first, second = self.entry(date(2024, 1, 1)), self.entry(date(2024, 1, 2))
+        statuses = self.post([
+            {"op": "update", "id": second.id, "date": "2024-01-03"},
+            {"op": "update", "id": first.id, "date": "2024-01-02"},
+        ])
+        self.assertEqual(statuses, ["ok", "ok"])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.date, second.date), (date(2024, 1, 2), date(2024, 1, 3)))
+
+    def test_swapped_dates(self):
+        first, second = self.entry(date(2024, 1, 1)), self.entry(date(2024, 1, 2))
+        statuses = self.post([
+            {"op": "update", "id": first.id, "date": "2024-01-03"},
+            {"op": "update", "id": second.id, "date": "2024-01-01"},
+            {"op": "update", "id": first.id, "date": "2024-01-02"},
+        ])
+        self.assertEqual(statuses, ["ok", "ok", "ok"])
+        self.assertEqual(dict(JournalEntry.objects.values_list("id", "date")),
+                         {first.id: date(2024, 1, 2), second.id: date(2024, 1, 1)})
+
+    def test_booleans_are_not_ids(self):
+        entry = self.entry(date(2024, 1, 1), title="kept")
+        self.assertEqual(entry.id, 1)
+        self.assertEqual(self.post([
+            {"op": "update", "id": True, "title": "changed"},
+            {"op": "delete", "id": True},
+        ]), ["error", "error"])
+        self.assertTrue(JournalEntry.objects.filter(pk=entry.pk, title="kept").exists())
+
+    def test_chained_moves_next_to_date_min(self):
+        first, second = self.entry(date.min), self.entry(date(1, 1, 2))
+        chain = [
+            {"op": "update", "id": second.id, "date": "0001-01-03"},
+            {"op": "update", "id": first.id, "date": "0001-01-02"},
+        ]
+        self.assertEqual(self.post(chain), ["ok", "ok"])
+        self.assertEqual(dict(JournalEntry.objects.values_list("id", "date")),
+                         {first.id: date(1, 1, 2), second.id: date(1, 1, 3)})
+
+        # no free day on either side
+        self.entry(date.max)
+        chain = [
+            {"op": "update", "id": second.id, "date": "0001-01-04"},
+            {"op": "update", "id": first.id, "date": "0001-01-03"},
+        ]
+        response = self.client.post("/api/entries/batch/", json.dumps({"operations": chain}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(JournalEntry.objects.get(pk=first.pk).date, date(1, 1, 2))
+
+
+@TEST_SETTINGS
+class ImportTests(TestCase):
+    def test_records_with_wrong_types_are_reported(self):
+        user = User.objects.create_user("importer", "importer@example.com", "password")
+        records = [
+            {"date": "2024-01-01", "content": 5},
+            {"date": "2024-01-02", "content": "<p>x</p>", "title": ["t"]},
+            {"date": "2024-01-03", "content": "<p>x</p>", "tags": 7},
+            {"date": 20240104, "content": "<p>x</p>"},
+            {"date": "2024-01-05", "content": "<p>kept</p>", "tags": ["a"]},
+        ]
+        summary = archive.import_entries(user, records)
+        self.assertEqual(summary["created"], 1)
+        self.assertEqual([number for number, _ in summary["errors"]], [1, 2, 3, 4])
+
+
+@TEST_SETTINGS
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Every view with a @query_budget, requested with cold caches (the most
+    queries it runs) over a month of tagged entries.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("budget", "budget@example.com", "password")
+        today = date.today()
+        for offset in range(30):
+            entry = JournalEntry.objects.create(user=self.user, title=f"Day {offset}",
+                                                content=f"<p>words for day {offset}</p>",
+                                                date=today - timedelta(days=offset))
+            set_entry_tags(entry, ["daily", f"tag {offset % 5}"])
+        self.entry = entry
+        self.client.force_login(self.user)
+
+    def urls(self):
+        today = date.today()
+        return [
+            "/",
+            "/entries/",
+            "/entries/?page=2",
+            "/profile/",
+            f"/entry/date/{today.isoformat()}/",
+            "/api/entries/",
+            "/api/entries/?limit=10&fields=id,title",
+            "/api/entries/?format=ndjson",
+            f"/api/entry/{self.entry.id}/",
+            f"/api/calendar/{today.year}/{today.month}/",
+            "/api/sync/",
+            "/api/tags/?q=tag",
+            f"/api/activity/{today.year}/",
+            "/api/activity/",
+            "/api/search/?q=words",
+        ]
+
+    def test_views_stay_within_their_budget(self):
+        budgets = query_budgets()
+        covered = set()
+        for url in self.urls():
+            name = resolve(url.partition("?")[0]).url_name
+            with self.subTest(url=url):
+                cache.clear()
+                # a view over budget raises QueryBudgetExceeded
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                if name in budgets:
+                    covered.add(name)
+                    self.assertLessEqual(server_timing(response)["queries"], budgets[name])
+        self.assertEqual(covered, set(budgets))
+
+    def test_budgets_can_be_limited_to_reads(self):
+        # writes refresh streaks, tags and search in the request
+        response = self.client.put(f"/api/entry/{self.entry.id}/", json.dumps({"title": "Renamed", "tags": ["new"]}),
+                                   content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+
+
+@TEST_SETTINGS
+class ServerTimingTests(TestCase):
+    """
+    Query counts and timings are only sent with SERVER_TIMING on or to staff.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user("timing", "timing@example.com", "password")
+        self.client.force_login(self.user)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_not_sent_by_default(self):
+        response = self.client.get("/api/entries/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_sent_with_the_setting(self):
+        response = self.client.get("/api/entries/")
+        self.assertIn("queries", server_timing(response))
+
+    @override_settings(SERVER_TIMING=False)
+    def test_sent_to_staff(self):
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get("/api/entries/")
+        self.assertIn("queries", server_timing(response))
+
+    @override_settings(SERVER_TIMING=False)
+    def test_not_sent_to_anonymous_users(self):
+        self.client.logout()
+        response = self.client.get("/login/")
+        self.assertNotIn("Server-Timing", response)
+
+
+@TEST_SETTINGS
+class ListQueryCountTests(TestCase):
+    """
+    The list views' queries don't grow with the number of entries or tags
+    shown: N and 3N tagged entries cost the same.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user("lister", "lister@example.com", "password")
+        self.client.force_login(self.user)
+
+    def seed(self, count):
+        JournalEntry.objects.filter(user=self.user).delete()
+        for offset in range(count):
+            entry = JournalEntry.objects.create(user=self.user, content=f"<p>entry {offset}</p>",
+                                                date=date(2024, 1, 1) + timedelta(days=offset))
+            set_entry_tags(entry, [f"tag {offset}", f"shared {offset % 3}"])
+
+    def prepare(self, count):
+        self.seed(count)
+        cache.clear()
+        # warm up the session and user, so only the view's own queries count
+        self.client.get("/api/tags/")
+
+    def get(self, url):
+        response = self.client.get(url)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_count_is_independent_of_entry_count(self):
+        for url in ["/entries/", "/api/entries/", "/api/entries/?limit=10", "/api/entries/?format=ndjson"]:
+            with self.subTest(url=url):
+                self.prepare(12)
+                with CaptureQueriesContext(connection) as queries:
+                    self.get(url)
+                expected = len(queries)
+                self.prepare(36)
+                with self.assertNumQueries(expected):
+                    self.get(url)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_the_user_date_index(self):
+        user = User.objects.create_user("planner", "planner@example.com", "password")
+        for offset in range(20):
+            JournalEntry.objects.create(user=user, content="<p>x</p>", date=date(2024, 1, 1) + timedelta(days=offset))
+        # raises CommandError on a missing index, a table scan or a temp B-tree
+        call_command("explain_queries", user_id=user.id, date=date(2024, 1, 10), stdout=StringIO())
+
+
+@TEST_SETTINGS
+class ConditionalPageTests(TestCase):
+    def test_signing_in_again_changes_the_entry_page_etag(self):
+        user = User.objects.create_user("reader", "reader@example.com", "password")
+        JournalEntry.objects.create(user=user, content="<p>x</p>", date=date(2024, 1, 1))
+        self.client.post("/login/", {"username": "reader", "password": "password"})
+        url = "/entry/date/2024-01-01/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.get("/logout/")
+        self.client.post("/login/", {"username": "reader", "password": "password"})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@TEST_SETTINGS
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("pager", "pager@example.com", "password")
+        for day in range(1, 8):
+            JournalEntry.objects.create(user=self.user, title=f"Day {day}", content="<p>x</p>",
+                                        date=date(2024, 1, day))
+        self.client.force_login(self.user)
+
+    def test_pages_cover_every_entry_once(self):
+        ids, url = [], "/api/entries/?limit=3&fields=id"
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data["results"]), 3)
+            ids += [row["id"] for row in data["results"]]
+            url = data["next"] and f"/api/entries/?limit=3&fields=id&cursor={data['next']}"
+        expected = list(JournalEntry.objects.filter(user=self.user).order_by("-date", "-id")
+                        .values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_the_last_full_page_has_no_next(self):
+        data = self.client.get("/api/entries/?limit=7").json()
+        self.assertEqual(len(data["results"]), 7)
+        self.assertIsNone(data["next"])
+
+    def test_invalid_cursors_are_rejected(self):
+        valid = encode_cursor(date(2024, 1, 4), 1)
+        tampered = [urlsafe_b64encode(raw).decode() for raw in (b"2024-01-04", b"2024-01-04:x", b"2024-13-01:1")]
+        for cursor in ["!!!", valid[:-3], valid.swapcase(), *tampered]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f"/api/entries/?limit=3&cursor={cursor}")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Invalid limit or cursor."})
+        self.assertEqual(self.client.get("/api/entries/?limit=many").status_code, 400)
+
+
+@TEST_SETTINGS
+class FieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("fields", "fields@example.com", "password")
+        self.entry = JournalEntry.objects.create(user=self.user, title="Kept", content="<p>some words</p>",
+                                                 date=date(2024, 1, 1))
+        set_entry_tags(self.entry, ["b", "a"])
+        self.client.force_login(self.user)
+
+    def test_only_the_requested_fields(self):
+        for url in ["/api/entries/?fields=title,id", f"/api/entry/{self.entry.id}/?fields=title,id"]:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                row = data[0] if isinstance(data, list) else data
+                self.assertEqual(row, {"id": self.entry.id, "title": "Kept"})
+
+    def test_all_fields_by_default(self):
+        row = self.client.get("/api/entries/").json()[0]
+        self.assertEqual(set(row), set(JournalEntry.API_FIELDS))
+        self.assertEqual(row, self.client.get("/api/entries/?fields=" + ",".join(JournalEntry.API_FIELDS)).json()[0])
+        self.assertEqual(sorted(row["tags"]), ["a", "b"])
+
+    def test_tags_and_ndjson(self):
+        response = self.client.get("/api/entries/?format=ndjson&fields=tags,date")
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(set(row), {"tags", "date"})
+        self.assertEqual(sorted(row["tags"]), ["a", "b"])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get("/api/entries/?fields=title,password")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Unknown fields: password."})
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    def respond(self, accept_encoding, content, content_type="application/json"):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(content, content_type=content_type))
+        request = RequestFactory().get("/api/entries/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return middleware(request)
+
+    def test_gzip_when_accepted(self):
+        body = json.dumps([{"title": "day"}] * 50).encode()
+        response = self.respond("gzip, deflate", body)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), body)
+
+    def test_not_without_accept_encoding(self):
+        body = json.dumps([{"title": "day"}] * 50).encode()
+        for accept_encoding in ["", "identity", "gzip;q=0", "br;q=1, gzip;q=0"]:
+            with self.subTest(accept_encoding=accept_encoding), mock.patch("journal.middleware.brotli", None):
+                response = self.respond(accept_encoding, body)
+                self.assertFalse(response.has_header("Content-Encoding"))
+                self.assertEqual(response.content, body)
+
+    def test_small_responses_are_sent_as_is(self):
+        body = json.dumps([{"title": "day"}] * 10).encode()
+        self.assertLess(len(body), 200)
+        for accept_encoding in ["gzip", "br"]:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.respond(accept_encoding, body)
+                self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_pages_are_not_compressed(self):
+        # BREACH: pages carry a CSRF token
+        response = self.respond("gzip", b"<p>page</p>" * 50, "text/html")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_accepted_encodings(self):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="GZip, br;q=0, deflate;q=0.5, x;q=bad")
+        self.assertEqual(accepted_encodings(request), {"gzip", "deflate"})
+
+    @mock.patch("journal.middleware.brotli", None)
+    def test_gzip_when_brotli_is_missing(self):
+        body = json.dumps([{"title": "day"}] * 50).encode()
+        self.assertEqual(self.respond("br, gzip", body)["Content-Encoding"], "gzip")
+        self.assertFalse(self.respond("br", body).has_header("Content-Encoding"))
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_brotli_when_accepted(self):
+        body = json.dumps([{"title": "day"}] * 50).encode()
+        response = self.respond("gzip, br", body)
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), body)
+
+
+class AnalyticsTests(SimpleTestCase):
+    def test_vectorized_stats_match_summarize_streaks(self):
+        start = date(2023, 12, 20)
+        days = {
+            # streaks split by gaps, the longest one first, across New Year
+            1: [0, 1, 2, 3, 5, 6, 9, 20, 21, 22],
+            # the longest two tie, the earlier one counts; duplicate rows
+            2: [0, 1, 4, 5, 5, 9],
+            3: [7],
+            # a later streak longer than the first
+            4: [0, 2, 3, 4, 30, 31, 32, 33, 34, 40],
+        }
+        user_ids = [user_id for user_id, offsets in days.items() for _ in offsets]
+        ordinals = [start.toordinal() + offset for offsets in days.values() for offset in offsets]
+        stats = analytics.compute_stats(*analytics.sort_activity(
+            np.array(user_ids[::-1], dtype=np.int64),
+            np.array(ordinals[::-1], dtype=np.int64)))
+
+        for user_id, offsets in days.items():
+            dates = sorted({start + timedelta(days=offset) for offset in offsets})
+            expected = summarize_streaks(dates)
+            self.assertEqual({key: stats[user_id][key] for key in expected}, expected, user_id)
+            self.assertEqual(stats[user_id]["entry_count"], len(dates))
+            self.assertEqual(stats[user_id]["longest_gap"], max(
+                ((later - earlier).days - 1 for earlier, later in zip(dates, dates[1:])), default=0))
+
+
+@TEST_SETTINGS
+class ActivityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("active", "active@example.com", "password")
+        self.client.force_login(self.user)
+
+    def entry(self, day):
+        return JournalEntry.objects.create(user=self.user, content=f"<p>{day}</p>", date=day)
+
+    def bitmaps(self):
+        return {row.year: row.bits for row in ActivityYear.objects.filter(user=self.user)}
+
+    def test_day_index_and_bytes(self):
+        self.assertEqual([activity.day_index(day) for day in
+                          (date(2024, 1, 1), date(2024, 2, 29), date(2024, 3, 1), date(2024, 12, 31))],
+                         [0, 59, 60, 365])
+        self.assertEqual(activity.day_index(date(2023, 12, 31)), 364)
+        last_bit = 1 << activity.day_index(date(2024, 12, 31))
+        raw = activity.to_bytes(last_bit | 1)
+        self.assertEqual(len(raw), activity.BITMAP_BYTES)
+        self.assertEqual(activity.from_bytes(raw), last_bit | 1)
+        self.assertEqual(activity.from_bytes(None), 0)
+
+    def test_leap_day_and_new_year(self):
+        for day in (date(2024, 2, 28), date(2024, 2, 29), date(2024, 3, 1), date(2024, 12, 31), date(2025, 1, 1)):
+            self.entry(day)
+        self.assertEqual(self.bitmaps(), {2024: 0b111 << 58 | 1 << 365, 2025: 1})
+
+        year = self.client.get("/api/activity/2024/").json()
+        self.assertEqual((year["days"], year["total"], year["months"][1], year["longest_streak"]), (366, 4, 2, 3))
+        self.assertEqual(year["longest_streak_start"], "2024-02-28")
+        overview = activity.summarize_years(self.bitmaps(), 2024, 2025, today=date(2025, 1, 2))
+        # Dec 31st and Jan 1st are one streak across the years
+        self.assertEqual((overview["longest_streak"], overview["current_streak"]), (3, 2))
+
+    def test_deleting_an_entry_clears_its_bit(self):
+        kept, deleted = self.entry(date(2023, 6, 1)), self.entry(date(2023, 6, 2))
+        deleted.delete()
+        self.assertEqual(self.bitmaps(), {2023: 1 << activity.day_index(kept.date)})
+        kept.delete()
+        self.assertEqual(self.bitmaps(), {})
+
+    def test_moving_an_entry_between_years(self):
+        moved = self.entry(date(2023, 12, 31))
+        self.entry(date(2024, 1, 2))
+        moved.date = date(2024, 1, 1)
+        moved.save()
+        self.assertEqual(self.bitmaps(), {2024: 0b11})
+        moved.date = date(2022, 12, 31)
+        moved.save()
+        self.assertEqual(self.bitmaps(), {2022: 1 << 364, 2024: 0b10})
+
+
+@override_settings(ENTRY_CONTENT_COMPRESSION="zlib", ENTRY_CONTENT_COMPRESS_MIN_BYTES=100)
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("compressed", "compressed@example.com", "password")
+        self.long = "<p>" + "dear diary, " * 50 + "</p>"
+
+    def stored(self, entry):
+        return JournalEntry.objects.values_list("content", flat=True).get(pk=entry.pk)
+
+    def test_round_trip(self):
+        entry = JournalEntry.objects.create(user=self.user, content=self.long, date=date(2024, 1, 1))
+        self.assertTrue(self.stored(entry).startswith(compression.MARKER + "zlib:"))
+        self.assertEqual(compression.decompress_text(self.stored(entry)), self.long)
+        self.assertEqual(JournalEntry.objects.get(pk=entry.pk).content, self.long)
+
+        entry.content = self.long.upper()
+        JournalEntry.objects.bulk_update([entry], ["content"])
+        self.assertEqual(JournalEntry.objects.get(pk=entry.pk).content, self.long.upper())
+        # saving a loaded entry without reading content keeps the payload
+        payload = self.stored(entry)
+        JournalEntry.objects.get(pk=entry.pk).save()
+        self.assertEqual(self.stored(entry), payload)
+
+    def test_short_content_is_stored_plain(self):
+        below = JournalEntry.objects.create(user=self.user, content="x" * 99, date=date(2024, 1, 1))
+        self.assertEqual(self.stored(below), "x" * 99)
+        # at the threshold it is compressed, unless that doesn't make it shorter
+        self.assertTrue(compression.compress_text("x" * 100).startswith(compression.MARKER))
+        incompressible = "".join(chr(0x4e00 + (i * 7919) % 20000) for i in range(40))
+        self.assertEqual(compression.compress_text(incompressible), incompressible)
+        # plain content that looks like a payload is always compressed
+        marked = JournalEntry.objects.create(user=self.user, content=compression.MARKER + "x", date=date(2024, 1, 2))
+        self.assertNotEqual(self.stored(marked), compression.MARKER + "x")
+        self.assertEqual(JournalEntry.objects.get(pk=marked.pk).content, compression.MARKER + "x")
+
+    @override_settings(ENTRY_CONTENT_COMPRESSION="zstd")
+    def test_zstd_falls_back_to_zlib_without_zstandard(self):
+        with mock.patch.object(compression, "zstandard", None):
+            entry = JournalEntry.objects.create(user=self.user, content=self.long, date=date(2024, 1, 1))
+            self.assertTrue(self.stored(entry).startswith(compression.MARKER + "zlib:"))
+            self.assertEqual(JournalEntry.objects.get(pk=entry.pk).content, self.long)
+            with self.assertRaises(ImproperlyConfigured):
+                compression.decompress_text(compression.MARKER + "zstd:AAAA")
+
+    def test_rows_of_another_method_are_read_and_recompressed(self):
+        entries = [JournalEntry.objects.create(user=self.user, content=self.long, date=date(2024, 1, day))
+                   for day in (1, 2)]
+        with override_settings(ENTRY_CONTENT_COMPRESSION=""):
+            plain = JournalEntry.objects.create(user=self.user, content=self.long, date=date(2024, 1, 3))
+        self.assertEqual(self.stored(plain), self.long)
+        self.assertEqual([entry.content for entry in JournalEntry.objects.order_by("date")], [self.long] * 3)
+        with override_settings(ENTRY_CONTENT_COMPRESSION="zstd"):
+            self.assertEqual(JournalEntry.objects.get(pk=entries[0].pk).content, self.long)
+
+        self.assertEqual(compression.recompress(JournalEntry.objects.filter(pk=plain.pk)), 1)
+        self.assertTrue(self.stored(plain).startswith(compression.MARKER))
+        with override_settings(ENTRY_CONTENT_COMPRESSION=""):
+            self.assertEqual(compression.recompress(JournalEntry.objects.all()), 3)
+        self.assertEqual(list(JournalEntry.objects.values_list("content", flat=True)), [self.long] * 3)
+        self.assertEqual(compression.recompress(JournalEntry.objects.filter(pk=entries[0].pk)), 1)
+
+
+@TEST_SETTINGS
+class CalendarCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("calendar", "calendar@example.com", "password")
+        self.day = date(2024, 1, 15)
+
+    def test_evicted_version_does_not_bring_back_old_values(self):
+        entry = JournalEntry.objects.create(user=self.user, content="<p>x</p>", date=self.day)
+        stale, _, _ = calendar_cache.get_calendar(self.user.id, 2024, 1, self.day)
+        calendar_cache.invalidate_user(self.user.id)
+        entry.delete()
+        cache.delete(calendar_cache._version_key(self.user.id))  # evicted
+        month_data, _, _ = calendar_cache.get_calendar(self.user.id, 2024, 1, self.day)
+        self.assertEqual((stale["entries_this_month"], month_data["entries_this_month"]), (1, 0))
+
+    def test_reads_before_the_commit_are_invalidated_again(self):
+        calendar_cache.get_calendar(self.user.id, 2024, 1, self.day)
+        with self.captureOnCommitCallbacks(execute=True):
+            JournalEntry.objects.create(user=self.user, content="<p>x</p>", date=self.day)
+            # a concurrent request caching the month before the commit
+            cache.set(calendar_cache._month_key(calendar_cache._prefix(self.user.id), 2024, 1),
+                      calendar_cache.build_month(self.user.id, 2024, 2), calendar_cache.CACHE_TIMEOUT)
+        month_data, today_entry, _ = calendar_cache.get_calendar(self.user.id, 2024, 1, self.day)
+        self.assertEqual(month_data["entries_this_month"], 1)
+        self.assertIsNotNone(today_entry)
+
+    def process(self, backend):
+        # another worker: same database, its own LocMemCache
+        patches = [mock.patch(f"journal.{module}.cache", backend) for module in ("auth", "calendar_cache", "utils")]
+        stack = ExitStack()
+        for patch in patches:
+            stack.enter_context(patch)
+        return stack
+
+    def other_process_read(self):
+        web, writer = LocMemCache("web", {}), LocMemCache("writer", {})
+        with self.process(web):
+            calendar_cache.get_calendar(self.user.id, 2024, 1, self.day)
+        with self.process(writer), self.captureOnCommitCallbacks(execute=True):
+            JournalEntry.objects.create(user=self.user, content="<p>x</p>", date=self.day)
+        with self.process(web):
+            return calendar_cache.get_calendar(self.user.id, 2024, 1, self.day)[0]["entries_this_month"]
+
+    def test_per_process_caches_go_stale(self):
+        self.assertEqual(self.other_process_read(), 0)
+
+    @override_settings(CALENDAR_CACHE=False)
+    def test_without_the_cache_other_processes_read_the_write(self):
+        self.assertEqual(self.other_process_read(), 1)
+
+    @override_settings(JOB_QUEUE_EAGER=False, SHARED_CACHE=False)
+    def test_profiles_saved_by_the_worker_are_not_cached(self):
+        web, worker = LocMemCache("web", {}), LocMemCache("worker", {})
+        backend = auth.CachedModelBackend()
+        with self.process(web):
+            calendar_cache.get_calendar(self.user.id, 2024, 1, self.day)
+            backend.get_user(self.user.id)
+        with self.process(worker):
+            UserProfile.objects.filter(user=self.user).update(entry_count=0)
+            profile = UserProfile.objects.get(user=self.user)
+            profile.entry_count = 7
+            profile.save()
+        with self.process(web):
+            self.assertEqual(calendar_cache.get_calendar(self.user.id, 2024, 1, self.day)[2].entry_count, 7)
+            self.assertEqual(backend.get_user(self.user.id).profile.entry_count, 7)
+
+
+@TEST_SETTINGS
+class CachedUserTests(TestCase):
+    def test_evicted_version_does_not_bring_back_old_users(self):
+        cache.clear()
+        user = User.objects.create_user("cached", "cached@example.com", "password")
+        backend = auth.CachedModelBackend()
+        self.assertEqual(backend.get_user(user.id).email, "cached@example.com")
+        User.objects.filter(pk=user.id).update(email="new@example.com")
+        cache.delete(auth._version_key(user.id))  # evicted
+        self.assertEqual(backend.get_user(user.id).email, "new@example.com")
+
+
+class TagResolutionTests(TestCase):
+    def setUp(self):
+        self.work = Tag.objects.create(name="work")
+
+    def test_existing_and_new_tags(self):
+        tags = resolve_tags("work, travel,  Travel ,, work")
+        self.assertEqual([tag.name for tag in tags], ["work", "travel"])
+        self.assertEqual(tags[0], self.work)
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(resolve_tags(["travel"]), tags[1:])
+
+    def test_case_variants_use_the_existing_tag(self):
+        self.assertEqual(resolve_tags(["Work", "WORK"]), [self.work])
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_tag_created_concurrently_under_another_spelling(self):
+        def concurrent_writer(objs, **kwargs):
+            # another request inserted "Health" first, ours hit the unique index
+            Tag.objects.create(name="Health")
+
+        with mock.patch.object(Tag.objects, "bulk_create", side_effect=concurrent_writer):
+            tags = resolve_tags(["health"])
+        self.assertEqual([tag.name for tag in tags], ["Health"])
+
+    def test_bulk_spellings_across_entries(self):
+        user = User.objects.create_user("bulk", "bulk@example.com", "password")
+        first, second = (JournalEntry.objects.create(user=user, content="<p>x</p>", date=date(2024, 1, day))
+                         for day in (1, 2))
+        set_tags_bulk({first.id: ["Work", "Reading"], second.id: ["reading", "WORK"]})
+        self.assertEqual(sorted(first.tags.values_list("name", flat=True)), ["Reading", "work"])
+        self.assertEqual(sorted(second.tags.values_list("name", flat=True)), ["Reading", "work"])
+        self.assertEqual(Tag.objects.count(), 2)
+
+
+@TEST_SETTINGS
+class TagUsageJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("tagger", "tagger@example.com", "password")
+        self.entry = JournalEntry.objects.create(user=self.user, content="<p>x</p>", date=date(2024, 1, 1))
+        set_entry_tags(self.entry, ["kept", "dropped"])
+
+    def usage(self):
+        return dict(TagUsage.objects.filter(user=self.user).values_list("key", "entry_count"))
+
+    def test_tag_edits_recount_only_the_changed_tags(self):
+        with mock.patch.object(TagUsage, "refresh", wraps=TagUsage.refresh) as refresh:
+            set_entry_tags(self.entry, ["kept", "added"])
+        changed = {tag.pk for tag in Tag.objects.filter(name__in=["added", "dropped"])}
+        self.assertTrue(refresh.call_args_list)
+        for call in refresh.call_args_list:
+            # never None, which recounts every tag of the user
+            self.assertLessEqual(set(call.args[1]), changed)
+        self.assertEqual(self.usage(), {"kept": 1, "added": 1})
+
+    def api_counts(self, query=""):
+        data = self.client.get(f"/api/tags/{query}").json()
+        return [(tag["name"], tag["count"]) for tag in data["tags"]]
+
+    def test_the_api_counts_follow_edits_and_deletes(self):
+        other = JournalEntry.objects.create(user=self.user, content="<p>y</p>", date=date(2024, 1, 2))
+        set_entry_tags(other, ["kept"])
+        self.client.force_login(self.user)
+        self.assertEqual(self.api_counts(), [("kept", 2), ("dropped", 1)])
+
+        response = self.client.put(f"/api/entry/{self.entry.id}/", json.dumps({"tags": ["kept", "Added"]}),
+                                   content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        # most used first, then by name; unused tags leave the list
+        self.assertEqual(self.api_counts(), [("kept", 2), ("Added", 1)])
+        self.assertEqual(self.api_counts("?q=ad"), [("Added", 1)])
+
+        self.assertEqual(self.client.delete(f"/api/entry/{other.id}/").status_code, 200)
+        self.assertEqual(self.api_counts(), [("Added", 1), ("kept", 1)])
+
+    @override_settings(JOB_QUEUE_EAGER=False)
+    def test_queued_tag_jobs_carry_the_tags(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            set_entry_tags(self.entry, ["kept", "added"])
+        tag_jobs = DerivedJob.objects.filter(user=self.user, kind=DerivedJob.TAGS)
+        self.assertEqual(set(tag_jobs.values_list("tag_id", flat=True)),
+                         {tag.pk for tag in Tag.objects.filter(name__in=["added", "dropped"])})
+        for job_ids in jobs.due_batches(100):
+            jobs.run_batch(job_ids)
+        self.assertEqual(self.usage(), {"kept": 1, "added": 1})
+
+
+@TEST_SETTINGS
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("searcher", "searcher@example.com", "password")
+        self.other = User.objects.create_user("other", "other@example.com", "password")
+
+    def entry(self, user, day, content, title=""):
+        return JournalEntry.objects.create(user=user, title=title, content=content, date=day)
+
+    def test_results_are_the_users_own(self):
+        mine = self.entry(self.user, date(2024, 1, 1), "<p>a zebra at the zoo</p>")
+        for offset in range(5):
+            self.entry(self.other, date(2024, 1, 1) + timedelta(days=offset), "<p>zebra zebra</p>")
+        self.assertEqual([result["id"] for result in search.search(self.user, "zebra")], [mine.id])
+
+    def test_accents_and_case_are_one_term(self):
+        mine = self.entry(self.user, date(2024, 1, 1), "<p>Café and cafe</p>", title="CAFÉ")
+        self.assertEqual(search.tokenize("Café CAFE café"), ["cafe", "cafe", "cafe"])
+        self.assertEqual([result["id"] for result in search.search(self.user, "cafe")], [mine.id])
+        with mock.patch("journal.search.uses_fts", return_value=False):
+            search.index_entry(mine)
+            self.assertEqual(list(SearchPosting.objects.filter(document__entry=mine, term="cafe")
+                                  .values_list("frequency", flat=True)), [2 + search.TITLE_WEIGHT])
+            self.assertEqual([result["id"] for result in search.search(self.user, "Cafe")], [mine.id])
+
+
+    def python_bm25(self, terms):
+        # the ranking the database computes, over every posting
+        documents = SearchDocument.objects.filter(user=self.user)
+        avg_length = sum(documents.values_list("length", flat=True)) / documents.count()
+        postings = list(SearchPosting.objects.filter(user=self.user, term__in=terms).values_list(
+            "document__entry_id", "term", "frequency", "document__length"))
+        df = Counter(term for _, term, _, _ in postings)
+        scores = Counter()
+        for entry_id, term, frequency, length in postings:
+            idf = math.log(1 + (documents.count() - df[term] + 0.5) / (df[term] + 0.5))
+            norm = search.BM25_K1 * (1 - search.BM25_B + search.BM25_B * length / avg_length)
+            scores[entry_id] += idf * frequency * (search.BM25_K1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    @mock.patch("journal.search.uses_fts", return_value=False)
+    def test_portable_index_ranks_in_the_database(self, uses_fts):
+        texts = ["otter river otter", "river bank", "an otter", "nothing here", "river river river otter",
+                 "long entry about a river and many other words that make it longer"]
+        for day, text in enumerate(texts, start=1):
+            self.entry(self.user, date(2024, 1, day), f"<p>{text}</p>", title="Otter" if day == 2 else "")
+        self.entry(self.other, date(2024, 1, 1), "<p>otter otter otter</p>")
+
+        expected = self.python_bm25(["otter", "river"])
+        with CaptureQueriesContext(connection) as queries:
+            ranked = search._search_postings(self.user, ["otter", "river"], 3)
+        # document frequencies, corpus statistics, ranked entries
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len(ranked), 3)
+        self.assertEqual([entry_id for entry_id, _ in ranked], [entry_id for entry_id, _ in expected[:3]])
+        for (_, score), (_, expected_score) in zip(ranked, expected):
+            self.assertAlmostEqual(score, expected_score)
+        self.assertEqual(search._search_postings(self.user, ["zebra"], 3), [])
+
+@TEST_SETTINGS
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("syncer", "syncer@example.com", "password")
+        self.client.force_login(self.user)
+
+    def entry(self, day):
+        return JournalEntry.objects.create(user=self.user, content=f"<p>{day}</p>", date=day)
+
+    def sync(self, token=None, limit=2):
+        """
+        Follows `has_more` like a client: the entry ids sent, the deleted ids
+        and the final token.
+        """
+        sent, deleted = set(), set()
+        for _ in range(100):
+            since = f"&since={token}" if token else ""
+            response = self.client.get(f"/api/sync/?limit={limit}{since}")
+            self.assertEqual(response.status_code, 200, response.content)
+            body = response.json()
+            sent |= {entry["id"] for entry in body["entries"]}
+            deleted |= {entry["id"] for entry in body["deleted"]}
+            token = body["next"]
+            if not body["has_more"]:
+                return sent, deleted, token
+        self.fail("sync never caught up")
+
+    def test_late_commits_are_picked_up(self):
+        entries = [self.entry(date(2024, 1, day)) for day in range(1, 6)]
+        sent, _, token = self.sync()
+        self.assertEqual(sent, {entry.id for entry in entries})
+        since = decode_sync_token(token)[0]
+
+        # written before the token was handed out, committed after it
+        late = self.entry(date(2024, 2, 1))
+        JournalEntry.objects.filter(pk=late.pk).update(updated_at=since - timedelta(seconds=1))
+        gone = entries[0].id
+        entries[0].delete()
+        EntryTombstone.objects.filter(entry_id=gone).update(deleted_at=since - timedelta(seconds=1))
+
+        sent, deleted, _ = self.sync(token)
+        self.assertIn(late.id, sent)
+        self.assertEqual(deleted, {gone})
+
+    def test_overlap_larger_than_a_page_still_catches_up(self):
+        entries = [self.entry(date(2024, 1, day)) for day in range(1, 8)]
+        _, _, token = self.sync()
+        sent, _, again = self.sync(token)
+        self.assertEqual(sent, {entry.id for entry in entries})
+        self.assertEqual(decode_sync_token(again), decode_sync_token(token))
+
+    def test_old_tokens_need_a_full_sync(self):
+        entry = self.entry(date(2024, 1, 1))
+        _, _, token = self.sync()
+        EntryTombstone.objects.create(user=self.user, entry_id=entry.id + 1, date=date(2024, 1, 2),
+                                      deleted_at=datetime.now() - timedelta(days=91))
+        recent = EntryTombstone.objects.create(user=self.user, entry_id=entry.id + 2, date=date(2024, 1, 3))
+
+        with override_settings(SYNC_TOMBSTONE_RETENTION_DAYS=90):
+            out = StringIO()
+            call_command("prune_tombstones", stdout=out)
+            self.assertIn("Deleted 1 tombstones", out.getvalue())
+            self.assertEqual(list(EntryTombstone.objects.all()), [recent])
+
+            with mock.patch("journal.sync.timezone.now", return_value=datetime.now() + timedelta(days=91)):
+                response = self.client.get(f"/api/sync/?since={token}")
+            self.assertEqual(response.status_code, 410)
+            with self.assertRaises(sync.TokenExpired):
+                sync.changes_since(self.user, sync.encode_sync_token(datetime.now() - timedelta(days=91)))
+            # the pages of a full sync start long ago and stay valid
+            old_page = sync.encode_sync_token(datetime(2000, 1, 1), 0, page=True)
+            self.assertEqual(sync.changes_since(self.user, old_page)["entries"][0]["id"], entry.id)
@@ -41,5 +41,17 @@ urlpatterns = [
     
     # API endpoints
     path("api/entries/", views.entries, name="entries"),
+    path("api/entries/batch/", views.batch_entries, name="batch_entries"),
     path("api/entry/<int:entry_id>/", views.entry, name="entry"),
+    path("api/sync/", views.sync_entries, name="sync_entries"),
+    path("api/search/", views.search, name="search"),
+    path("api/tags/", views.tags, name="tags"),
+    path("api/activity/", views.activity_overview, name="activity_overview"),
+    path("api/activity/<int:year>/", views.activity_year, name="activity_year"),
+    path("api/calendar/<int:year>/<int:month>/", views.calendar_data, name="calendar_data"),
+    path("api/export/<str:fmt>/", views.export_entries, name="export_entries"),
+    path("api/import/", views.import_entries, name="import_entries"),
+
+    # Instrumentation
+    path("metrics/", views.metrics, name="metrics"),
 ]
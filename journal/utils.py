@@ -1,4 +1,18 @@
-from datetime import datetime, timedelta
+import binascii
+import calendar
+import re
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime, timedelta
+from html import unescape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.html import strip_tags
+
+EXCERPT_WORDS = 50
+BLOCK_TAG_RE = re.compile(r"</?(?:p|div|br|hr|li|ul|ol|h[1-6]|blockquote|pre|tr|td|th|table)\b[^>]*>", re.I)
 
 
 def calculate_longest_streak(entries):
@@ -6,29 +20,171 @@ def calculate_longest_streak(entries):
     if not entries:
         return 0
 
-    # initial values
-    longest_streak = 1
-    current_streak = 1
-    prev_entry_date = datetime.strptime(
-        f"{entries[0].date}", "%Y-%m-%d").date()
+    return summarize_streaks(sorted({entry.date for entry in entries}))["longest_streak"]
+
+
+def summarize_streaks(dates):
+    """
+    Streak summary for a sorted (ascending), de-duplicated list of dates.
 
-    # iterate over entries starting from 2nd entry
-    for entry in entries[1:]:
-        curr_entry_date = datetime.strptime(f"{entry.date}", "%Y-%m-%d").date()
+    The "latest" streak is the run ending at the most recent date; whether it
+    is still current depends on today and is left to the caller.
+    """
+    summary = {
+        "longest_streak": 0,
+        "longest_streak_start": None,
+        "longest_streak_end": None,
+        "latest_streak": 0,
+        "latest_streak_start": None,
+        "last_date": None,
+    }
+    if not dates:
+        return summary
 
-        # calculate difference btw current and previous entry dates
-        date_difference_btw_entries = curr_entry_date - prev_entry_date
+    run_start = prev_date = dates[0]
+    run_length = 1
+    longest = (1, run_start, run_start)
 
-        # if prev date, curr date are consecutive days
-        # timedelta(days=1) represents one day
-        if date_difference_btw_entries == timedelta(days=1):
-            current_streak += 1
+    for curr_date in dates[1:]:
+        # consecutive days extend the run, anything else starts a new one
+        if curr_date - prev_date == timedelta(days=1):
+            run_length += 1
         else:
-            current_streak = 1
+            run_start = curr_date
+            run_length = 1
+
+        if run_length > longest[0]:
+            longest = (run_length, run_start, curr_date)
+
+        prev_date = curr_date
+
+    summary.update({
+        "longest_streak": longest[0],
+        "longest_streak_start": longest[1],
+        "longest_streak_end": longest[2],
+        "latest_streak": run_length,
+        "latest_streak_start": run_start,
+        "last_date": prev_date,
+    })
+    return summary
+
+
+def encode_cursor(entry_date, entry_id):
+    # opaque keyset cursor pointing just past (date, id)
+    raw = f"{entry_date.isoformat()}:{entry_id}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    # returns (date, id), raises ValueError on malformed cursors
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = urlsafe_b64decode(padded.encode()).decode()
+        date_str, id_str = raw.split(":")
+        return date.fromisoformat(date_str), int(id_str)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as error:
+        raise ValueError("Invalid cursor.") from error
+
+
+def encode_sync_token(timestamp, entry_id=0, page=False):
+    # opaque delta-sync position: changes after (timestamp, id) are new.
+    # `page` marks the next page of one sync, which continues exactly where
+    # the last one stopped instead of re-scanning for late commits
+    raw = f"{timestamp.isoformat()}|{entry_id}{'|p' if page else ''}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_token(token):
+    # returns (datetime, id, page), raises ValueError on malformed tokens
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = urlsafe_b64decode(padded.encode()).decode()
+        timestamp_str, id_str, *flags = raw.split("|")
+        if flags not in ([], ["p"]):
+            raise ValueError("Invalid sync token.")
+        return datetime.fromisoformat(timestamp_str), int(id_str), bool(flags)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as error:
+        raise ValueError("Invalid sync token.") from error
+
+
+def api_timestamp(value):
+    # the API's "2024-01-31T08:00:00.000Z"; isoformat is ~3x faster than
+    # strftime, the slice drops a UTC offset
+    return value.isoformat(timespec="seconds")[:19] + ".000Z"
+
+
+def month_bounds(year, month):
+    # first and last day of a month, for indexed date__range lookups
+    first_day = date(year, month, 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    return first_day, last_day
+
+
+def html_to_text(html):
+    # strip TinyMCE markup and entities, collapse whitespace; block tags
+    # become spaces so "</p><p>" doesn't glue words together
+    return " ".join(unescape(strip_tags(BLOCK_TAG_RE.sub(" ", html or ""))).split())
+
+
+def make_excerpt(text, words=EXCERPT_WORDS):
+    # first `words` words of plain text, "…" when cut
+    parts = text.split(maxsplit=words)
+    if len(parts) > words:
+        return " ".join(parts[:words]) + " …"
+    return " ".join(parts)
+
+
+def text_fields(html):
+    """
+    The derived text fields stored on JournalEntry for some HTML content.
+    """
+    plain_text = html_to_text(html)
+    return {
+        "plain_text": plain_text,
+        "excerpt": make_excerpt(plain_text),
+        "word_count": len(plain_text.split()),
+    }
+
+
+def cache_version(key):
+    """
+    The version stored under `key`, for namespacing cached values. A missing
+    version (never set, or evicted) starts at the current time in ns rather
+    than 1, so values cached under an earlier version are never read again.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+async def acache_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def bump_cache_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # no version, so nothing under it is cached
+        pass
+
 
-        if current_streak > longest_streak:
-            longest_streak = current_streak
+def cache_profiles():
+    # the run_jobs worker rewrites profiles, and its invalidation only
+    # reaches web processes that share its cache
+    return settings.JOB_QUEUE_EAGER or settings.SHARED_CACHE
 
-        prev_entry_date = curr_entry_date
 
-    return longest_streak
+def now_and_on_commit(function):
+    # cache invalidation inside a transaction: a read between now and the
+    # commit can cache the old rows again, so invalidate once more after it
+    function()
+    transaction.on_commit(function)
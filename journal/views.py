@@ -1,27 +1,44 @@
+import calendar
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm, UserCreationForm
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
-from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, logout, authenticate
-from django.contrib.auth.decorators import login_required
-from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, PasswordChangeForm
-from django.contrib import messages
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods, require_GET
-from django.db.models import Count
-from datetime import datetime, timedelta, date
-import calendar
-from .models import User, JournalEntry, Tag, UserProfile
-from django.views.decorators.csrf import csrf_exempt
-from .models import User, JournalEntry, Tag
-from .forms import EntryForm, ChangePasswordCustomForm
-from .utils import calculate_longest_streak
-from django.utils import timezone
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-import calendar
-
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+
+from . import activity, archive, batch, calendar_cache, conditional, serializers, sync
+from . import search as search_index
+from .decorators import async_login_required, async_require_GET, async_require_http_methods
+from .forms import ChangePasswordCustomForm, EntryForm
+from .instrumentation import query_budget, registry as metrics_registry
+from .models import ActivityYear, JournalEntry, MonthlyEntryCount, Tag, TagUsage, User, UserProfile
+from .tags import set_entry_tags, tag_list_prefetch
+from .utils import decode_cursor, encode_cursor, month_bounds
+
+# API pagination
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+STREAM_CHUNK_SIZE = 500
+MAX_OVERVIEW_YEARS = 100
+
+@query_budget(6)
 @login_required(login_url="login")
 def index(request):
     """
@@ -40,10 +57,6 @@ def index(request):
         year = current_date.year
         month = current_date.month
     
-    # Get first and last day of the month
-    first_day = current_date.replace(day=1)
-    last_day = (first_day + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-    
     # Calculate previous and next month for navigation
     if month == 1:
         prev_month = 12
@@ -59,49 +72,18 @@ def index(request):
         next_month = month + 1
         next_year = year
     
-    # Get all entries for the month for the current user
-    entries = JournalEntry.objects.filter(
-        user=request.user,
-        date__year=year,
-        date__month=month
-    ).select_related('user').prefetch_related('tags')
-    
-    # Create a dictionary of dates with entries for easy lookup
-    entries_dict = {entry.date: entry for entry in entries}
-    
-    # Generate calendar data
-    cal = calendar.monthcalendar(year, month)
-    weeks = []
+    # Month grid, today's entry and profile stats come from the per-user
+    # calendar cache; a warm render doesn't touch the database
+    month_data, today_entry, profile = calendar_cache.get_calendar(
+        request.user.id, year, month, today)
     
     # Day names for the calendar header
     day_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
     
-    for week in cal:
-        week_data = []
-        for day in week:
-            if day == 0:
-                # Day is not part of the current month
-                week_data.append({'day': None, 'entry': None, 'is_today': False})
-            else:
-                current_date = date(year, month, day)
-                is_today = current_date == today
-                entry = entries_dict.get(current_date)
-                week_data.append({
-                    'day': current_date,
-                    'entry': entry,
-                    'is_today': is_today
-                })
-        weeks.append(week_data)
-    
-    # Get today's entry if it exists
-    today_entry = JournalEntry.objects.filter(
-        user=request.user, 
-        date=today
-    ).first()
-    
-    # Get entry counts for stats
-    total_entries = JournalEntry.objects.filter(user=request.user).count()
-    entries_this_month = entries.count()
+    weeks = [
+        [dict(day, is_today=day['day'] == today) for day in week]
+        for week in month_data['weeks']
+    ]
     
     return render(request, "journal/index.html", {
         'today': today,
@@ -115,21 +97,11 @@ def index(request):
         'next_year': next_year,
         'weeks': weeks,
         'day_names': day_names,
-        'total_entries': total_entries,
-        'entries_this_month': entries_this_month,
+        'total_entries': profile.entry_count,
+        'entries_this_month': month_data['entries_this_month'],
+        'current_streak': profile.get_current_streak(today),
+        'longest_streak': profile.longest_streak,
     })
-    
-    context = {
-        'today': today,
-        'current_date': current_date,
-        'today_entry': today_entry,
-        'weeks': weeks,
-        'prev_month': prev_month,
-        'next_month': next_month,
-        'month_name': current_date.strftime('%B %Y'),
-    }
-    
-    return render(request, "journal/index.html", context)
 
 
 def login_view(request):
@@ -249,27 +221,24 @@ def create_entry(request, date_str=None):
         form = EntryForm(request.POST)
         if form.is_valid():
             try:
-                # Save the entry
-                entry = form.save(commit=False)
-                entry.user = request.user
-                entry.date = entry_date
-                entry.save()
-                
-                # Handle tags
-                tag_names = form.cleaned_data.get("tags", "")
-                if tag_names:
-                    tag_list = [tag.strip() for tag in tag_names.split(',') if tag.strip()]
-                    for tag_name in tag_list:
-                        tag, created = Tag.objects.get_or_create(name=tag_name)
-                        entry.tags.add(tag)
-                
-                # Update user's streak
-                if hasattr(request.user, 'profile'):
-                    request.user.profile.update_streak()
+                with transaction.atomic():
+                    # Save the entry
+                    entry = form.save(commit=False)
+                    entry.user = request.user
+                    entry.date = entry_date
+                    entry.save()
+                    
+                    # Handle tags
+                    set_entry_tags(entry, form.cleaned_data.get("tags", []))
                 
                 messages.success(request, "Entry saved successfully!")
                 return redirect('index')
                 
+            except IntegrityError:
+                # another request created this day's entry after the check above
+                existing_entry = JournalEntry.objects.get(user=request.user, date=entry_date)
+                messages.warning(request, f"An entry already exists for {entry_date}. Redirecting to edit page.")
+                return redirect('update_entry', entry_id=existing_entry.id)
             except Exception as e:
                 messages.error(request, f"An error occurred while saving your entry: {str(e)}")
         else:
@@ -297,22 +266,22 @@ def update_entry(request, entry_id):
         form = EntryForm(request.POST, instance=entry)
         if form.is_valid():
             try:
-                # Save the entry
-                updated_entry = form.save(commit=False)
-                updated_entry.save()
-                
-                # Clear existing tags and add new ones
-                updated_entry.tags.clear()
-                tag_names = form.cleaned_data.get("tags", "")
-                if tag_names:
-                    tag_list = [tag.strip() for tag in tag_names.split(',') if tag.strip()]
-                    for tag_name in tag_list:
-                        tag, created = Tag.objects.get_or_create(name=tag_name)
-                        updated_entry.tags.add(tag)
+                with transaction.atomic():
+                    # Save the entry
+                    updated_entry = form.save(commit=False)
+                    updated_entry.save()
+                    
+                    # Replace tags, only changed ones are written
+                    set_entry_tags(updated_entry, form.cleaned_data.get("tags", []))
                 
                 messages.success(request, "Entry updated successfully!")
                 return redirect('entry_on', date=entry.date.strftime('%Y-%m-%d'))
                 
+            except IntegrityError:
+                # the new date already has an entry (one entry per day)
+                entry.date = entry._loaded_date
+                form.add_error('date', "An entry already exists for this date.")
+                messages.error(request, "Please correct the errors below.")
             except Exception as e:
                 messages.error(request, f"An error occurred while updating your entry: {str(e)}")
         else:
@@ -329,81 +298,38 @@ def update_entry(request, entry_id):
     })
 
 
-@login_required(login_url="login")
-def all_entries(request):
-    # Query for entries
-    try:
-        entries = JournalEntry.objects.filter(
-            user=request.user)
-
-        month_filter = request.GET.get("month")
-        year_filter = request.GET.get("year")
-        if month_filter and year_filter:
-            month_filter = int(month_filter)
-            year_filter = int(year_filter)
-            entries = JournalEntry.objects.filter(
-                user=request.user, date__month=month_filter, date__year=year_filter)
-        # 10 objects per page
-        paginator = Paginator(entries, 10)
-        page_number = request.GET.get("page")
-        page_obj = paginator.get_page(page_number)
-    except:
-        messages.error(request, "Could not retrieve data.")
-        return render(request, "journal/all_entries.html")
-
-    return render(request, "journal/all_entries.html", {
-        "page_entries": page_obj,
-    })
-
-
+@query_budget(7)
 @login_required(login_url="login")
 def profile(request):
     """
     View to display user profile with statistics and recent activity.
     """
     try:
-        # Get all entries for the current user
-        entries = JournalEntry.objects.filter(user=request.user).order_by("-date")
-        entry_count = entries.count()
-        
-        # Calculate streaks
-        longest_streak = calculate_longest_streak(entries)
-        current_streak = 0
-        streak_percentage = 0
-        
-        # Get current streak if there are entries
-        if entries.exists():
-            today = timezone.now().date()
-            last_entry_date = entries.first().date
-            
-            # If last entry was today or yesterday, check for current streak
-            if last_entry_date >= today - timedelta(days=1):
-                current_streak = 1
-                check_date = last_entry_date - timedelta(days=1)
-                
-                # Check previous days for consecutive entries
-                while True:
-                    if entries.filter(date=check_date).exists():
-                        current_streak += 1
-                        check_date -= timedelta(days=1)
-                    else:
-                        break
-                
-                # Calculate streak percentage (capped at 100%)
-                streak_percentage = min(100, (current_streak / 30) * 100)  # 30 days as target
-        
-        # Get recent entries (last 5)
-        recent_entries = entries.select_related('user').prefetch_related('tags')[:5]
-        
-        # Get entry counts for current month
+        # Streaks and counts are maintained on UserProfile, no per-day queries
+        try:
+            # loaded and cached with the user, see journal/auth.py
+            profile = request.user.profile
+        except UserProfile.DoesNotExist:
+            profile, _ = UserProfile.objects.get_or_create(user=request.user)
         today = timezone.now().date()
-        first_day_of_month = today.replace(day=1)
-        entries_this_month = entries.filter(date__month=today.month, date__year=today.year).count()
+
+        entry_count = profile.entry_count
+        longest_streak = profile.longest_streak
+        longest_streak_date = profile.longest_streak_end
+        current_streak = profile.get_current_streak(today)
+        # Calculate streak percentage (capped at 100%), 30 days as target
+        streak_percentage = min(100, (current_streak / 30) * 100)
+
+        # Get recent entries (last 5)
+        entries = JournalEntry.objects.filter(user=request.user).order_by("-date")
+        recent_entries = entries.light()[:5]
+
+        # Get entry counts for current month and today
+        monthly = MonthlyEntryCount.objects.filter(
+            user=request.user, year=today.year, month=today.month).first()
+        entries_this_month = monthly.count if monthly else 0
         entries_today = entries.filter(date=today).count()
         
-        # Get date when longest streak was achieved (simplified)
-        longest_streak_date = entries.order_by('-date').first().date if entries.exists() else None
-        
         context = {
             'entry_count': entry_count,
             'longest_streak': longest_streak,
@@ -434,43 +360,48 @@ def profile(request):
 # API
 
 
-@login_required(login_url="login")
-@login_required
-@require_http_methods(["GET", "PUT", "DELETE"])
-def entry(request, entry_id):
+# writes refresh derived data in the request unless JOB_QUEUE_EAGER is off
+@query_budget(5, methods=("GET", "HEAD"))
+@async_require_http_methods(["GET", "PUT", "DELETE"])
+@async_login_required(login_url="login")
+async def entry(request, entry_id):
     """
     API endpoint to get, update, or delete a specific journal entry.
+    GET takes ``?fields=title,tags,...`` to return only those fields.
     """
-    # Get the entry or return 404 if not found
-    entry = get_object_or_404(JournalEntry, id=entry_id, user=request.user)
-    
+    entries = JournalEntry.objects.filter(id=entry_id, user=request.user)
+    fields = None
     if request.method == "GET":
-        # Return entry data as JSON
-        return JsonResponse({
-            "id": entry.id,
-            "title": entry.title,
-            "content": entry.content,
-            "date": entry.date.isoformat(),
-            "created_at": entry.created_at.isoformat(),
-            "updated_at": entry.updated_at.isoformat(),
-            "tags": [tag.name for tag in entry.tags.all()]
-        })
-        
-    elif request.method == "PUT":
+        try:
+            fields = JournalEntry.parse_api_fields(request.GET.get("fields"))
+        except ValueError as error:
+            return JsonResponse({"error": str(error)}, status=400)
+
+    # Validators first: an unchanged entry is a 304 (GET) or, for writes
+    # with a stale If-Match, a 412, without loading it
+    validators = await conditional.aentry_validators(request.user.id, entry_id)
+    if validators is None:
+        raise Http404("No entry matches the given query.")
+    response = conditional.check_preconditions(request, *validators)
+    if response is not None:
+        return response
+
+    if request.method == "GET":
+        # Return entry data as JSON, in the same shape as the list API; only
+        # the columns asked for are read
+        rows = await serializers.arows(entries, fields)
+        if not rows:
+            raise Http404("No entry matches the given query.")
+        return conditional.set_validators(
+            serializers.PayloadResponse(serializers.payload(rows[0], fields)), *validators)
+
+    entry = await entries.prefetch_related(tag_list_prefetch()).aget()
+
+    if request.method == "PUT":
         # Update entry
         try:
             data = json.loads(request.body)
-            entry.title = data.get('title', entry.title)
-            entry.content = data.get('content', entry.content)
-            entry.save()
-            
-            # Update tags if provided
-            if 'tags' in data:
-                entry.tags.clear()
-                for tag_name in data['tags']:
-                    tag, _ = Tag.objects.get_or_create(name=tag_name.strip())
-                    entry.tags.add(tag)
-                    
+            await sync_to_async(_update_entry_from_json)(entry, data)
             return JsonResponse({"status": "success", "message": "Entry updated successfully"})
             
         except Exception as e:
@@ -479,14 +410,24 @@ def entry(request, entry_id):
     elif request.method == "DELETE":
         # Delete entry
         entry_date = entry.date
-        entry.delete()
+        await entry.adelete()
         return JsonResponse({
             "status": "success", 
             "message": "Entry deleted successfully",
             "redirect": reverse('entry_on', kwargs={'date': entry_date.strftime('%Y-%m-%d')})
         })
-    
-    return JsonResponse({"error": "Method not allowed"}, status=405)
+
+
+def _update_entry_from_json(entry, data):
+    # the save and the tag diff commit together
+    with transaction.atomic():
+        entry.title = data.get('title', entry.title)
+        entry.content = data.get('content', entry.content)
+        entry.save()
+        
+        # Update tags if provided
+        if 'tags' in data:
+            set_entry_tags(entry, data['tags'])
 
 
 @login_required(login_url="login")
@@ -502,15 +443,9 @@ def delete_entry(request, entry_id):
         # Store the date before deletion for redirect
         entry_date = entry.date
         
-        # Delete the entry
+        # Delete the entry (streaks are rebuilt by the post_delete signal)
         entry.delete()
         
-        # Update user's streak if needed
-        if entry_date == timezone.now().date():
-            # Only update streak if the deleted entry was for today
-            user_profile = request.user.userprofile
-            user_profile.update_streak()
-        
         messages.success(request, "Entry deleted successfully.")
         return redirect('entry_on', date=entry_date.strftime('%Y-%m-%d'))
         
@@ -519,11 +454,7 @@ def delete_entry(request, entry_id):
         return redirect('entry_on', date=entry.date.strftime('%Y-%m-%d'))
 
 
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q
-from datetime import datetime
-import calendar
-
+@query_budget(7)
 @login_required(login_url="login")
 def all_entries(request):
     """
@@ -534,27 +465,36 @@ def all_entries(request):
     year = request.GET.get('year')
     tag_id = request.GET.get('tag')
     
-    # Start with base queryset
-    entries = JournalEntry.objects.filter(user=request.user).order_by('-date')
+    # Start with base queryset, without the entry bodies; tags are fetched
+    # for the whole page at once
+    entries = JournalEntry.objects.filter(user=request.user).order_by('-date').light()
+    
+    # Get unique years and months for filter dropdowns
+    years = JournalEntry.objects.filter(user=request.user).dates('date', 'year', order='DESC')
+    years = [y.year for y in years]
     
-    # Apply filters
+    # Apply filters, as date ranges so the (user, date) index is used
     filter_applied = False
-    if month and month.isdigit() and 1 <= int(month) <= 12:
-        entries = entries.filter(date__month=int(month))
-        filter_applied = True
-    if year and year.isdigit():
-        entries = entries.filter(date__year=int(year))
-        filter_applied = True
+    month = int(month) if month and month.isdigit() and 1 <= int(month) <= 12 else None
+    year = int(year) if year and year.isdigit() and 1 <= int(year) <= 9999 else None
+    if year and month:
+        entries = entries.filter(date__range=month_bounds(year, month))
+    elif year:
+        entries = entries.filter(date__range=(date(year, 1, 1), date(year, 12, 31)))
+    elif month:
+        # the same month in every year that has entries
+        month_ranges = Q()
+        for entry_year in years:
+            month_ranges |= Q(date__range=month_bounds(entry_year, month))
+        entries = entries.filter(month_ranges) if years else entries.none()
+    filter_applied = bool(year or month)
     if tag_id and tag_id.isdigit():
         entries = entries.filter(tags__id=tag_id)
         filter_applied = True
     
-    # Get unique years and months for filter dropdowns
-    years = JournalEntry.objects.filter(user=request.user).dates('date', 'year', order='DESC')
-    years = [y.year for y in years]
-    
-    # Get all unique tags for the user
-    all_tags = Tag.objects.filter(tag_entries__user=request.user).distinct()
+    # the user's tags with their counts, from the maintained usage table
+    all_tags = TagUsage.objects.filter(user=request.user).order_by("key").values(
+        "tag_id", "entry_count", name=F("tag__name"))
     
     # Pagination
     paginator = Paginator(entries, 10)  # Show 10 entries per page
@@ -580,48 +520,350 @@ def all_entries(request):
         'all_tags': all_tags,
         'filter_applied': filter_applied,
         'today': today,
-        'current_month': int(month) if month and month.isdigit() and 1 <= int(month) <= 12 else None,
-        'current_year': int(year) if year and year.isdigit() else None,
+        'current_month': month,
+        'current_year': year,
         'current_tag': int(tag_id) if tag_id and tag_id.isdigit() else None,
     })
+@query_budget(5)
+@async_require_GET
+@async_login_required(login_url="login")
+async def entries(request):
+    """
+    API endpoint listing the user's entries, newest first.
+
+    - ``?limit=N[&cursor=...]`` returns one page and a ``next`` cursor
+      (keyset pagination on date/id, so deep pages stay cheap).
+    - ``?format=ndjson`` streams every entry, one JSON object per line.
+    - Without either, the whole list is returned as a JSON array.
+    - ``?fields=id,date,title`` returns only those fields of each entry
+      and leaves the other columns, and the tags, unread.
+    """
+    try:
+        fields = JournalEntry.parse_api_fields(request.GET.get("fields"))
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    etag = await conditional.ajournal_etag(request.user.id)
+    response = conditional.check_preconditions(request, etag)
+    if response is not None:
+        return response
+
+    # Query for entries as rows, tags are fetched in bulk per chunk/page
+    entries = JournalEntry.objects.filter(user=request.user).order_by("-date", "-id")
+
+    if request.GET.get("format") == "ndjson":
+        # each server interface needs its own kind of iterator, Django 4.2
+        # would buffer the whole stream to convert between them
+        stream = (_astream_ndjson(entries, fields) if isinstance(request, ASGIRequest)
+                  else _stream_ndjson(entries, fields))
+        response = StreamingHttpResponse(stream, content_type="application/x-ndjson")
+        response["Cache-Control"] = "no-store"
+        return response
+
+    if "limit" not in request.GET and "cursor" not in request.GET:
+        return conditional.set_validators(serializers.PayloadResponse(
+            serializers.payloads(await serializers.arows(entries, fields), fields)), etag)
+
+    try:
+        limit = int(request.GET.get("limit", API_PAGE_SIZE))
+        cursor = request.GET.get("cursor")
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor)
+            entries = entries.filter(
+                Q(date__lt=cursor_date) | Q(date=cursor_date, id__lt=cursor_id))
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit or cursor."}, status=400)
+    limit = max(1, min(limit, API_MAX_PAGE_SIZE))
+
+    # fetch one extra row to know whether another page exists
+    page = await serializers.arows(entries[:limit + 1], fields)
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1]["date"], page[-1]["id"])
+
+    return conditional.set_validators(serializers.PayloadResponse({
+        "results": serializers.payloads(page, fields),
+        "next": next_cursor,
+    }), etag)
+
+
+@query_budget(5)
+@require_GET
+@login_required(login_url="login")
+def sync_entries(request):
+    """
+    API endpoint for delta sync (see journal.sync). Without ``since`` it
+    returns the whole journal page by page; afterwards pass the last
+    ``next`` token to get only what was created, updated or deleted since.
+    ``?fields=`` works as for the entries API. A token older than the
+    tombstone retention gets a 410, the client then starts over without
+    ``since`` and replaces its copy.
+    """
+    try:
+        fields = JournalEntry.parse_api_fields(request.GET.get("fields"))
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    try:
+        limit = max(1, min(int(request.GET.get("limit", sync.SYNC_PAGE_SIZE)), API_MAX_PAGE_SIZE))
+        changes = sync.changes_since(request.user, request.GET.get("since"), limit, fields)
+    except sync.TokenExpired:
+        return JsonResponse({"error": "Sync token expired, sync again without since."}, status=410)
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit or since token."}, status=400)
+    response = serializers.PayloadResponse(changes)
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+@query_budget(3)
+@require_GET
+@login_required(login_url="login")
+def tags(request):
+    """
+    API endpoint with the user's tags and how many entries use each, most
+    used first, for tag facets. ``?q=`` keeps the names starting with it
+    (autocomplete) and ``?limit=`` caps the list.
+    """
+    try:
+        limit = max(1, min(int(request.GET.get("limit", API_MAX_PAGE_SIZE)), API_MAX_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit."}, status=400)
+
+    usage = TagUsage.objects.filter(user=request.user)
+    prefix = " ".join(request.GET.get("q", "").split()).lower()
+    if prefix:
+        # a range on the (user, key) index, unlike LIKE on every backend
+        usage = usage.filter(key__gte=prefix, key__lt=prefix + "\U0010ffff")
+    usage = usage.order_by("-entry_count", "key").values_list("tag_id", "tag__name", "entry_count", "last_used")
+
+    return JsonResponse({"tags": [
+        {"id": tag_id, "name": name, "count": count, "last_used": last_used.isoformat()}
+        for tag_id, name, count, last_used in usage[:limit]
+    ]})
+
+
+@query_budget(3)
+@require_GET
+@login_required(login_url="login")
+def activity_year(request, year):
+    """
+    API endpoint with a year heatmap: the day bitmap (bit i is January 1st
+    plus i days) and the counts, streaks and gaps read off it.
+    """
+    if not 1 <= year <= 9999:
+        return JsonResponse({"error": "Invalid year."}, status=400)
+    days = ActivityYear.objects.filter(user=request.user, year=year).values_list("days", flat=True).first()
+    return JsonResponse(activity.summarize_year(year, activity.from_bytes(days)))
+
+
+@query_budget(3)
+@require_GET
+@login_required(login_url="login")
+def activity_overview(request):
+    """
+    API endpoint summarizing several years, by default from the user's
+    first year to this one (``?from=``/``?to=`` to narrow it), with streaks
+    and gaps that run across years.
+    """
+    today = timezone.now().date()
+    bitmaps = {year: activity.from_bytes(days) for year, days in
+               ActivityYear.objects.filter(user=request.user).values_list("year", "days")}
+    try:
+        first_year = int(request.GET.get("from", min(bitmaps, default=today.year)))
+        last_year = int(request.GET.get("to", max(today.year, *bitmaps)))
+    except ValueError:
+        return JsonResponse({"error": "Invalid year."}, status=400)
+    if not 1 <= first_year <= last_year <= 9999 or last_year - first_year >= MAX_OVERVIEW_YEARS:
+        return JsonResponse({"error": f"Give at most {MAX_OVERVIEW_YEARS} years, oldest first."}, status=400)
+    return JsonResponse(activity.summarize_years(bitmaps, first_year, last_year, today))
+
+
+@query_budget(4)
+@require_GET
+@login_required(login_url="login")
+def search(request):
+    """
+    API endpoint for ranked full-text search over the user's entries.
+    """
+    query = request.GET.get("q", "").strip()
+    try:
+        limit = max(1, min(int(request.GET.get("limit", search_index.DEFAULT_LIMIT)), API_MAX_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit."}, status=400)
+
+    return JsonResponse({
+        "query": query,
+        "results": search_index.search(request.user, query, limit=limit),
+    })
+
+
 @require_GET
 @login_required(login_url="login")
-def entries(request):
-    # Query for entries
+def export_entries(request, fmt):
+    """
+    Stream a backup of all the user's entries as ndjson, csv or a Markdown zip.
+    """
+    if fmt not in archive.EXPORT_FORMATS:
+        return JsonResponse({"error": f"Unknown export format '{fmt}'."}, status=404)
+
+    content_type, extension = archive.EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(archive.EXPORTERS[fmt](request.user), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="journal-{date.today():%Y%m%d}.{extension}"'
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+@login_required(login_url="login")
+@require_http_methods(["POST"])
+def import_entries(request):
+    """
+    Import an uploaded ndjson or csv file (field "file"); the format comes
+    from ?format= or the file extension. Returns a JSON summary.
+    """
+    upload = request.FILES.get("file")
+    if upload is None:
+        return JsonResponse({"error": "No file uploaded."}, status=400)
+
+    fmt = request.GET.get("format") or upload.name.rsplit(".", 1)[-1].lower()
+    if fmt not in archive.IMPORT_FORMATS:
+        return JsonResponse({"error": f"Unsupported import format '{fmt}'."}, status=400)
+
     try:
-        entries = JournalEntry.objects.filter(user=request.user)
-    except:
-        entries = None
-        return JsonResponse({"error": "No entry found."})
+        batch_size = max(1, int(request.GET.get("batch_size", archive.DEFAULT_BATCH_SIZE)))
+    except ValueError:
+        return JsonResponse({"error": "Invalid batch_size."}, status=400)
 
-    # in order to serialize non-dict objects -> safe=False
-    return JsonResponse([entry.serialize() for entry in entries], safe=False)
+    # decoded line by line, the upload is never read into memory as a whole
+    stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    try:
+        summary = archive.import_entries(request.user, archive.READERS[fmt](stream), batch_size=batch_size)
+    except (UnicodeDecodeError, csv.Error) as error:
+        return JsonResponse({"error": f"Could not read file: {error}"}, status=400)
+
+    summary["errors"] = [{"record": number, "error": message} for number, message in summary["errors"]]
+    return JsonResponse(summary)
 
 
+@require_http_methods(["POST"])
 @login_required(login_url="login")
-def entry_on(request, date):
+def batch_entries(request):
+    """
+    API endpoint applying a batch of entry writes in one transaction, see
+    journal.batch. Body: {"operations": [{"op": "create", "date": ...,
+    "title": ..., "content": ..., "tags": [...]}, {"op": "update", "id": ...,
+    <changed fields>}, {"op": "delete", "id": ...}, ...]}. Returns one
+    result per operation.
+    """
+    try:
+        payload = json.loads(request.body)
+        results = batch.apply_batch(request.user, payload.get("operations") if isinstance(payload, dict) else None)
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    except IntegrityError:
+        return JsonResponse({"error": "The entries changed while the batch was applied, retry it."}, status=409)
+    return JsonResponse({"results": results})
+
+
+@require_GET
+def metrics(request):
+    """
+    Per-view request, query and timing totals in the Prometheus text format,
+    for staff users and INTERNAL_IPS (the scraper).
+    """
+    if not (request.user.is_staff or request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics_registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _ndjson_lines(rows, fields):
+    return b"".join(serializers.dumps(serializers.payload(row, fields)) + b"\n" for row in rows)
+
+
+def _after(entries, row):
+    return entries.filter(Q(date__lt=row["date"]) | Q(date=row["date"], id__lt=row["id"]))
+
+
+def _stream_ndjson(entries, fields=None):
+    # keyset pages of rows keep memory flat; each page is one query plus
+    # one for its tags, and goes out as one chunk
+    page = serializers.rows(entries[:STREAM_CHUNK_SIZE], fields)
+    while page:
+        yield _ndjson_lines(page, fields)
+        page = serializers.rows(_after(entries, page[-1])[:STREAM_CHUNK_SIZE], fields)
+
+
+async def _astream_ndjson(entries, fields=None):
+    page = await serializers.arows(entries[:STREAM_CHUNK_SIZE], fields)
+    while page:
+        yield _ndjson_lines(page, fields)
+        page = await serializers.arows(_after(entries, page[-1])[:STREAM_CHUNK_SIZE], fields)
+
+
+@query_budget(7)
+@async_login_required(login_url="login")
+async def entry_on(request, date):
+    # the page also links the neighbouring days, so it's as fresh as the
+    # whole journal; pending flash messages must still be rendered
+    etag = conditional.page_etag(request, await conditional.ajournal_etag(request.user.id))
+    if not len(messages.get_messages(request)):
+        response = conditional.check_preconditions(request, etag)
+        if response is not None:
+            return response
+
     # Query for the day
     try:
-        entry = JournalEntry.objects.get(user=request.user, date=date)
-    except JournalEntry.DoesNotExist:
+        entry = await JournalEntry.objects.prefetch_related(tag_list_prefetch()).aget(
+            user=request.user, date=date)
+    except (JournalEntry.DoesNotExist, ValidationError):
         messages.info(request, "No entry found for this date.")
         return redirect('index')
     
     # Get previous and next entry dates for navigation
-    prev_entry = JournalEntry.objects.filter(
+    prev_date = await JournalEntry.objects.filter(
         user=request.user, 
         date__lt=entry.date
-    ).order_by('-date').first()
+    ).order_by('-date').values_list('date', flat=True).afirst()
     
-    next_entry = JournalEntry.objects.filter(
+    next_date = await JournalEntry.objects.filter(
         user=request.user,
         date__gt=entry.date
-    ).order_by('date').first()
+    ).order_by('date').values_list('date', flat=True).afirst()
     
     context = {
         'entry': entry,
-        'prev_date': prev_entry.date if prev_entry else None,
-        'next_date': next_entry.date if next_entry else None,
+        'prev_date': prev_date,
+        'next_date': next_date,
     }
     
-    return render(request, 'journal/entry_detail.html', context)
+    # everything the template needs is loaded, rendering doesn't query
+    return conditional.set_validators(render(request, 'journal/entry_detail.html', context), etag)
+
+
+@query_budget(6)
+@async_require_GET
+@async_login_required(login_url="login")
+async def calendar_data(request, year, month):
+    """
+    API endpoint with the data behind the calendar page for one month:
+    the grid of days with their entry ids, today's entry and the streaks.
+    """
+    if not (1 <= month <= 12 and 1 <= year <= 9999):
+        return JsonResponse({"error": "Invalid month."}, status=400)
+
+    today = timezone.now().date()
+    month_data, today_entry, profile = await calendar_cache.aget_calendar(request.user.id, year, month, today)
+    return serializers.PayloadResponse({
+        "year": year,
+        "month": month,
+        "weeks": [
+            [{"date": day["day"].isoformat() if day["day"] else None, "entry": day["entry"]} for day in week]
+            for week in month_data["weeks"]
+        ],
+        "entries_this_month": month_data["entries_this_month"],
+        # loaded light, see calendar_cache.build_day
+        "today_entry": today_entry.serialize(JournalEntry.LIGHT_API_FIELDS) if today_entry else None,
+        "total_entries": profile.entry_count,
+        "current_streak": profile.get_current_streak(today),
+        "longest_streak": profile.longest_streak,
+    })
@@ -0,0 +1,27 @@
+"""
+Startup work moved out of the first request.
+
+A new worker resolves its first URL by importing the URLconf, and with it
+every view, form and widget, and compiles each template the first time it is
+rendered. warm_up() does both while the WSGI/ASGI module is imported. With
+gunicorn --preload that happens once in the master, and the forked workers
+share the result.
+"""
+from pathlib import Path
+
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+
+
+def warm_up():
+    """
+    Import and index the URLconf and compile the journal templates into the
+    cached template loader. Returns the number of templates compiled.
+    """
+    get_resolver().reverse_dict  # imports the URLconf and fills the {% url %} lookups
+    names = sorted(path.relative_to(TEMPLATE_DIR).as_posix() for path in TEMPLATE_DIR.rglob("*.html"))
+    for name in names:
+        get_template(name)
+    return len(names)
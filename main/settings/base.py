@@ -1,10 +1,10 @@
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
 SECRET_KEY = config('SECRET_KEY')
-DEBUG = config('DEBUG', default=True, cast=bool)
+DEBUG = config('DEBUG', default=False, cast=bool)
 ALLOWED_HOSTS = ["*"]
 
 INSTALLED_APPS = [
@@ -19,8 +19,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'journal.instrumentation.InstrumentationMiddleware',  # first, so it sees every query
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Added WhiteNoise
+    'journal.middleware.CompressionMiddleware',  # gzip/brotli for the JSON APIs
+    'journal.middleware.WhiteNoiseMiddleware',  # WhiteNoise, async-capable for ASGI
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -33,7 +35,7 @@ WSGI_APPLICATION = 'main.wsgi.application'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'journal.instrumentation.DjangoTemplates',  # times rendering
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -54,6 +56,62 @@ DATABASES = {
     }
 }
 
+# Cache (calendar data, ...). LocMemCache is per process; multi-worker
+# deployments should point this at Redis/Memcached or a shared FileBasedCache.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='journal'),
+    }
+}
+SHARED_CACHE = 'locmem' not in CACHES['default']['BACKEND']
+
+# Month grids, the "today" entry and profile stats of the calendar page (see
+# journal/calendar_cache.py). Writes invalidate only their own process's
+# cache, so prod turns this off unless the cache is shared.
+CALENDAR_CACHE = config('CALENDAR_CACHE', default=True, cast=bool)
+
+# Sessions and the signed-in user (with its profile) are read from the cache,
+# so an authenticated request runs no auth queries once they are cached (see
+# journal/auth.py). Sessions are still written to the database. With several
+# processes this needs a shared cache: a per-process LocMemCache would let a
+# worker keep a signed-out session or an old password hash until it expires.
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+AUTHENTICATION_BACKENDS = ['journal.auth.CachedModelBackend']
+AUTH_USER_CACHE = config('AUTH_USER_CACHE', default=True, cast=bool)
+
+# Instrumentation: clients allowed to read /metrics/ without a staff login,
+# and whether views over their @query_budget raise instead of logging.
+INTERNAL_IPS = config('INTERNAL_IPS', default='127.0.0.1', cast=Csv())
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+# per-request query counts and timings in a Server-Timing header, for every
+# client; staff users get it regardless
+SERVER_TIMING = config('SERVER_TIMING', default=DEBUG, cast=bool)
+
+# Streaks, tag usage and the search index are updated by queued jobs. Eager
+# mode does them inside the write instead, so no `run_jobs` worker is needed
+# (see journal/jobs.py); production turns it off.
+JOB_QUEUE_EAGER = config('JOB_QUEUE_EAGER', default=True, cast=bool)
+
+# Delta sync re-scans the last SYNC_OVERLAP_SECONDS before a client's token,
+# since updated_at is set before a write commits; keep it above the longest
+# write transaction. Tombstones of deleted entries are kept for
+# SYNC_TOMBSTONE_RETENTION_DAYS (`manage.py prune_tombstones`), older tokens
+# have to sync from scratch (see journal/sync.py).
+SYNC_OVERLAP_SECONDS = config('SYNC_OVERLAP_SECONDS', default=60, cast=int)
+SYNC_TOMBSTONE_RETENTION_DAYS = config('SYNC_TOMBSTONE_RETENTION_DAYS', default=90, cast=int)
+
+# Entry content of at least ENTRY_CONTENT_COMPRESS_MIN_BYTES is stored
+# compressed with 'zlib' or 'zstd' (pip install zstandard, else zlib), off
+# when empty. Run `manage.py compress_entries` after changing these (see
+# journal/compression.py).
+ENTRY_CONTENT_COMPRESSION = config('ENTRY_CONTENT_COMPRESSION', default='')
+ENTRY_CONTENT_COMPRESS_MIN_BYTES = config('ENTRY_CONTENT_COMPRESS_MIN_BYTES', default=1024, cast=int)
+
+# Import the URLconf and compile templates when main.wsgi/main.asgi is
+# imported instead of on the first request (see journal/warmup.py).
+WARM_UP_ON_STARTUP = config('WARM_UP_ON_STARTUP', default=False, cast=bool)
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / "journal" / "static"]  # Matches your structure
 STATIC_ROOT = BASE_DIR / "staticfiles"
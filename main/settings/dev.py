@@ -10,5 +10,15 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # runserver starts a thread per request, so persistent connections
+        # only pay off under gunicorn/uvicorn or the loadtest commands
+        "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=0, cast=int),
     }
 }
+
+# applied to every new SQLite connection, see journal/db.py
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": config("SQLITE_BUSY_TIMEOUT", default=5000, cast=int),  # ms
+}
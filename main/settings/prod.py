@@ -2,19 +2,76 @@ from .base import *
 import os
 
 DEBUG = False
+SERVER_TIMING = config('SERVER_TIMING', default=False, cast=bool)
 
 ALLOWED_HOSTS = ['*']
 
+# Connections are kept open per worker thread for DB_CONN_MAX_AGE seconds
+# and pinged before each request reuses them. Under ASGI requests don't stick
+# to a thread, so set DB_POOL=True there (pip install
+# django-db-connection-pool[mysql]): every thread then borrows from one
+# SQLAlchemy pool per process and Django's connection lifetime is left at 0.
+DB_POOL = config("DB_POOL", default=False, cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'dj_db_conn_pool.backends.mysql' if DB_POOL else 'django.db.backends.mysql',
         'NAME': config("SQL_DBNAME"),
         'USER': config("SQL_USERNAME"),
         'PASSWORD': config("SQL_PASSWORD"),
         'HOST': config("SQL_HOST"),
+        'CONN_MAX_AGE': 0 if DB_POOL else config("DB_CONN_MAX_AGE", default=300, cast=int),
+        'CONN_HEALTH_CHECKS': config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool),
+        'OPTIONS': {
+            'connect_timeout': config("DB_CONNECT_TIMEOUT", default=5, cast=int),
+        },
     }
 }
 
+if DB_POOL:
+    DATABASES['default']['POOL_OPTIONS'] = {
+        'POOL_SIZE': config("DB_POOL_SIZE", default=10, cast=int),
+        'MAX_OVERFLOW': config("DB_POOL_MAX_OVERFLOW", default=10, cast=int),
+        # recycle before MySQL's wait_timeout closes the connection server side
+        'RECYCLE': config("DB_POOL_RECYCLE", default=3600, cast=int),
+        'PRE_PING': config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool),
+    }
+
+# Templates are compiled once per process, while main.wsgi is imported
+# (WARM_UP_ON_STARTUP) rather than on first use. Django 4.2 already wraps the
+# loaders in the cached loader when none are given, spelling them out keeps it
+# that way. The debug context processor only does work when DEBUG is on.
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'context_processors': [
+            processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+            if processor != 'django.template.context_processors.debug'
+        ],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
+WARM_UP_ON_STARTUP = config('WARM_UP_ON_STARTUP', default=True, cast=bool)
+
+# entry writes only queue their derived data, run `manage.py run_jobs` next
+# to the web workers
+JOB_QUEUE_EAGER = config('JOB_QUEUE_EAGER', default=False, cast=bool)
+
+# Cached sessions, users and calendars (see base.py) only while the cache is
+# shared between the workers, i.e. CACHE_BACKEND points at Redis or Memcached
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.'
+                        + ('cached_db' if SHARED_CACHE else 'db'))
+AUTH_USER_CACHE = config('AUTH_USER_CACHE', default=SHARED_CACHE, cast=bool)
+CALENDAR_CACHE = config('CALENDAR_CACHE', default=SHARED_CACHE, cast=bool)
+
 # STATIC_ROOT = "/home/myusername/myproject/static"
 STATIC_ROOT = "/home/cs50journal/journal/journal/static"
 # STATIC_ROOT = os.path.join(BASE_DIR, "static")